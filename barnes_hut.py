@@ -0,0 +1,263 @@
+"""
+Приближенный расчет гравитации методом Барнса-Хата.
+
+На каждом шаге над текущими координатами объектов заново строится дерево квадрантов.
+Для каждого узла дерева хранятся суммарная масса и центр масс его объектов.
+Притяжение удаленного узла, который виден под углом меньше theta (size / distance < theta),
+заменяется притяжением его центра масс, поэтому сложность расчета O(N log N) вместо O(N**2).
+
+Дерево строится и обходится векторизованно: объекты упорядочиваются по коду Мортона
+(перемежение бит координат), узел уровня L - это общий префикс длины 2L кодов его объектов.
+
+"""
+
+
+import numpy as np
+from constants import G
+from engine import DirectSum
+
+
+def _spread_bits(v):
+    """
+    Функция раздвигает младшие 32 бита целых чисел: бит i переходит в позицию 2i.
+
+    """
+
+    v = v & 0x00000000FFFFFFFF
+    v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+    v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+    v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+    v = (v | (v << 2)) & 0x3333333333333333
+    v = (v | (v << 1)) & 0x5555555555555555
+    return v
+
+
+class BarnesHut:
+    """
+    Решатель, вычисляющий ускорения по дереву квадрантов.
+
+    theta - угол раскрытия узла: чем меньше, тем точнее и медленнее (theta = 0 - точный расчет).
+    leaf - емкость листа: узлы, содержащие не больше leaf объектов, не делятся,
+    а при близком расположении суммируются по своим объектам точно.
+    depth - максимальная глубина дерева (не более 31 уровня).
+    chunk - количество объектов, обходящих дерево за один проход (ограничивает потребление памяти).
+
+    """
+
+    def __init__(self, theta=0.5, leaf=8, depth=21, chunk=4096):
+        assert theta >= 0, f"Угол раскрытия не может быть отрицательным: {theta}."
+        assert leaf >= 1, f"Некорректная емкость листа: {leaf}."
+        assert 0 < depth <= 31, f"Некорректная глубина дерева: {depth}."
+        self.theta = theta
+        self.leaf = leaf
+        self.depth = depth
+        self.chunk = chunk
+
+    def build(self, pos, mass):
+        """
+        Метод строит дерево квадрантов над координатами pos.
+
+        return: словарь с упорядоченными по коду Мортона объектами (order, codes, pos, mass)
+        и списком уровней дерева (levels). Уровень - словарь массивов по его узлам:
+        keys - префиксы кодов, start/count - первый объект узла и количество объектов,
+        mass - массы, com - центры масс, first/nchild - первый потомок на следующем уровне
+        и количество потомков, size - сторона квадранта уровня.
+
+        """
+
+        depth = self.depth
+        lo = pos.min(axis=0)
+        size = float((pos.max(axis=0) - lo).max()) or 1.0
+        # координаты в целочисленной сетке 2**depth x 2**depth
+        cells = 2**depth
+        grid = np.minimum(((pos - lo) / size * cells).astype(np.int64), cells - 1)
+        codes = _spread_bits(grid[:, 0]) | (_spread_bits(grid[:, 1]) << 1)
+        order = np.argsort(codes, kind='stable')
+        codes = codes[order]
+        spos, smass = pos[order], mass[order]
+        weighted = spos * smass[:, np.newaxis]
+
+        levels = []
+        for level in range(depth + 1):
+            keys = codes >> (2 * (depth - level))
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+            count = np.diff(np.r_[starts, len(codes)])
+            m = np.add.reduceat(smass, starts)
+            com = np.add.reduceat(weighted, starts, axis=0)
+            # у узла из безмассовых объектов центр масс берем по первому объекту
+            nonzero = m > 0
+            com[nonzero] /= m[nonzero, np.newaxis]
+            com[~nonzero] = spos[starts[~nonzero]]
+            levels.append({'keys': keys[starts], 'start': starts, 'count': count, 'mass': m, 'com': com,
+                           'size': size / 2**level})
+            # дальше делить незачем - все узлы стали листьями
+            if count.max() <= self.leaf:
+                break
+
+        # связи узлов с потомками: потомки узла с ключом k - узлы следующего уровня с ключами 4k...4k+3
+        for parent, child in zip(levels, levels[1:]):
+            parent['first'] = np.searchsorted(child['keys'], parent['keys'] * 4)
+            parent['nchild'] = np.searchsorted(child['keys'], parent['keys'] * 4 + 4) - parent['first']
+
+        # группы - листья дерева (узлы, которые не делятся дальше); они разбивают все объекты
+        group_level, group_cell = [], []
+        split = np.ones(1, dtype=bool)
+        for level, cells in enumerate(levels):
+            leaf = split & ((cells['count'] <= self.leaf) | (level == len(levels) - 1))
+            group_cell.append(np.flatnonzero(leaf))
+            group_level.append(np.full(len(group_cell[-1]), level))
+            if level + 1 < len(levels):
+                split = np.repeat(split & ~leaf, cells['nchild'])
+        group_level, group_cell = np.concatenate(group_level), np.concatenate(group_cell)
+        groups = {'level': group_level}
+        for name in ('keys', 'start', 'count'):
+            column = np.concatenate([cells[name] for cells in levels])
+            shift = np.cumsum([0] + [len(cells['keys']) for cells in levels])
+            groups[name] = column[shift[group_level] + group_cell]
+        order_groups = np.argsort(groups['start'])
+        groups = {name: value[order_groups] for name, value in groups.items()}
+        # описанный вокруг объектов группы круг: центр и радиус
+        lo_g = np.minimum.reduceat(spos, groups['start'], axis=0)
+        hi_g = np.maximum.reduceat(spos, groups['start'], axis=0)
+        groups['center'] = (lo_g + hi_g) / 2
+        groups['radius'] = np.linalg.norm(hi_g - lo_g, axis=1) / 2
+
+        return {'order': order, 'codes': codes, 'pos': spos, 'mass': smass, 'levels': levels, 'groups': groups}
+
+    def accelerations(self, pos, mass, out=None, targets=None, sources=None):
+        """
+        Метод вычисляет приближенные суммарные гравитационные ускорения объектов.
+
+        pos: координаты объектов, массив (n, 2).
+        mass: массы объектов.
+        out: массив для записи результата (по умолчанию создается новый).
+        targets: индексы объектов, для которых нужны ускорения (по умолчанию - все объекты).
+        Дерево обходят только группы, содержащие эти объекты.
+        sources: индексы объектов, которые притягивают (по умолчанию - все объекты); остальные объекты
+        входят в дерево с нулевой массой.
+
+        return: массив (n, 2) или (len(targets), 2) проекций ускорений
+
+        """
+
+        if sources is not None:
+            source_mass = np.zeros(len(mass))
+            source_mass[sources] = mass[sources]
+            mass = source_mass
+
+        n = len(pos)
+        rows = n if targets is None else len(targets)
+        if out is None:
+            out = np.empty((rows, 2))
+        if n < 2:
+            out[:] = 0.0
+            return out
+        tree = self.build(pos, mass)
+        acc = np.zeros((n, 2))
+        groups = np.arange(len(tree['groups']['start']))
+        if targets is not None:
+            # группы, в которые попали объекты targets (в порядке кодов Мортона)
+            rank = np.empty(n, dtype=np.int64)
+            rank[tree['order']] = np.arange(n)
+            groups = np.unique(np.searchsorted(tree['groups']['start'], rank[targets], side='right') - 1)
+        # обход ведется группами: chunk объектов - примерно chunk / leaf групп
+        step = max(1, self.chunk // self.leaf)
+        for start in range(0, len(groups), step):
+            self._walk(tree, groups[start:start + step], acc)
+        # возвращаем исходный порядок объектов
+        if targets is None:
+            out[tree['order']] = acc
+        else:
+            out[:] = acc[rank[targets]]
+        return out
+
+    @staticmethod
+    def _expand(index, first, count):
+        """
+        Функция раскрывает пары (индекс, узел) в пары (индекс, элемент узла):
+        элементы узла - count индексов подряд, начиная с first.
+
+        """
+
+        index = np.repeat(index, count)
+        offset = np.arange(len(index)) - np.repeat(np.cumsum(count) - count, count)
+        return index, np.repeat(first, count) + offset
+
+    def _walk(self, tree, group, acc):
+        """
+        Метод обходит дерево сверху вниз для групп объектов group и накапливает ускорения их объектов в acc.
+
+        Фронт обхода - пары (группа, узел текущего уровня). Решение о раскрытии узла принимается один раз
+        для всей группы: далекий узел заменяется центром масс для всех объектов группы, близкий лист
+        суммируется по своим объектам точно, остальные узлы раскрываются в своих потомков.
+
+        """
+
+        levels, groups = tree['levels'], tree['groups']
+        spos, smass = tree['pos'], tree['mass']
+        n = len(spos)
+        last = len(levels) - 1
+        g_start, g_count, g_level, g_keys = groups['start'], groups['count'], groups['level'], groups['keys']
+
+        def add(t, d, m, r2):
+            k = G * m / (r2 * np.sqrt(r2))
+            acc[:, 0] += np.bincount(t, weights=k * d[:, 0], minlength=n)
+            acc[:, 1] += np.bincount(t, weights=k * d[:, 1], minlength=n)
+
+        node = np.zeros(len(group), dtype=np.int64)
+        for level, cells in enumerate(levels):
+            if len(group) == 0:
+                break
+            com = cells['com'][node]
+            # ближайшее возможное расстояние от объектов группы до центра масс узла
+            near = np.linalg.norm(com - groups['center'][group], axis=1) - groups['radius'][group]
+            # узел, содержащий группу, нельзя заменять центром масс
+            gl = g_level[group]
+            own = (gl >= level) & ((g_keys[group] >> np.maximum(2 * (gl - level), 0)) == cells['keys'][node])
+            count = cells['count'][node]
+            accept = ~own & (near > 0) & (cells['size'] < self.theta * near) & (cells['mass'][node] > 0)
+            leaf = ~accept & ((count <= self.leaf) | (level == last))
+            if accept.any():
+                t, a = self._expand(np.flatnonzero(accept), g_start[group[accept]], g_count[group[accept]])
+                d = com[t] - spos[a]
+                add(a, d, cells['mass'][node[t]], np.einsum('ij,ij->i', d, d))
+            if leaf.any():
+                # близкий лист: точная сумма по парам (объект группы, объект листа), кроме самого объекта
+                pair, a = self._expand(np.flatnonzero(leaf), g_start[group[leaf]], g_count[group[leaf]])
+                k, j = self._expand(np.arange(len(pair)), cells['start'][node[pair]], count[pair])
+                a = a[k]
+                d = spos[j] - spos[a]
+                r2 = np.einsum('ij,ij->i', d, d)
+                use = (j != a) & (r2 > 0) & (smass[j] > 0)
+                add(a[use], d[use], smass[j[use]], r2[use])
+            if level == last:
+                break
+            expand = ~accept & ~leaf
+            group, node = self._expand(group[expand], cells['first'][node[expand]], cells['nchild'][node[expand]])
+
+    def force_error(self, pos, mass, sample=1000, seed=1, sources=None):
+        """
+        Метод сравнивает приближенные ускорения с точным попарным расчетом (DirectSum) с теми же источниками.
+
+        pos: координаты объектов, массив (n, 2).
+        mass: массы объектов.
+        sample: количество случайных объектов, по которым оценивается ошибка.
+        seed: зерно генератора случайных чисел.
+        sources: индексы объектов, которые притягивают (по умолчанию - все объекты).
+
+        return: словарь относительных ошибок ускорения |a - a_точн| / |a_точн|: 'rms', 'median', 'p99', 'max'
+
+        """
+
+        n = len(pos)
+        rows = np.arange(n)
+        if n > sample:
+            rows = np.sort(np.random.default_rng(seed).choice(n, sample, replace=False))
+        approx = self.accelerations(pos, mass, sources=sources)[rows]
+        exact = DirectSum().accelerations(pos, mass, targets=rows, sources=sources)
+        norm = np.linalg.norm(exact, axis=1)
+        err = np.linalg.norm(approx - exact, axis=1) / np.where(norm > 0, norm, 1.0)
+        return {'rms': float(np.sqrt(np.mean(err**2))),
+                'median': float(np.median(err)),
+                'p99': float(np.percentile(err, 99)),
+                'max': float(err.max())}
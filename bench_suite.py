@@ -0,0 +1,305 @@
+"""
+Набор замеров производительности с проверкой корректности и сравнением с базовыми результатами.
+
+Замеры горячих путей:
+* gravity/loop/N, gravity/engine/N - шаг Space.gravity_interactions() попарным циклом и движком;
+  проверка - дрейф полной энергии за фиксированное число шагов (цикл), ошибка ускорений движка
+  против независимого прямого суммирования;
+* csv/save/N, csv/load/N - сохранение и загрузка Space.save_obj() / Space.load_obj();
+  проверка - совпадение состояния после загрузки;
+* draw/full/N, draw/static/N - полная перерисовка кадра MainLoop.draw() и кадр на паузе (только строка
+  состояния) без дисплея (SDL_VIDEODRIVER=dummy); проверка - все объекты учтены отрисовкой, звезда видна;
+* import/<модуль> - холодный импорт модулей ядра в новом процессе (python -X importtime);
+  проверка - время не больше бюджета IMPORT_BUDGET, графические библиотеки и scipy не загружены.
+
+Быстрый, но неверный расчет не проходит: замер с нарушенной проверкой считается проваленным.
+Результаты записываются в JSON; при сравнении с базовым файлом замер медленнее базового больше чем
+на threshold (доля) считается регрессией. Код завершения 1 - есть регрессии или проваленные проверки.
+
+Запуск:
+python bench_suite.py [--out results.json] [--baseline baseline.json] [--threshold 0.25] [--update]
+python bench_suite.py --quick
+
+"""
+
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import numpy as np
+from constants import G
+from benchmarks import random_space, seconds_per_call
+from space import Space
+
+
+FORMAT = 1
+
+# бюджет холодного импорта модуля ядра, с; модули, которые ядро не должно загружать
+IMPORT_BUDGET = 0.5
+HEAVY = ('pygame', 'scipy', 'tkinter', 'win32api', 'pygame_widgets')
+
+
+def record(value, check, measure, limit):
+    """
+    Функция формирует результат замера.
+
+    value: время одной операции, с.
+    check: название проверки корректности; measure: ее значение; limit: наибольшее допустимое значение.
+
+    """
+
+    return {'value': value, 'unit': 's', 'check': check, 'measure': measure, 'limit': limit,
+            'ok': bool(measure <= limit)}
+
+
+def reference_accelerations(pos, mass, targets):
+    """
+    Функция вычисляет ускорения объектов targets прямым суммированием по всем объектам - независимо от движка.
+
+    """
+
+    d = pos[np.newaxis] - pos[targets, np.newaxis]
+    r2 = np.einsum('ijk,ijk->ij', d, d)
+    r2[np.arange(len(targets)), targets] = np.inf
+    return G * np.einsum('ij,ijk->ik', mass / r2**1.5, d)
+
+
+def suite_gravity(ns=(100, 1000, 5000), max_loop=300, t=100.0, budget=1.0, steps=20, sample=256):
+    """
+    Замер шага гравитационного взаимодействия.
+
+    Проверки не зависят от скорости: попарный цикл - дрейф энергии за steps шагов (цикл первого порядка точности,
+    дрейф растет с N - допуск 0.1 ловит только грубые ошибки), движок - относительная ошибка ускорений
+    sample объектов против прямого суммирования.
+
+    return: словарь результатов {название: результат}
+
+    """
+
+    results = {}
+    for n in ns:
+        for mode, engine in (('loop', False), ('engine', True)):
+            if not engine and n > max_loop:
+                continue
+            space = random_space(n, engine=engine)
+            value = seconds_per_call(lambda: space.gravity_interactions(t), budget)
+            if engine:
+                e = space.Engine
+                pos, mass = e.pos[:n], e.mass[:n]
+                targets = np.random.default_rng(1).choice(n, min(n, sample), replace=False)
+                reference = reference_accelerations(pos, mass, targets)
+                acc = e.accelerations()[targets]
+                error = float(np.max(np.linalg.norm(acc - reference, axis=1) / np.linalg.norm(reference, axis=1)))
+                results[f'gravity/{mode}/{n}'] = record(value, 'force_error', error, 1.0e-9)
+            else:
+                space = random_space(n, engine=engine)
+                energy = space.energy()
+                for _ in range(steps):
+                    space.gravity_interactions(t)
+                error = abs(space.energy() - energy) / abs(energy)
+                results[f'gravity/{mode}/{n}'] = record(value, 'energy_drift', error, 0.1)
+    return results
+
+
+def suite_csv(ns=(1000, 10000), budget=1.0):
+    """
+    Замер сохранения и загрузки CSV-файла с проверкой совпадения состояния.
+
+    return: словарь результатов {название: результат}
+
+    """
+
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'state.csv')
+        for n in ns:
+            space = random_space(n, engine=True)
+            restored = Space(engine=True)
+            save = seconds_per_call(lambda: space.save_obj(path), budget)
+            load = seconds_per_call(lambda: restored.load_obj(path), budget)
+            state = space.Engine.pos[:n], space.Engine.vel[:n], space.Engine.mass[:n]
+            loaded = restored.Engine.pos[:n], restored.Engine.vel[:n], restored.Engine.mass[:n]
+            # текстовый формат хранит значения через str() - совпадение точное
+            error = max(float(np.max(np.abs(a - b))) for a, b in zip(state, loaded)) if restored.Engine.n == n \
+                else float('inf')
+            results[f'csv/save/{n}'] = record(save, 'roundtrip_error', error, 0.0)
+            results[f'csv/load/{n}'] = record(load, 'roundtrip_error', error, 0.0)
+    return results
+
+
+def suite_draw(ns=(1000, 10000), size=(1280, 720), budget=1.0):
+    """
+    Замер отрисовки кадра MainLoop.draw() без дисплея.
+
+    return: словарь результатов {название: результат}; пустой словарь, если окно не может быть создано
+    (нет зависимостей main_cycle) - причина в поле 'skipped'
+
+    """
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    try:
+        from main_cycle import MainLoop
+    except ImportError as error:
+        return {'skipped': f'draw: {error}'}
+    from settings import Settings
+    import pygame
+
+    results = {}
+    for n in ns:
+        space = random_space(n, engine=True)
+        # масштаб - орбиты объектов (до 5e11 м) занимают окно
+        loop = MainLoop(space, Settings.t, Settings.fps, m=min(size) / 1.0e12, size=size, run=False)
+
+        def full():
+            loop.redraw = True
+            loop.draw()
+
+        value = seconds_per_call(full, budget)
+        stats = loop.renderer.stats
+        # каждый объект нарисован окружностью, точкой или отброшен; звезда в центре окна видна
+        missing = abs(n - stats['circles'] - stats['points'] - stats['culled'])
+        if loop.sc.get_at((loop.offset_x, loop.offset_y))[:3] == pygame.Color('#000020')[:3]:
+            missing += 1
+        results[f'draw/full/{n}'] = record(value, 'missing_bodies', missing, 0)
+
+        # на паузе неизменная сцена не перерисовывается
+        loop.pause = True
+        loop.draw()
+        stats = loop.renderer.stats
+        value = seconds_per_call(loop.draw, budget)
+        # SceneRenderer.draw() при каждой отрисовке создает новый словарь статистики
+        results[f'draw/static/{n}'] = record(value, 'full_redraws', int(loop.renderer.stats is not stats), 0)
+        if loop.worker is not None:
+            loop.worker.stop()
+    return results
+
+
+def import_time(module):
+    """
+    Функция импортирует module в новом процессе интерпретатора.
+
+    return: суммарное время импорта модуля, с; загруженные модули из HEAVY
+
+    """
+
+    code = f'import sys, {module}; print(",".join(m for m in {HEAVY!r} if m in sys.modules))'
+    done = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True,
+                          cwd=os.path.dirname(os.path.abspath(__file__)), check=True)
+    # строка модуля верхнего уровня: "import time: собственное | суммарное | модуль", микросекунды
+    total = next(int(line.split('|')[1]) for line in done.stderr.splitlines()
+                 if line.startswith('import time:') and line.split('|')[2].strip() == module)
+    heavy = [m for m in done.stdout.strip().split(',') if m]
+    return total / 1.0e6, heavy
+
+
+def suite_import(modules=('space', 'integrators', 'headless', 'ensemble'), budget=IMPORT_BUDGET, repeat=3):
+    """
+    Замер холодного импорта модулей ядра (лучшее из repeat запусков).
+
+    return: словарь результатов {название: результат}
+
+    """
+
+    results = {}
+    for module in modules:
+        runs = [import_time(module) for _ in range(repeat)]
+        value = min(t for t, _ in runs)
+        heavy = runs[0][1]
+        # загрузка графических библиотек или scipy - проверка не пройдена независимо от времени
+        results[f'import/{module}'] = record(value, 'import_time', float('inf') if heavy else value, budget)
+    return results
+
+
+def run(quick=False):
+    """
+    Функция выполняет все замеры набора.
+
+    quick: малые N и короткие замеры (проверка работоспособности набора).
+
+    return: словарь {'format', 'python', 'platform', 'results', 'skipped'}
+
+    """
+
+    if quick:
+        parts = (suite_gravity((10, 100), max_loop=10, budget=0.05), suite_csv((100,), budget=0.05),
+                 suite_draw((100,), budget=0.05), suite_import(('space',), repeat=1))
+    else:
+        parts = (suite_gravity(), suite_csv(), suite_draw(), suite_import())
+    results, skipped = {}, []
+    for part in parts:
+        if 'skipped' in part:
+            skipped.append(part.pop('skipped'))
+        results.update(part)
+    return {'format': FORMAT, 'python': platform.python_version(), 'platform': platform.platform(),
+            'results': results, 'skipped': skipped}
+
+
+def compare(results, baseline, threshold=0.25):
+    """
+    Функция сравнивает результаты с базовыми.
+
+    results, baseline: словари {название: результат} (поле 'results' файла результатов).
+    threshold: допустимое замедление относительно базового результата, доля.
+
+    return: список кортежей (название, время, базовое время, отношение, статус); статус - 'ok', 'faster',
+    'slower' (регрессия), 'failed' (проверка корректности не пройдена), 'new' (нет базового результата)
+
+    """
+
+    assert threshold >= 0, f"Некорректный порог регрессии: {threshold}."
+    rows = []
+    for name, result in sorted(results.items()):
+        base = baseline.get(name)
+        ratio = result['value'] / base['value'] if base and base['value'] > 0 else float('nan')
+        if not result['ok']:
+            status = 'failed'
+        elif base is None:
+            status = 'new'
+        elif ratio > 1 + threshold:
+            status = 'slower'
+        elif ratio < 1 / (1 + threshold):
+            status = 'faster'
+        else:
+            status = 'ok'
+        rows.append((name, result['value'], base['value'] if base else float('nan'), ratio, status))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Набор замеров производительности с базовыми результатами.')
+    parser.add_argument('--out', help='файл JSON для записи результатов')
+    parser.add_argument('--baseline', help='файл JSON базовых результатов для сравнения')
+    parser.add_argument('--threshold', type=float, default=0.25, help='допустимое замедление, доля (0.25 = 25%%)')
+    parser.add_argument('--update', action='store_true', help='записать результаты в файл базовых результатов')
+    parser.add_argument('--quick', action='store_true', help='малые N и короткие замеры')
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    report = run(args.quick)
+    baseline = {}
+    if args.baseline and os.path.exists(args.baseline) and not args.update:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+    rows = compare(report['results'], baseline, args.threshold)
+
+    print(f'{"замер":<22} {"время, с":>10} {"базовое, с":>11} {"отношение":>10} {"статус":>7}')
+    for name, value, base, ratio, status in rows:
+        print(f'{name:<22} {value:>10.3g} {base:>11.3g} {ratio:>10.2f} {status:>7}')
+    for reason in report['skipped']:
+        print(f'пропущено - {reason}')
+    print(f'всего {time.perf_counter() - start:.1f} с')
+
+    for path in (args.out, args.baseline if args.update else None):
+        if path:
+            with open(path, 'w') as file:
+                json.dump(report, file, indent=2)
+    return int(any(status in ('slower', 'failed') for *_, status in rows))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
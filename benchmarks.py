@@ -0,0 +1,954 @@
+"""
+Скрипт для замеров производительности математического пространства.
+
+Запуск:
+python benchmarks.py gravity [N ...]
+python benchmarks.py barnes-hut [N ...]
+python benchmarks.py integrators
+python benchmarks.py time-steps
+python benchmarks.py ensemble [K ...]
+python benchmarks.py evolution [процессов ...]
+python benchmarks.py kepler [N ...]
+python benchmarks.py snapshot [N ...]
+python benchmarks.py recorder [N ...]
+python benchmarks.py worker [N ...]
+python benchmarks.py render [N ...]
+python benchmarks.py hud
+python benchmarks.py field [N ...]
+python benchmarks.py collisions [N ...]
+python benchmarks.py particles [M ...]
+python benchmarks.py profiler [N ...]
+python benchmarks.py scene-io [N ...]
+python benchmarks.py checkpoints [N ...]
+python benchmarks.py registry [N ...]
+python benchmarks.py memory [N ...]
+
+"""
+
+
+import gc
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+from constants import G
+from objects import SpaceObjects, TestParticle
+from space import Space
+from engine import DirectSum
+from barnes_hut import BarnesHut
+from integrators import integrators, largest_stable_step
+from ensemble import Ensemble
+from evolution import Evolution, InterceptProblem
+from stepper import FixedStepper
+from worker import PhysicsWorker
+import snapshot
+
+
+def random_space(n, engine=False, seed=1):
+    """
+    Функция формирует пространство из n случайных объектов на орбитах вокруг неподвижной звезды.
+
+    n: количество объектов (включая звезду).
+    engine: включить векторизованный движок.
+    seed: зерно генератора случайных чисел (для воспроизводимости замеров).
+
+    """
+
+    rnd = random.Random(seed)
+    space = Space(engine=engine)
+    star = SpaceObjects('Star', 1.9891 * 10**30, 695990000)
+    star.set_coord(0, 0)
+    star.StaticCoord = True
+    bodies = [star]
+    for i in range(1, n):
+        body = SpaceObjects(f'Body {i}', rnd.uniform(1.0e20, 1.0e25), rnd.uniform(1.0e5, 1.0e7))
+        r = rnd.uniform(5.0e10, 5.0e11)
+        x, y = rnd.uniform(-1, 1), rnd.uniform(-1, 1)
+        norm = (x**2 + y**2)**0.5 or 1.0
+        # круговая скорость вокруг звезды, перпендикулярно радиус-вектору
+        v = (G * star.Mass / r)**0.5
+        body.set_coord(r * x / norm, r * y / norm, -v * y / norm, v * x / norm)
+        bodies.append(body)
+    space.add_obj(*bodies)
+    return space
+
+
+def steps_per_second(space, t=100.0, budget=1.0):
+    """
+    Функция возвращает количество шагов Space.gravity_interactions() в секунду.
+    Выполняется не меньше одного шага и не дольше budget секунд (с точностью до одного шага).
+
+    """
+
+    steps = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while steps == 0 or elapsed < budget:
+        space.gravity_interactions(t)
+        steps += 1
+        elapsed = time.perf_counter() - start
+    return steps / elapsed
+
+
+def bench_gravity(ns=(10, 100, 1000, 5000), budget=1.0):
+    """
+    Замер шагов в секунду для попарного цикла и векторизованного движка.
+
+    return: список кортежей (N, шагов/с цикла, шагов/с движка)
+
+    """
+
+    results = []
+    print(f'{"N":>6} {"цикл, шаг/с":>14} {"движок, шаг/с":>14} {"ускорение":>10}')
+    for n in ns:
+        loop = steps_per_second(random_space(n), budget=budget)
+        engine = steps_per_second(random_space(n, engine=True), budget=budget)
+        results.append((n, loop, engine))
+        print(f'{n:>6} {loop:>14.3g} {engine:>14.3g} {engine / loop:>9.1f}x')
+    return results
+
+
+def random_disk(n, seed=1):
+    """
+    Функция возвращает координаты и массы n объектов, случайно распределенных в диске (пояс астероидов).
+
+    """
+
+    rng = np.random.default_rng(seed)
+    r = 1.0e11 * np.sqrt(rng.uniform(0.05, 1.0, n))
+    phi = rng.uniform(0, 2 * np.pi, n)
+    pos = np.column_stack((r * np.cos(phi), r * np.sin(phi)))
+    return pos, rng.uniform(1.0e15, 1.0e21, n)
+
+
+def seconds_per_call(func, budget=1.0):
+    """
+    Функция возвращает среднее время одного вызова func (не меньше одного вызова, не дольше budget секунд).
+
+    """
+
+    calls = 0
+    start = time.perf_counter()
+    elapsed = 0.0
+    while calls == 0 or elapsed < budget:
+        func()
+        calls += 1
+        elapsed = time.perf_counter() - start
+    return elapsed / calls
+
+
+def bench_barnes_hut(ns=(100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000), theta=0.5, max_direct=20000,
+                     budget=1.0):
+    """
+    Замер времени расчета ускорений точным решателем и деревом квадрантов, ошибка дерева
+    и N, начиная с которого дерево быстрее точного расчета.
+    Для N > max_direct время точного расчета экстраполируется квадратично (помечено "~").
+
+    return: список кортежей (N, с точн., с дерева, ошибка rms)
+
+    """
+
+    results = []
+    direct, tree = DirectSum(), BarnesHut(theta)
+    crossover = None
+    last = None
+    print(f'theta = {theta}')
+    print(f'{"N":>7} {"точный, с":>11} {"дерево, с":>11} {"ошибка rms":>11}')
+    for n in ns:
+        pos, mass = random_disk(n)
+        if n <= max_direct:
+            t_direct = seconds_per_call(lambda: direct.accelerations(pos, mass), budget)
+            last, mark = (n, t_direct), ' '
+        else:
+            t_direct, mark = last[1] * (n / last[0])**2, '~'
+        t_tree = seconds_per_call(lambda: tree.accelerations(pos, mass), budget)
+        error = tree.force_error(pos, mass, sample=500)['rms']
+        if crossover is None and t_tree < t_direct:
+            crossover = n
+        results.append((n, t_direct, t_tree, error))
+        print(f'{n:>7} {mark}{t_direct:>10.3g} {t_tree:>11.3g} {error:>11.2e}')
+    print(f'дерево быстрее точного расчета начиная с N = {crossover}')
+    return results
+
+
+def bench_integrators(n=100, tolerance=1.0e-8, steps=100):
+    """
+    Замер наибольшего устойчивого шага каждого численного метода и шагов в секунду при нем.
+
+    return: список кортежей (метод, шаг, шагов/с, модельных секунд/с)
+
+    """
+
+    results = []
+    print(f'N = {n}, допустимая ошибка энергии за шаг {tolerance:g}')
+    print(f'{"метод":>9} {"шаг, с":>10} {"шаг/с":>10} {"модельных с/с":>14}')
+    for name in integrators:
+        t = largest_stable_step(lambda: random_space(n), name, tolerance, t=10.0, steps=steps)
+        space = random_space(n)
+        space.set_integrator(name)
+        rate = steps_per_second(space, t) if t else 0.0
+        results.append((name, t, rate, rate * t))
+        print(f'{name:>9} {t:>10.4g} {rate:>10.4g} {rate * t:>14.4g}')
+    return results
+
+
+def hierarchical_space():
+    """
+    Функция формирует иерархическую систему: Солнце - планеты - Земля - Луна - зонд на низкой орбите Земли.
+
+    """
+
+    space = Space(engine=True)
+    sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+    sun.set_coord(0, 0)
+    sun.StaticCoord = True
+    space.add_obj(sun)
+    au = 149.6 * 10 ** 9
+    for name, mass, a in (('Mercury', 3.3e23, 0.387), ('Venus', 4.87e24, 0.723), ('Mars', 6.42e23, 1.524),
+                          ('Jupiter', 1.9e27, 5.2), ('Saturn', 5.68e26, 9.58), ('Uranus', 8.68e25, 19.2),
+                          ('Neptune', 1.02e26, 30.1)):
+        planet = SpaceObjects(name, mass, 1)
+        planet.set_coord(a * au, 0, 0, (G * sun.Mass / (a * au))**0.5)
+        space.add_obj(planet)
+    earth = SpaceObjects('Earth', 5.9722 * 10 ** 24, 6371302)
+    earth.set_coord(au, 0, 0, 29765)
+    moon = SpaceObjects('Moon', 7.35 * 10 ** 22, 1737000)
+    moon.set_coord(au + 384.4 * 10 ** 6, 0, 0, 29765 + 1022)
+    probe = SpaceObjects('Probe', 1000, 1)
+    probe.set_coord(au - 7.0e6, 0, 0, 29765 - (G * earth.Mass / 7.0e6)**0.5)
+    space.add_obj(earth, moon, probe)
+    return space
+
+
+def bench_time_steps(hours=24, eta=0.02):
+    """
+    Замер количества вычислений ускорений при общем адаптивном шаге и при блочных шагах
+    в иерархической системе; точность - отклонение от эталона (yoshida4 с шагом 15 с).
+
+    return: список кортежей (метод, вычислений ускорений, отклонение, м, время, с)
+
+    """
+
+    reference = hierarchical_space()
+    reference.set_integrator('yoshida4')
+    for _ in range(hours * 240):
+        reference.gravity_interactions(15)
+
+    results = []
+    print(f'{hours} ч модельного времени, eta = {eta}')
+    print(f'{"метод":>9} {"вычислений":>11} {"отклонение, м":>14} {"время, с":>9}')
+    for name in ('adaptive', 'block'):
+        space = hierarchical_space()
+        space.set_integrator(name, eta=eta)
+        start = time.perf_counter()
+        for _ in range(hours):
+            space.gravity_interactions(3600)
+        elapsed = time.perf_counter() - start
+        error = max(abs(o.X - r.X) + abs(o.Y - r.Y) for o, r in zip(space.Objects, reference.Objects))
+        results.append((name, space.Engine.evaluations, error, elapsed))
+        print(f'{name:>9} {space.Engine.evaluations:>11} {error:>14.3g} {elapsed:>9.3g}')
+    return results
+
+
+def bench_ensemble(ks=(16, 64, 256), n=10, steps=100):
+    """
+    Замер времени моделирования K копий сценария из n объектов: ансамблем и K отдельными Space.
+
+    return: список кортежей (K, с ансамблем, с отдельными Space)
+
+    """
+
+    results = []
+    print(f'N = {n}, {steps} шагов')
+    print(f'{"K":>6} {"ансамбль, с":>12} {"Space, с":>10} {"ускорение":>10}')
+    for k in ks:
+        ensemble = Ensemble(random_space(n), k)
+        start = time.perf_counter()
+        ensemble.run(100.0, steps)
+        t_ensemble = time.perf_counter() - start
+        start = time.perf_counter()
+        for _ in range(k):
+            space = random_space(n, engine=True)
+            space.set_integrator('leapfrog')
+            for _ in range(steps):
+                space.gravity_interactions(100.0)
+        t_spaces = time.perf_counter() - start
+        results.append((k, t_ensemble, t_spaces))
+        print(f'{k:>6} {t_ensemble:>12.3g} {t_spaces:>10.3g} {t_spaces / t_ensemble:>9.1f}x')
+    return results
+
+
+def bench_evolution(workers=(0, 1, 2, 4), size=256, generations=3, n=10, steps=200):
+    """
+    Замер времени поколения генетического алгоритма в зависимости от количества процессов пула
+    (0 - оценка в текущем процессе).
+
+    return: список кортежей (процессов, среднее время поколения, с, модельных секунд на секунду)
+
+    """
+
+    space = random_space(n)
+    problem = InterceptProblem(space, 'Body 1', 'Body 2', 3600.0, steps, [[-5000, 5000], [-5000, 5000]])
+    results = []
+    print(f'популяция {size}, N = {n}, {steps} шагов на оценку')
+    print(f'{"процессов":>10} {"с/поколение":>12} {"модельных с/с":>14}')
+    for w in workers:
+        with Evolution(problem, size=size, workers=w, quantum=1.0e-6, seed=1) as evolution:
+            evolution.run(generations)
+            wall = sum(s['wall'] for s in evolution.stats[1:]) / max(1, generations - 1)
+            simulated = sum(s['evaluated'] for s in evolution.stats[1:]) * steps * 3600.0
+            rate = simulated / sum(s['wall'] for s in evolution.stats[1:])
+        results.append((w, wall, rate))
+        print(f'{w:>10} {wall:>12.3g} {rate:>14.3g}')
+    return results
+
+
+def bench_kepler(ns=(10, 100, 1000, 3000), steps=20):
+    """
+    Замер времени шага для N малых тел вокруг неподвижного Солнца: на кеплеровых орбитах (CoordFromTime)
+    и при численном расчете (leapfrog, взаимное притяжение).
+
+    return: список кортежей (N, с/шаг на орбитах, с/шаг численно)
+
+    """
+
+    def space_of(n, rails):
+        rng = np.random.default_rng(1)
+        space = Space(engine=True)
+        sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+        sun.set_coord(0, 0)
+        sun.StaticCoord = True
+        space.add_obj(sun)
+        for i, (r, phi) in enumerate(zip(rng.uniform(5e10, 5e11, n), rng.uniform(0, 2 * np.pi, n))):
+            body = SpaceObjects(f'Body {i}', 1.0e20, 1.0e6)
+            v = (G * sun.Mass / r)**0.5
+            body.set_coord(r * np.cos(phi), r * np.sin(phi), -v * np.sin(phi), v * np.cos(phi), t=0)
+            if rails:
+                body.set_orbit(sun)
+            space.add_obj(body)
+        space.set_integrator('leapfrog')
+        return space
+
+    results = []
+    print(f'{"N":>7} {"на орбитах, с/шаг":>18} {"численно, с/шаг":>16}')
+    for n in ns:
+        times = []
+        for rails in (True, False):
+            space = space_of(n, rails)
+            start = time.perf_counter()
+            for _ in range(steps):
+                space.gravity_interactions(3600.0)
+            times.append((time.perf_counter() - start) / steps)
+        results.append((n, *times))
+        print(f'{n:>7} {times[0]:>18.3g} {times[1]:>16.3g}')
+    return results
+
+
+def bench_snapshot(ns=(1000, 100000, 1000000), max_csv=100000):
+    """
+    Замер времени сохранения и загрузки состояния N объектов: двоичный снимок (загрузка в Space с движком
+    с отображением в память) и CSV-файл (до max_csv объектов). Проверяется точное совпадение после загрузки.
+
+    return: список кортежей (N, запись снимка, с, загрузка снимка, с, запись CSV, с, загрузка CSV, с)
+
+    """
+
+    results = []
+    print(f'{"N":>8} {"снимок: запись, с":>18} {"загрузка, с":>12} {"CSV: запись, с":>15} {"загрузка, с":>12}')
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'state.snap')
+        for n in ns:
+            rng = np.random.default_rng(1)
+            state = {'mass': rng.uniform(1e20, 1e30, n), 'r': rng.uniform(1e3, 1e8, n),
+                     'pos': rng.normal(0, 1e11, (n, 2)), 'vel': rng.normal(0, 3e4, (n, 2)), 'acc': np.zeros((n, 2)),
+                     'static': np.zeros(n, dtype=bool), 'from_time': np.zeros(n, dtype=bool),
+                     'color': np.zeros((n, 4), dtype=np.uint8), 'has_color': np.zeros(n, dtype=bool)}
+            snapshot.write(path, 0.0, [f'Body {i}' for i in range(n)], **state)
+
+            space = Space(engine=True)
+            start = time.perf_counter()
+            space.load_snapshot(path)
+            t_load = time.perf_counter() - start
+            assert np.array_equal(space.Engine.pos[:n], state['pos'])
+            start = time.perf_counter()
+            space.save_snapshot(path)
+            t_save = time.perf_counter() - start
+
+            t_csv_save = t_csv_load = float('nan')
+            if n <= max_csv:
+                csv_path = os.path.join(folder, 'state.csv')
+                start = time.perf_counter()
+                space.save_obj(csv_path)
+                t_csv_save = time.perf_counter() - start
+                restored = Space(engine=True)
+                start = time.perf_counter()
+                restored.load_obj(csv_path)
+                t_csv_load = time.perf_counter() - start
+                assert np.array_equal(restored.Engine.pos[:n], state['pos'])
+            results.append((n, t_save, t_load, t_csv_save, t_csv_load))
+            print(f'{n:>8} {t_save:>18.3g} {t_load:>12.3g} {t_csv_save:>15.3g} {t_csv_load:>12.3g}')
+    return results
+
+
+def bench_recorder(ns=(10, 100, 500), steps=1000, capacity=200):
+    """
+    Замер стоимости записи траекторий: время шага без записи и с записью каждого шага в кольцевой буфер
+    и прирост памяти процесса за steps шагов (буфер заполняется и перезаписывается несколько раз).
+
+    return: список кортежей (N, с/шаг без записи, с/шаг с записью, прирост памяти, байт)
+
+    """
+
+    results = []
+    print(f'{steps} шагов, буфер {capacity} кадров')
+    print(f'{"N":>6} {"без записи, с/шаг":>18} {"с записью, с/шаг":>17} {"прирост памяти, байт":>21}')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in ns:
+            times = []
+            for record in (False, True):
+                space = random_space(n, engine=True)
+                space.set_integrator('leapfrog')
+                if record:
+                    space.attach_recorder(os.path.join(folder, f'{n}.traj'), capacity)
+                # первые шаги - прогрев (заполнение кэшей и буфера), затем замер
+                for _ in range(capacity):
+                    space.gravity_interactions(100.0)
+                tracemalloc.start()
+                start = time.perf_counter()
+                for _ in range(steps):
+                    space.gravity_interactions(100.0)
+                times.append((time.perf_counter() - start) / steps)
+                grown = tracemalloc.get_traced_memory()[0]
+                tracemalloc.stop()
+                space.detach_recorder()
+            results.append((n, *times, grown))
+            print(f'{n:>6} {times[0]:>18.3g} {times[1]:>17.3g} {grown:>21}')
+    return results
+
+
+def bench_worker(ns=(1000, 3000), seconds=2.0, fps=30):
+    """
+    Замер задержек цикла отрисовки при медленном расчете: расчет между кадрами в основном потоке
+    и в фоновом потоке (PhysicsWorker). "Кадр" - получение координат для отрисовки и ожидание 1 / fps.
+
+    return: список кортежей (N, режим, кадров в секунду, наибольший интервал между кадрами, с, шагов расчета)
+
+    """
+
+    results = []
+    print(f'{"N":>6} {"режим":>8} {"кадров/с":>9} {"макс. интервал, с":>18} {"шагов":>6}')
+    for n in ns:
+        for mode in ('inline', 'worker'):
+            space = random_space(n, engine=True)
+            space.set_integrator('leapfrog')
+            stepper = FixedStepper(space, 100.0, warp=100.0 * fps, max_substeps=4)
+            worker = PhysicsWorker(stepper).start() if mode == 'worker' else None
+            frames, longest = 0, 0.0
+            start = last = time.perf_counter()
+            while last - start < seconds:
+                if worker is None:
+                    stepper.frame(1 / fps)
+                    stepper.render_positions()
+                else:
+                    worker.render_positions()
+                time.sleep(1 / fps)
+                now = time.perf_counter()
+                longest, last = max(longest, now - last), now
+                frames += 1
+            if worker is not None:
+                worker.stop()
+            steps = round(space.Time / 100.0)
+            results.append((n, mode, frames / (last - start), longest, steps))
+            print(f'{n:>6} {mode:>8} {frames / (last - start):>9.3g} {longest:>18.3g} {steps:>6}')
+    return results
+
+
+def bench_render(ns=(1000, 10000, 100000), frames=10, max_objects=10000, size=(1200, 800)):
+    """
+    Замер времени отрисовки кадра: по объекту (SpaceObjects.draw) и векторной отрисовкой с отбрасыванием
+    невидимых объектов и слоем точек (SceneRenderer). Окно охватывает центральную часть системы,
+    часть объектов находится за его пределами.
+
+    return: список кортежей (N, время кадра по объекту, с, время кадра SceneRenderer, с, статистика отрисовки)
+
+    """
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from render import SceneRenderer
+    sc = pygame.Surface(size)
+    renderer = SceneRenderer()
+    results = []
+    print(f'{"N":>7} {"по объекту, с":>14} {"векторно, с":>12} {"кадров/с":>9} {"окружн.":>8} {"точек":>7} '
+          f'{"отброшено":>10}')
+    for n in ns:
+        space = random_space(n, engine=True)
+        for o in space.Objects:
+            o.set_color((200, 200, 255))
+        m = 0.5 * size[1] / 3.0e11
+        shift = (size[0] / 2, size[1] / 2)
+        positions = space.Engine.pos[:space.Engine.n].copy()
+        per_object = float('nan')
+        if n <= max_objects:
+            start = time.perf_counter()
+            for _ in range(frames):
+                sc.fill((0, 0, 0))
+                for o in space.Objects:
+                    o.draw(sc, shift, m)
+            per_object = (time.perf_counter() - start) / frames
+        start = time.perf_counter()
+        for _ in range(frames):
+            sc.fill((0, 0, 0))
+            stats = renderer.draw(sc, space, positions, shift=shift, m=m)
+        vector = (time.perf_counter() - start) / frames
+        results.append((n, per_object, vector, dict(stats)))
+        print(f'{n:>7} {per_object:>14.3g} {vector:>12.3g} {1 / vector:>9.3g} {stats["circles"]:>8} '
+              f'{stats["points"]:>7} {stats["culled"]:>10}')
+    return results
+
+
+def bench_hud(frames=200, size=(1920, 1080)):
+    """
+    Замер времени отрисовки строки состояния за кадр: создание шрифта и отрисовка текста на каждом кадре
+    (как раньше) и кэш поверхностей текста с перерисовкой только изменившихся полей (HUD).
+    Режимы: "статичный" - текст не меняется (пауза), "меняется" - одно поле меняется каждый кадр.
+
+    return: словарь {режим: (время кадра без кэша, с, время кадра HUD, с)}
+
+    """
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from hud import HUD
+    pygame.font.init()
+    sc = pygame.Surface(size)
+    size_text = int(size[1] * 0.03)
+    y = size[1] - size_text
+    fields = {'scale': ('Коэф. масш.: 1e-08', 5), 'mode': ('Ускорение: x3000, шагов за кадр: 1', size[0] * 0.15),
+              'time': ('Время: 0.00 сут', size[0] * 0.5), 'bodies': ('Объектов: 1000', size[0] * 0.65)}
+    results = {}
+    print(f'{"режим":>10} {"без кэша, с":>12} {"HUD, с":>10}')
+    for mode in ('статичный', 'меняется'):
+        start = time.perf_counter()
+        for i in range(frames):
+            for name, (text, x) in fields.items():
+                if mode == 'меняется' and name == 'time':
+                    text = f'Время: {i / 100:.2f} сут'
+                font = pygame.font.Font(None, size_text)
+                sc.blit(font.render(text, True, (0, 0, 0)), (x, y))
+        plain = (time.perf_counter() - start) / frames
+        hud = HUD()
+        hud.draw(sc, full=True)
+        start = time.perf_counter()
+        for i in range(frames):
+            for name, (text, x) in fields.items():
+                if mode == 'меняется' and name == 'time':
+                    text = f'Время: {i / 100:.2f} сут'
+                hud.set(name, text, (x, y), size_text, (0, 0, 0), (230, 230, 250))
+            hud.draw(sc)
+        cached = (time.perf_counter() - start) / frames
+        results[mode] = (plain, cached)
+        print(f'{mode:>10} {plain:>12.3g} {cached:>10.3g}')
+    return results
+
+
+def bench_field(ns=(100, 1000, 3000, 10000), size=(1920, 1080)):
+    """
+    Замер построения гравитационного поля во всем окне (FieldOverlay): первое построение,
+    перемещение камеры на 200 пикселей (достраиваются открывшиеся плитки) и повторный кадр без изменений.
+
+    return: список кортежей (N, построение, с, перемещение, с, повтор, с, узлов в стороне плитки)
+
+    """
+
+    os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+    import pygame
+    from field import FieldOverlay
+    sc = pygame.Surface(size)
+    m = 0.5 * size[1] / 5.0e11
+    shift = (size[0] // 2, size[1] // 2)
+    results = []
+    print(f'{"N":>6} {"построение, с":>14} {"перемещение, с":>15} {"повтор, с":>10} {"узлов":>6}')
+    for n in ns:
+        space = random_space(n, engine=True)
+        positions = space.Engine.pos[:n].copy()
+        overlay = FieldOverlay()
+        times = []
+        for offset in (0, 200, 200):
+            start = time.perf_counter()
+            stats = overlay.draw(sc, space, positions, shift=(shift[0] + offset, shift[1]), m=m)
+            times.append(time.perf_counter() - start)
+        results.append((n, *times, stats['samples']))
+        print(f'{n:>6} {times[0]:>14.3g} {times[1]:>15.3g} {times[2]:>10.3g} {stats["samples"]:>6}')
+    return results
+
+
+def bench_collisions(ns=(1000, 10000, 100000), max_pairs=5000, t=3600.0):
+    """
+    Замер обработки столкновений в плотном поясе обломков: поиск столкновений за шаг
+    (широкая фаза sweep and prune + узкая фаза) против проверки всех пар и слияние с пакетным удалением.
+
+    return: список кортежей (N, пар-кандидатов, поиск, с, все пары, с, столкновений, слияние, с)
+
+    """
+
+    from collisions import Collisions, swept_contact
+    results = []
+    print(f'{"N":>7} {"кандидатов":>11} {"поиск, с":>9} {"все пары, с":>12} {"столкн.":>8} {"слияние, с":>11}')
+    for n in ns:
+        pos, mass = random_disk(n)
+        rng = np.random.default_rng(2)
+        vel = rng.normal(0, 1.0e3, (n, 2))
+        # радиусы - чтобы в поясе набралось порядка 1% столкновений за шаг
+        radius = np.full(n, 1.0e11 / np.sqrt(n) * 0.05)
+        collisions = Collisions()
+        movable = np.ones(n, dtype=bool)
+        start = time.perf_counter()
+        i, j = collisions.detect(pos, vel, np.zeros((n, 2)), radius, movable, t)
+        search = time.perf_counter() - start
+        brute = float('nan')
+        if n <= max_pairs:
+            start = time.perf_counter()
+            a, b = np.triu_indices(n, 1)
+            swept_contact(pos, pos + vel * t, radius, a, b)
+            brute = time.perf_counter() - start
+
+        space = Space(engine=True)
+        space.add_arrays(mass, radius, pos, vel)
+        space.use_collisions()
+        start = time.perf_counter()
+        merged = space._collide(t)
+        merge = time.perf_counter() - start
+        results.append((n, collisions.pairs, search, brute, len(i), merge))
+        print(f'{n:>7} {collisions.pairs:>11} {search:>9.3g} {brute:>12.3g} {merged:>8} {merge:>11.3g}')
+    return results
+
+
+def bench_particles(ms=(100, 1000, 3000), n=100, budget=1.0):
+    """
+    Замер шага пространства из n массивных объектов и m трассеров: трассеры - пробные частицы (TestParticle,
+    O(N**2 + N*M)) против трассеров - массивных объектов (O((N + M)**2)).
+
+    return: список кортежей (M, шагов/с с пробными частицами, шагов/с с массивными трассерами)
+
+    """
+
+    results = []
+    print(f'{"N":>5} {"M":>6} {"частицы, шаг/с":>15} {"массивные, шаг/с":>17} {"ускорение":>10}')
+    for m in ms:
+        rates = []
+        for kind in (TestParticle, SpaceObjects):
+            space = random_space(n, engine=True)
+            rnd = random.Random(2)
+            tracers = []
+            for i in range(m):
+                tracer = kind(f'Tracer {i}', 1.0, 1.0)
+                r = rnd.uniform(5.0e10, 5.0e11)
+                angle = rnd.uniform(0, 2 * np.pi)
+                v = (G * space.Objects[0].Mass / r)**0.5
+                tracer.set_coord(r * np.cos(angle), r * np.sin(angle), -v * np.sin(angle), v * np.cos(angle))
+                tracers.append(tracer)
+            space.add_obj(*tracers)
+            rates.append(steps_per_second(space, budget=budget))
+        results.append((m, rates[0], rates[1]))
+        print(f'{n:>5} {m:>6} {rates[0]:>15.1f} {rates[1]:>17.1f} {rates[0] / rates[1]:>10.1f}')
+    return results
+
+
+def bench_profiler(ns=(2, 100, 1000), budget=1.0):
+    """
+    Замер накладных расходов замеров времени (profiler.FrameProfiler) на шаг пространства:
+    без профилировщика, с выключенным и с включенным профилировщиком.
+
+    return: список кортежей (N, с/шаг без профилировщика, выключен, включен)
+
+    """
+
+    from profiler import FrameProfiler
+    results = []
+    print(f'{"N":>6} {"без, мкс":>10} {"выключен, мкс":>14} {"включен, мкс":>13}')
+    for n in ns:
+        space = random_space(n, engine=True)
+        base = seconds_per_call(lambda: space.gravity_interactions(100.0), budget)
+        profiler = FrameProfiler()
+        profiler.attach(space, 'gravity_interactions', 'step', frame=True)
+        profiler.attach(space.Engine, 'accelerations', 'forces')
+        off = seconds_per_call(lambda: space.gravity_interactions(100.0), budget)
+        profiler.enable()
+        on = seconds_per_call(lambda: space.gravity_interactions(100.0), budget)
+        results.append((n, base, off, on))
+        print(f'{n:>6} {base * 1e6:>10.1f} {off * 1e6:>14.1f} {on * 1e6:>13.1f}')
+    return results
+
+
+def bench_scene_io(ns=(100000, 1000000), fps=30, frames=60):
+    """
+    Замер кадров во время загрузки снимка N объектов: загрузка в кадре (Space.load()) против фоновой загрузки
+    (scene_io.SceneIO) с подстановкой состояния на границе шага. Кадр - шаг небольшого пространства и ожидание
+    до следующего кадра.
+
+    return: список кортежей (N, загрузка в кадре, с, фоновая загрузка, с, наибольший кадр при фоновой загрузке, с)
+
+    """
+
+    from scene_io import SceneIO
+    results = []
+    print(f'{"N":>8} {"в кадре, с":>11} {"в фоне, с":>10} {"наиб. кадр, мс":>15} {"кадров":>7}')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in ns:
+            path = os.path.join(folder, 'scene.snap')
+            rng = np.random.default_rng(1)
+            state = {'mass': rng.uniform(1e20, 1e30, n), 'r': rng.uniform(1e3, 1e8, n),
+                     'pos': rng.normal(0, 1e11, (n, 2)), 'vel': rng.normal(0, 3e4, (n, 2)), 'acc': np.zeros((n, 2)),
+                     'static': np.zeros(n, dtype=bool), 'from_time': np.zeros(n, dtype=bool),
+                     'color': np.zeros((n, 4), dtype=np.uint8), 'has_color': np.zeros(n, dtype=bool)}
+            snapshot.write(path, 0.0, [f'Body {i}' for i in range(n)], **state)
+
+            space = random_space(100, engine=True)
+            start = time.perf_counter()
+            space.load(path)
+            inline = time.perf_counter() - start
+
+            space = random_space(100, engine=True)
+            io = SceneIO(space)
+            start = time.perf_counter()
+            io.load(path)
+            longest, count, frame = 0.0, 0, 1 / fps
+            while count < frames or io.busy:
+                begin = time.perf_counter()
+                io.poll()
+                if len(space.Objects) == 100:
+                    space.gravity_interactions(100.0)
+                time.sleep(max(0.0, frame - (time.perf_counter() - begin)))
+                longest = max(longest, time.perf_counter() - begin)
+                count += 1
+            background = time.perf_counter() - start
+            io.close()
+            assert len(space.Objects) == n
+            results.append((n, inline, background, longest))
+            print(f'{n:>8} {inline:>11.3g} {background:>10.3g} {longest * 1000:>15.1f} {count:>7}')
+    return results
+
+
+def bench_checkpoints(ns=(100000,), steps=10, keyframe_every=5):
+    """
+    Замер накладных расходов контрольных точек (checkpoint): шаги решателем Barnes-Hut без контрольных точек
+    и с контрольной точкой после каждого шага (худший случай), время фиксации состояния в потоке расчета
+    (остальное - запись в фоне), размер ключевого кадра и дельты.
+
+    return: список кортежей (N, шаг без точек, с, шаг с точками, с, накладные расходы, доля, фиксация, с,
+    ключевой кадр, байт, дельта, байт)
+
+    """
+
+    import checkpoint
+    results = []
+    print(f'{"N":>8} {"шаг, с":>8} {"с точками, с":>13} {"расходы":>8} {"фиксация, мс":>13} {"кадр, МБ":>9} '
+          f'{"дельта, МБ":>11}')
+    with tempfile.TemporaryDirectory() as folder:
+        for n in ns:
+            space = random_space(n, engine=True)
+            space.set_solver('barnes-hut')
+            space.set_integrator('leapfrog')
+            space.gravity_interactions(100.0)
+
+            def run():
+                start = time.perf_counter()
+                for _ in range(steps):
+                    space.gravity_interactions(100.0)
+                return (time.perf_counter() - start) / steps
+
+            plain = run()
+            points = space.attach_checkpoints(folder, every=100.0, keyframe_every=keyframe_every)
+            saved = run()
+            points.flush()
+            entries = checkpoint.read_manifest(folder)
+            sizes = {kind: np.mean([os.path.getsize(os.path.join(folder, e['file'])) for e in entries
+                                    if e['kind'] == kind]) for kind in ('keyframe', 'delta')}
+            capture = 0.0
+            for _ in range(steps):
+                start = time.perf_counter()
+                points.save(space)
+                capture += time.perf_counter() - start
+                points.flush()
+            space.detach_checkpoints()
+            assert points.count == 2 * steps + 1
+            overhead = saved / plain - 1
+            results.append((n, plain, saved, overhead, capture / steps, sizes['keyframe'], sizes['delta']))
+            print(f'{n:>8} {plain:>8.3g} {saved:>13.3g} {overhead:>8.1%} {capture / steps * 1000:>13.2f} '
+                  f'{sizes["keyframe"] / 2**20:>9.2f} {sizes["delta"] / 2**20:>11.2f}')
+    return results
+
+
+def bench_registry(ns=(100000, 1000000), removals=1000, lookups=1000):
+    """
+    Замер реестра объектов (registry): добавление N объектов из массивов (Space.add_arrays()) против создания
+    объектов SpaceObjects и Space.add_obj(); поиск по имени против перебора списка; удаление объектов по одному
+    переносом последнего (swap-remove) против прежнего удаления со сдвигом массивов и списка (O(N)).
+
+    return: список кортежей (N, add_arrays, с, add_obj, с, поиск, с, перебор, с, удаление, с, со сдвигом, с)
+
+    """
+
+    results = []
+    print(f'{"N":>8} {"add_arrays, с":>14} {"add_obj, с":>11} {"поиск, мкс":>11} {"перебор, мкс":>13} '
+          f'{"удаление, мкс":>14} {"со сдвигом, мкс":>16}')
+    for n in ns:
+        rng = np.random.default_rng(1)
+        mass, radius = rng.uniform(1.0e20, 1.0e25, n), rng.uniform(1.0e5, 1.0e7, n)
+        pos, vel = rng.normal(0, 1.0e11, (n, 2)), rng.normal(0, 3.0e4, (n, 2))
+
+        space = Space(engine=True)
+        start = time.perf_counter()
+        space.add_arrays(mass, radius, pos, vel)
+        bulk = time.perf_counter() - start
+
+        other = Space(engine=True)
+        start = time.perf_counter()
+        bodies = []
+        for i, (m, r, (x, y), (vx, vy)) in enumerate(zip(mass.tolist(), radius.tolist(), pos.tolist(), vel.tolist())):
+            body = SpaceObjects(f'Body {i}', m, r)
+            body.set_coord(x, y, vx, vy, t=0)
+            bodies.append(body)
+        other.add_obj(*bodies)
+        single = time.perf_counter() - start
+        del other, bodies
+
+        names = [f'Body {i}' for i in rng.integers(0, n, lookups).tolist()]
+        space.find_obj(names[0])
+        start = time.perf_counter()
+        for name in names:
+            space.find_obj(name)
+        lookup = (time.perf_counter() - start) / lookups
+        start = time.perf_counter()
+        for name in names[:10]:
+            next(o for o in space.Objects if o.Name == name)
+        scan = (time.perf_counter() - start) / 10
+
+        # в пространстве остается хотя бы один объект - для замера удаления со сдвигом
+        count = min(removals, n - 1)
+        ids = rng.choice(n, count, replace=False).tolist()
+        start = time.perf_counter()
+        for i in ids:
+            space.remove_obj(space.get_obj(i))
+        swap = (time.perf_counter() - start) / count if count else 0.0
+
+        # прежнее удаление: строки после удаленной сдвигаются, список объектов собирается заново
+        engine, shifted = space.Engine, 10
+        start = time.perf_counter()
+        for _ in range(shifted):
+            keep = np.ones(engine.n, dtype=bool)
+            keep[engine.n // 2] = False
+            for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source'):
+                array = getattr(engine, name)
+                array[:engine.n - 1] = array[:engine.n][keep]
+            objects = [o for o, k in zip(engine.objects, keep.tolist()) if k]
+            for i in range(engine.n // 2, engine.n - 1):
+                objects[i]._idx = i
+        ordered = (time.perf_counter() - start) / shifted
+        assert len(space.Objects) == n - count
+
+        results.append((n, bulk, single, lookup, scan, swap, ordered))
+        print(f'{n:>8} {bulk:>14.3g} {single:>11.3g} {lookup * 1e6:>11.3g} {scan * 1e6:>13.3g} {swap * 1e6:>14.3g} '
+              f'{ordered * 1e6:>16.3g}')
+    return results
+
+
+class LegacyObject:
+    """
+    Объект с атрибутами в словаре экземпляра (__dict__) - представление SpaceObjects до перехода на __slots__,
+    для сравнения памяти: те же атрибуты, у окна в массивы движка - без атрибутов состояния.
+
+    """
+
+    def __init__(self, name, mass, r, x, y, vx, vy, view=False):
+        self._store = None
+        self._idx = None
+        self.Name = name
+        self.Id = None
+        if not view:
+            self._Mass, self._R = mass, r
+            self._X, self._Y, self._Vx, self._Vy, self._Ax, self._Ay = x, y, vx, vy, 0.0, 0.0
+            self._StaticCoord = self._CoordFromTime = False
+        self.Color = None
+        self.Orbit = None
+
+
+def bench_memory(ns=(1000000,)):
+    """
+    Замер памяти на объект: прежнее представление объекта (атрибуты в __dict__, LegacyObject) против SpaceObjects
+    с __slots__ - для объекта с собственным состоянием и для окна в массивы движка (привязанного объекта);
+    пространство целиком после Space.add_arrays() (объекты, реестр и массивы движка).
+    Значения атрибутов и имена создаются до замера - учитываются только сами объекты.
+
+    return: список кортежей (N, название, байт на объект, с)
+
+    """
+
+    def measure(build):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        built = build()
+        seconds = time.perf_counter() - start
+        size = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        del built
+        return size, seconds
+
+    def slotted(view):
+        objects = []
+        for name, m, r, (x, y), (vx, vy) in rows:
+            if view:
+                objects.append(SpaceObjects._view(name))
+                continue
+            o = SpaceObjects(name, m, r)
+            o.X, o.Y, o.Vx, o.Vy, o.Ax, o.Ay = x, y, vx, vy, 0.0, 0.0
+            objects.append(o)
+        return objects
+
+    def space():
+        built = Space(engine=True)
+        built.add_arrays(mass, radius, pos, vel, names=names)
+        return built
+
+    results = []
+    print(f'{"N":>8} {"представление":<38} {"байт/объект":>12} {"создание, с":>12}')
+    for n in ns:
+        rng = np.random.default_rng(1)
+        mass, radius = rng.uniform(1.0e20, 1.0e25, n), rng.uniform(1.0e5, 1.0e7, n)
+        pos, vel = rng.normal(0, 1.0e11, (n, 2)), rng.normal(0, 3.0e4, (n, 2))
+        names = [f'Body {i}' for i in range(n)]
+        rows = list(zip(names, mass.tolist(), radius.tolist(), pos.tolist(), vel.tolist()))
+        cases = (('объект, __dict__ (прежний)', lambda: [LegacyObject(name, m, r, x, y, vx, vy)
+                                                      for name, m, r, (x, y), (vx, vy) in rows]),
+                 ('объект, __slots__', lambda: slotted(False)),
+                 ('окно в массивы, __dict__ (прежнее)', lambda: [LegacyObject(name, m, r, x, y, vx, vy, view=True)
+                                                              for name, m, r, (x, y), (vx, vy) in rows]),
+                 ('окно в массивы, __slots__', lambda: slotted(True)),
+                 ('Space.add_arrays(), всего', space))
+        for title, build in cases:
+            size, seconds = measure(build)
+            results.append((n, title, size / n, seconds))
+            print(f'{n:>8} {title:<38} {size / n:>12.1f} {seconds:>12.3g}')
+    return results
+
+
+if __name__ == "__main__":
+
+    benches = {'gravity': bench_gravity, 'barnes-hut': bench_barnes_hut, 'integrators': bench_integrators,
+               'time-steps': bench_time_steps, 'ensemble': bench_ensemble,
+               'evolution': bench_evolution, 'kepler': bench_kepler,
+               'snapshot': bench_snapshot, 'recorder': bench_recorder,
+               'worker': bench_worker, 'render': bench_render,
+               'hud': bench_hud, 'field': bench_field, 'collisions': bench_collisions,
+               'particles': bench_particles, 'profiler': bench_profiler,
+               'scene-io': bench_scene_io, 'checkpoints': bench_checkpoints, 'registry': bench_registry,
+               'memory': bench_memory}
+    name = sys.argv[1] if len(sys.argv) > 1 else 'gravity'
+    ns = tuple(map(int, sys.argv[2:]))
+    benches[name](*(ns and (ns,)))
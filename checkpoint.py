@@ -0,0 +1,312 @@
+"""
+Автоматические контрольные точки расчета.
+
+Checkpointer, подключенный к Space (Space.attach_checkpoints()), сохраняет состояние каждые every модельных
+секунд и/или каждые wall секунд реального времени. На границе шага состояние только копируется (массивы движка),
+файлы записываются в фоновом потоке - расчет не ждет диска.
+
+Контрольные точки двух видов:
+* ключевой кадр - полный двоичный снимок (см. snapshot), файл keyframe_<номер>.snap;
+* дельта - только изменившееся относительно последнего ключевого кадра: номера изменившихся объектов и значения
+  изменившихся столбцов, файл delta_<номер>.dlt. Значения хранятся без потерь: побитовое исключающее ИЛИ
+  с ключевым кадром, байты перегруппированы по старшинству (у близких чисел старшие байты разности нулевые)
+  и сжаты zlib. Формат файла - как у снимков, сигнатура b'SPDELT'.
+
+Каждый keyframe_every-й кадр - ключевой; ключевой кадр пишется и при изменении состава объектов
+(добавление, удаление, слияние, загрузка) и орбит объектов на кеплеровых орбитах (они хранятся в заголовке
+ключевого кадра, см. Space.orbits()). Хранятся контрольные точки последних keep ключевых кадров.
+
+Журнал checkpoints.json перечисляет записанные контрольные точки с контрольными суммами CRC32 файлов.
+Журнал дописывается только после полной записи файла (запись во временный файл с заменой), поэтому сбой
+во время записи не портит уже записанные точки. resume() восстанавливает пространство по последней
+контрольной точке, файлы которой (и ее ключевого кадра) совпадают с контрольными суммами.
+
+"""
+
+
+import json
+import os
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import snapshot
+from space import Space
+
+
+MAGIC = b'SPDELT'
+MANIFEST = 'checkpoints.json'
+# столбцы состояния, сравниваемые с ключевым кадром
+STATE = ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source')
+
+
+def capture(space):
+    """
+    Функция возвращает копию столбцов состояния объектов пространства (см. STATE).
+
+    """
+
+    engine = space.Engine
+    if engine is not None:
+        n = engine.n
+        return {name: getattr(engine, name)[:n].copy() for name in STATE}
+    objects = space.Objects
+
+    def pairs(a, b):
+        return np.array([(getattr(o, a) or 0.0, getattr(o, b) or 0.0) for o in objects], dtype=float).reshape(-1, 2)
+
+    return {'mass': np.array([o.Mass for o in objects], dtype=float), 'r': np.array([o.R for o in objects], dtype=float),
+            'pos': pairs('X', 'Y'), 'vel': pairs('Vx', 'Vy'), 'acc': pairs('Ax', 'Ay'),
+            'static': np.array([o.StaticCoord for o in objects], dtype=bool),
+            'from_time': np.array([o.CoordFromTime for o in objects], dtype=bool),
+            'source': np.array([o.GravitySource for o in objects], dtype=bool)}
+
+
+def encode(values, base):
+    """
+    Функция кодирует значения values относительно base (массивы одинаковой формы) без потерь.
+
+    return: байты
+
+    """
+
+    size = values.dtype.itemsize
+    x = np.bitwise_xor(np.ascontiguousarray(values).reshape(-1).view(np.uint8),
+                       np.ascontiguousarray(base).reshape(-1).view(np.uint8))
+    # байты одного старшинства - подряд: длинные серии нулей сжимаются лучше
+    return zlib.compress(np.ascontiguousarray(x.reshape(-1, size).T).tobytes(), 1)
+
+
+def decode(data, base):
+    """
+    Функция восстанавливает значения, закодированные encode() относительно base.
+
+    """
+
+    size = base.dtype.itemsize
+    x = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(size, -1).T
+    raw = np.bitwise_xor(np.ascontiguousarray(x).reshape(-1), np.ascontiguousarray(base).reshape(-1).view(np.uint8))
+    return raw.view(base.dtype).reshape(base.shape)
+
+
+def write_delta(path, time, keyframe, base, state):
+    """
+    Функция записывает дельту состояния state относительно состояния ключевого кадра base в файл path.
+
+    keyframe: имя файла ключевого кадра.
+
+    """
+
+    n = len(state['mass'])
+    changed = np.zeros(n, dtype=bool)
+    columns = []
+    for name in STATE:
+        diff = state[name] != base[name]
+        if diff.ndim > 1:
+            diff = diff.any(axis=1)
+        if diff.any():
+            changed |= diff
+            columns.append(name)
+    rows = np.flatnonzero(changed)
+    arrays = {'rows': rows.astype('<i8')}
+    for name in columns:
+        arrays[name] = np.frombuffer(encode(state[name][rows], base[name][rows]), dtype=np.uint8)
+    prefix, table, _ = snapshot.layout(MAGIC, {'n': n, 'time': time, 'keyframe': keyframe, 'changed': columns},
+                                       {name: (array.dtype, array.shape) for name, array in arrays.items()})
+    temp = path + '.tmp'
+    with open(temp, 'wb') as file:
+        file.write(prefix)
+        for name, array in arrays.items():
+            file.write(b'\0' * (table[name][2] - file.tell()))
+            file.write(array.tobytes())
+    os.replace(temp, path)
+    return len(rows)
+
+
+def apply_delta(path, engine):
+    """
+    Функция применяет дельту из файла path к массивам движка engine (загруженного из ее ключевого кадра).
+
+    return: модельное время дельты
+
+    """
+
+    with open(path, 'rb') as file:
+        header = snapshot.read_header(file, MAGIC)
+        data = {}
+        for name, (dtype, shape, offset) in header['columns'].items():
+            file.seek(offset)
+            data[name] = np.fromfile(file, dtype=dtype, count=int(np.prod(shape)))
+    assert header['n'] == engine.n, f"Дельта '{path}' не соответствует ключевому кадру: {header['n']} != {engine.n}."
+    rows = data['rows']
+    for name in header['changed']:
+        array = getattr(engine, name)
+        array[rows] = decode(data[name].tobytes(), array[rows])
+    return header['time']
+
+
+def crc(path):
+    with open(path, 'rb') as file:
+        return zlib.crc32(file.read())
+
+
+def read_manifest(folder):
+    """
+    Функция возвращает список записей журнала контрольных точек папки folder (пустой, если журнала нет).
+
+    """
+
+    path = os.path.join(folder, MANIFEST)
+    if not os.path.exists(path):
+        return []
+    with open(path) as file:
+        return json.load(file)['entries']
+
+
+class Checkpointer:
+    """
+    Класс автоматических контрольных точек пространства.
+
+    folder - папка контрольных точек.
+    every - интервал модельного времени между контрольными точками, с (None - не ограничен).
+    wall - интервал реального времени между контрольными точками, с (None - не ограничен).
+    keyframe_every - каждая keyframe_every-я контрольная точка - ключевой кадр.
+    keep - количество хранимых ключевых кадров (с их дельтами).
+    count - количество контрольных точек, записанных с подключения.
+
+    """
+
+    def __init__(self, folder, every=None, wall=None, keyframe_every=10, keep=3):
+        assert every or wall, "Не задан интервал контрольных точек."
+        assert keyframe_every > 0 and keep > 0, f"Некорректные параметры: {keyframe_every}, {keep}."
+        os.makedirs(folder, exist_ok=True)
+        self.folder = folder
+        self.every = every
+        self.wall = wall
+        self.keyframe_every = keyframe_every
+        self.keep = keep
+        self.count = 0
+        # записи журнала продолжают номера точек прежнего расчета (после resume())
+        self._entries = read_manifest(folder)
+        self._seq = max((e['seq'] for e in self._entries), default=0)
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='checkpoint')
+        self._pending = []
+        # ключевой кадр, относительно которого пишутся дельты: версия состава объектов, состояние, имя файла
+        self._base = None
+        self._since_keyframe = 0
+        self._next_time = None
+        self._next_wall = None
+
+    def step(self, space):
+        """
+        Метод вызывается после каждого шага: записывает контрольную точку, если подошел срок.
+
+        """
+
+        if self.every and space.Time >= self._next_time or self.wall and time.perf_counter() >= self._next_wall:
+            self.save(space)
+
+    def save(self, space):
+        """
+        Метод фиксирует состояние пространства (на границе шага) и записывает контрольную точку в фоне.
+
+        return: Future записи
+
+        """
+
+        self._seq += 1
+        self.count += 1
+        self._next_time = space.Time + (self.every or 0)
+        self._next_wall = time.perf_counter() + (self.wall or 0)
+        state = capture(space)
+        orbits = space.orbits()
+        base = self._base
+        if base is None or self._since_keyframe + 1 >= self.keyframe_every or space.Objects.version != base[0] \
+                or orbits != base[3]:
+            name = f'keyframe_{self._seq:06d}.snap'
+            self._base = (space.Objects.version, state, name, orbits)
+            self._since_keyframe = 0
+            write = space.save_later(os.path.join(self.folder, name))
+            entry = {'seq': self._seq, 'kind': 'keyframe', 'file': name, 'time': space.Time, 'keyframe': name}
+        else:
+            name = f'delta_{self._seq:06d}.dlt'
+            self._since_keyframe += 1
+            path, t, keyframe, base_state = os.path.join(self.folder, name), space.Time, base[2], base[1]
+
+            def write():
+                return write_delta(path, t, keyframe, base_state, state)
+
+            entry = {'seq': self._seq, 'kind': 'delta', 'file': name, 'time': space.Time, 'keyframe': base[2]}
+        future = self._executor.submit(self._write, write, entry)
+        self._pending = [f for f in self._pending if not f.done()] + [future]
+        return future
+
+    def _write(self, write, entry):
+        """
+        Метод записывает файл контрольной точки, затем журнал; удаляет точки старых ключевых кадров.
+
+        """
+
+        write()
+        entry['crc'] = crc(os.path.join(self.folder, entry['file']))
+        self._entries.append(entry)
+        keyframes = [e['file'] for e in self._entries if e['kind'] == 'keyframe'][-self.keep:]
+        stale = [e for e in self._entries if e['keyframe'] not in keyframes]
+        self._entries = [e for e in self._entries if e['keyframe'] in keyframes]
+        path = os.path.join(self.folder, MANIFEST)
+        with open(path + '.tmp', 'w') as file:
+            json.dump({'entries': self._entries}, file, indent=1)
+        os.replace(path + '.tmp', path)
+        # файлы удаляются после записи журнала - журнал не ссылается на удаленные файлы
+        for e in stale:
+            stale_path = os.path.join(self.folder, e['file'])
+            if os.path.exists(stale_path):
+                os.remove(stale_path)
+        return entry
+
+    def flush(self):
+        """
+        Метод дожидается записи всех контрольных точек (исключения записи передаются вызывающему).
+
+        """
+
+        for future in self._pending:
+            future.result()
+        self._pending = []
+
+    def close(self):
+        self.flush()
+        self._executor.shutdown(wait=True)
+
+
+def resume(folder, engine=True):
+    """
+    Функция восстанавливает пространство по последней целой контрольной точке папки folder.
+
+    engine: оставить векторизованный движок включенным.
+
+    return: пространство (Space), запись журнала восстановленной контрольной точки
+
+    """
+
+    entries = read_manifest(folder)
+    checked = {}
+
+    def intact(name):
+        if name not in checked:
+            entry = next((e for e in entries if e['file'] == name), None)
+            path = os.path.join(folder, name)
+            checked[name] = entry is not None and os.path.exists(path) and crc(path) == entry['crc']
+        return checked[name]
+
+    for entry in reversed(entries):
+        if not (intact(entry['file']) and intact(entry['keyframe'])):
+            continue
+        space = Space(engine=True)
+        space.load_snapshot(os.path.join(folder, entry['keyframe']), mmap=False)
+        if entry['kind'] == 'delta':
+            space.Time = apply_delta(os.path.join(folder, entry['file']), space.Engine)
+        if not engine:
+            space.use_engine(False)
+        return space, entry
+    raise FileNotFoundError(f"В папке '{folder}' нет целых контрольных точек.")
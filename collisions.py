@@ -0,0 +1,170 @@
+"""
+Столкновения и слияние объектов.
+
+Перед каждым шагом движение объектов на шаг вперед прогнозируется отрезком из текущих координат в x + v*t + a*t**2/2.
+Широкая фаза: прямоугольники, охватывающие отрезки движения объектов с их радиусами, сортируются по оси наибольшего
+разброса (sweep and prune) - пары-кандидаты находятся за O(N log N + K) без перебора всех пар.
+Узкая фаза: для каждой пары-кандидата решается, сближаются ли объекты на сумму радиусов в какой-либо момент шага
+(столкновение не пропускается, даже если за шаг объекты пролетают друг сквозь друга).
+
+Столкнувшиеся объекты (в том числе цепочки A-B, B-C) объединяются в один: массы складываются,
+координаты и скорость - центра масс (импульс сохраняется), объем - суммарный.
+Удаления выполняются одним пакетом на шаг.
+Пробные частицы (TestParticle) друг с другом не сталкиваются, а при столкновении с массивным объектом поглощаются им.
+
+"""
+
+
+import numpy as np
+
+
+def candidate_pairs(lo, hi):
+    """
+    Функция возвращает пары пересекающихся прямоугольников (широкая фаза).
+
+    lo, hi: нижние левые и верхние правые углы прямоугольников, массивы (n, 2).
+
+    return: массивы индексов i, j (i < j)
+
+    """
+
+    n = len(lo)
+    if n < 2:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    # сортировка по оси наибольшего разброса - меньше случайных пересечений проекций
+    axis = int(np.argmax(np.ptp(lo, axis=0)))
+    other = 1 - axis
+    order = np.argsort(lo[:, axis], kind='stable')
+    start = lo[order, axis]
+    # кандидаты прямоугольника - следующие за ним по порядку, начало которых не дальше его конца
+    count = np.searchsorted(start, hi[order, axis], side='right') - np.arange(n) - 1
+    first = np.repeat(np.arange(n), count)
+    second = first + 1 + np.arange(len(first)) - np.repeat(np.cumsum(count) - count, count)
+    i, j = order[first], order[second]
+    overlap = (lo[i, other] <= hi[j, other]) & (lo[j, other] <= hi[i, other])
+    i, j = i[overlap], j[overlap]
+    return np.minimum(i, j), np.maximum(i, j)
+
+
+def swept_contact(p0, p1, radius, i, j):
+    """
+    Функция проверяет пары (i, j) (узкая фаза): сближаются ли объекты на сумму радиусов,
+    если каждый движется равномерно по отрезку из p0 в p1.
+
+    return: маска столкнувшихся пар, доля шага до касания (0 - объекты уже пересекаются)
+
+    """
+
+    d0 = p0[j] - p0[i]
+    dv = (p1[j] - p1[i]) - d0
+    reach = radius[i] + radius[j]
+    # |d0 + tau * dv|**2 = reach**2: a * tau**2 + 2 * b * tau + c = 0
+    a = np.einsum('ij,ij->i', dv, dv)
+    b = np.einsum('ij,ij->i', d0, dv)
+    c = np.einsum('ij,ij->i', d0, d0) - reach**2
+    disc = b * b - a * c
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tau = np.where(a > 0, (-b - np.sqrt(np.maximum(disc, 0.0))) / a, np.inf)
+    tau = np.where(c <= 0, 0.0, tau)
+    hit = (c <= 0) | ((disc >= 0) & (b < 0) & (tau >= 0) & (tau <= 1))
+    return hit, tau
+
+
+def groups(n, i, j):
+    """
+    Функция объединяет пары столкнувшихся объектов в группы (связные компоненты).
+
+    return: метки групп - массив (n,), метка группы - наименьший индекс ее объекта
+
+    """
+
+    labels = np.arange(n)
+    while len(i):
+        low = np.minimum(labels[i], labels[j])
+        np.minimum.at(labels, i, low)
+        np.minimum.at(labels, j, low)
+        # сжатие путей: метка указывает на корень группы
+        labels = labels[labels]
+        if np.array_equal(labels[i], labels[j]):
+            break
+    return labels
+
+
+class Collisions:
+    """
+    Класс обработки столкновений пространства.
+
+    pairs - количество пар-кандидатов широкой фазы на последней проверке.
+    contacts - количество столкнувшихся пар на последней проверке.
+    merged - количество объектов, поглощенных при слияниях, с начала расчета.
+
+    """
+
+    def __init__(self):
+        self.pairs = 0
+        self.contacts = 0
+        self.merged = 0
+
+    def detect(self, pos, vel, acc, radius, movable, t, source=None):
+        """
+        Метод находит пары объектов, которые столкнутся за шаг длительностью t.
+
+        movable: маска объектов, движущихся под действием гравитации (остальные - по своей скорости).
+        source: маска объектов, которые притягивают (None - все объекты); пары из двух пробных частиц не проверяются.
+
+        return: массивы индексов i, j столкнувшихся пар
+
+        """
+
+        end = pos + vel * t
+        end[movable] += 0.5 * acc[movable] * t * t
+        lo = np.minimum(pos, end) - radius[:, np.newaxis]
+        hi = np.maximum(pos, end) + radius[:, np.newaxis]
+        i, j = candidate_pairs(lo, hi)
+        if source is not None:
+            massive = source[i] | source[j]
+            i, j = i[massive], j[massive]
+        self.pairs = len(i)
+        hit, _ = swept_contact(pos, end, radius, i, j)
+        self.contacts = int(hit.sum())
+        return i[hit], j[hit]
+
+    def merge(self, mass, radius, pos, vel, fixed, i, j, source=None):
+        """
+        Метод вычисляет результат слияния столкнувшихся пар (i, j).
+
+        fixed: маска объектов, координаты и скорость которых не меняются гравитацией (StaticCoord, CoordFromTime):
+        такой объект в группе остается на своем месте и поглощает остальные.
+        source: маска объектов, которые притягивают (None - все объекты): пробная частица поглощается массивным
+        объектом группы.
+
+        return: индексы сохраняемых объектов, их новые масса, радиус, координаты, скорость;
+        индексы поглощенных объектов
+
+        """
+
+        labels = groups(len(mass), i, j)
+        members = np.unique(np.concatenate((i, j)))
+        root = labels[members]
+        roots, group = np.unique(root, return_inverse=True)
+        k = len(roots)
+        m = mass[members]
+        total = np.bincount(group, weights=m, minlength=k)
+        center = np.column_stack([np.bincount(group, weights=m * pos[members, c], minlength=k) for c in (0, 1)])
+        momentum = np.column_stack([np.bincount(group, weights=m * vel[members, c], minlength=k) for c in (0, 1)])
+        volume = np.bincount(group, weights=radius[members]**3, minlength=k)
+
+        # сохраняется неподвижный (по орбите) объект группы, затем - притягивающий, затем - самый массивный
+        attracts = np.ones(len(members), dtype=bool) if source is None else source[members]
+        rank = np.lexsort((-m, ~attracts, ~fixed[members], group))
+        head = np.ones(len(rank), dtype=bool)
+        head[1:] = group[rank[1:]] != group[rank[:-1]]
+        keep = members[rank[head]]
+        gone = np.setdiff1d(members, keep)
+
+        new_pos = center / total[:, np.newaxis]
+        new_vel = momentum / total[:, np.newaxis]
+        new_pos[fixed[keep]] = pos[keep[fixed[keep]]]
+        new_vel[fixed[keep]] = vel[keep[fixed[keep]]]
+        self.merged += len(gone)
+        return keep, total, np.cbrt(volume), new_pos, new_vel, gone
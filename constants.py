@@ -0,0 +1,11 @@
+"""
+Физические постоянные.
+
+Значения совпадают с scipy.constants (CODATA 2018): ядро моделирования не импортирует scipy -
+импорт scipy.constants занимает больше времени, чем импорт всего ядра.
+
+"""
+
+
+# гравитационная постоянная, м**3 / (кг * с**2)
+G = 6.6743e-11
@@ -0,0 +1,421 @@
+"""
+Векторизованный движок гравитационного взаимодействия.
+
+Состояние всех объектов хранится в непрерывных массивах NumPy (структура массивов):
+массы, радиусы, координаты, скорости и ускорения. Объекты SpaceObjects, добавленные в движок,
+становятся "окнами" (view) в эти массивы, поэтому MainLoop.draw и Space.save_obj работают без изменений.
+
+Ускорения всех объектов вычисляются решателем за один пакетный проход, а не в цикле по парам объектов:
+DirectSum - точный попарный расчет, barnes_hut.BarnesHut - приближенный расчет по дереву квадрантов.
+
+"""
+
+
+import itertools
+import os
+import numpy as np
+from constants import G
+from integrators import Euler
+from registry import swap_plan
+from objects import STATE
+
+
+# общий счетчик версий состава: версия движка не совпадает с версией любого другого движка
+_versions = itertools.count(1)
+
+
+class DirectSum:
+    """
+    Точный решатель: ускорение каждого объекта - сумма притяжений всех остальных объектов, O(N**2).
+
+    block - количество строк матрицы взаимодействий, обрабатываемых за один проход
+    (ограничивает потребление памяти при большом числе объектов).
+
+    """
+
+    def __init__(self, block=512):
+        self.block = block
+
+    def accelerations(self, pos, mass, out=None, targets=None, sources=None):
+        """
+        Метод вычисляет суммарные гравитационные ускорения объектов за один пакетный проход.
+
+        pos: координаты объектов, массив (n, 2).
+        mass: массы объектов.
+        out: массив для записи результата (по умолчанию создается новый).
+        targets: индексы объектов, для которых нужны ускорения (по умолчанию - все объекты).
+        sources: индексы объектов, которые притягивают (по умолчанию - все n объектов).
+
+        return: массив (len(targets), 2) проекций ускорений
+
+        """
+
+        if targets is None:
+            targets = np.arange(len(pos))
+        if out is None:
+            out = np.empty((len(targets), 2))
+        spos, smass = (pos, mass) if sources is None else (pos[sources], mass[sources])
+        for start in range(0, len(targets), self.block):
+            stop = min(start + self.block, len(targets))
+            rows = targets[start:stop]
+            # векторы от объектов блока ко всем притягивающим объектам: (блок, n, 2)
+            d = spos[np.newaxis, :, :] - pos[rows, np.newaxis, :]
+            r2 = np.einsum('ijk,ijk->ij', d, d)
+            # объект не притягивает сам себя
+            self._exclude_self(r2, rows, sources)
+            k = smass / (r2 * np.sqrt(r2))
+            out[start:stop] = G * np.einsum('ij,ijk->ik', k, d)
+        return out
+
+    @staticmethod
+    def _exclude_self(r2, rows, sources):
+        """
+        Метод исключает притяжение объектов rows к самим себе: квадраты расстояний до себя - бесконечность.
+
+        """
+
+        if sources is None:
+            r2[np.arange(len(rows)), rows] = np.inf
+        else:
+            r2[rows[:, np.newaxis] == sources[np.newaxis, :]] = np.inf
+
+    def jerks(self, pos, vel, mass, targets=None, sources=None):
+        """
+        Метод вычисляет производные ускорений по времени (рывки) объектов targets.
+
+        j_i = G * sum(m_j * (v_ij / r_ij**3 - 3 * (r_ij, v_ij) * r_ij / r_ij**5))
+        sources: индексы объектов, которые притягивают (по умолчанию - все объекты).
+
+        return: массив (len(targets), 2) проекций рывков
+
+        """
+
+        if targets is None:
+            targets = np.arange(len(pos))
+        out = np.empty((len(targets), 2))
+        spos, svel, smass = (pos, vel, mass) if sources is None else (pos[sources], vel[sources], mass[sources])
+        for start in range(0, len(targets), self.block):
+            stop = min(start + self.block, len(targets))
+            rows = targets[start:stop]
+            d = spos[np.newaxis, :, :] - pos[rows, np.newaxis, :]
+            dv = svel[np.newaxis, :, :] - vel[rows, np.newaxis, :]
+            r2 = np.einsum('ijk,ijk->ij', d, d)
+            self._exclude_self(r2, rows, sources)
+            k = smass / (r2 * np.sqrt(r2))
+            rv = 3 * np.einsum('ijk,ijk->ij', d, dv) / r2
+            out[start:stop] = G * (np.einsum('ij,ijk->ik', k, dv) - np.einsum('ij,ijk->ik', k * rv, d))
+        return out
+
+    def nearest(self, pos, targets=None):
+        """
+        Метод возвращает расстояния от объектов targets до ближайших к ним объектов.
+
+        """
+
+        if targets is None:
+            targets = np.arange(len(pos))
+        out = np.empty(len(targets))
+        for start in range(0, len(targets), self.block):
+            stop = min(start + self.block, len(targets))
+            rows = targets[start:stop]
+            d = pos[np.newaxis, :, :] - pos[rows, np.newaxis, :]
+            r2 = np.einsum('ijk,ijk->ij', d, d)
+            r2[np.arange(stop - start), rows] = np.inf
+            out[start:stop] = np.sqrt(r2.min(axis=1))
+        return out
+
+
+class ArrayEngine:
+    """
+    Класс, хранящий состояние объектов в виде структуры массивов и рассчитывающий их взаимодействие.
+
+    n - количество объектов в движке.
+    mass - массы объектов.
+    r - радиусы объектов.
+    pos - координаты объектов, массив (capacity, 2).
+    vel - проекции скоростей объектов, массив (capacity, 2).
+    acc - проекции ускорений объектов, массив (capacity, 2).
+    static - флаги StaticCoord.
+    from_time - флаги CoordFromTime.
+    source - флаги GravitySource: False - пробная частица (objects.TestParticle), которая никого не притягивает.
+    objects - объекты SpaceObjects, привязанные к движку (objects[i] смотрит в строку i массивов).
+    solver - решатель, вычисляющий ускорения (DirectSum - точный попарный расчет,
+    barnes_hut.BarnesHut - приближенный расчет по дереву квадрантов).
+    integrator - численный метод интегрирования движения (см. integrators).
+    evaluations - счетчик вычислений ускорений отдельных объектов (для оценки затрат численных методов).
+    version - номер состава объектов: новый при каждом добавлении и удалении объектов (уникален среди всех
+    движков); по нему численные методы определяют, что запомненные ускорения устарели.
+
+    """
+
+    def __init__(self, capacity=16, solver=None, integrator=None):
+        self.n = 0
+        self.version = next(_versions)
+        self.evaluations = 0
+        self.solver = solver or DirectSum()
+        self.integrator = integrator or Euler()
+        self.objects = []
+        self.mass = np.zeros(capacity)
+        self.r = np.zeros(capacity)
+        self.pos = np.zeros((capacity, 2))
+        self.vel = np.zeros((capacity, 2))
+        self.acc = np.zeros((capacity, 2))
+        self.static = np.zeros(capacity, dtype=bool)
+        self.from_time = np.zeros(capacity, dtype=bool)
+        self.source = np.zeros(capacity, dtype=bool)
+
+    def __len__(self):
+        return self.n
+
+    def _reserve(self, capacity):
+        """
+        Метод увеличивает емкость массивов (не менее чем вдвое), сохраняя их содержимое.
+
+        """
+
+        if capacity <= len(self.mass):
+            return
+        capacity = max(capacity, 2 * len(self.mass))
+        for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source'):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.n] = old[:self.n]
+            setattr(self, name, new)
+
+    def add(self, obj):
+        """
+        Метод копирует состояние объекта в массивы движка и привязывает объект к ним.
+
+        obj: Объект класса SpaceObjects.
+
+        return: индекс объекта в массивах движка
+
+        """
+
+        self._reserve(self.n + 1)
+        i = self.n
+        # до привязки атрибуты читаются из самого объекта, неустановленные координаты считаем нулевыми
+        self.mass[i] = obj.Mass
+        self.r[i] = obj.R
+        self.pos[i] = obj.X or 0.0, obj.Y or 0.0
+        self.vel[i] = obj.Vx or 0.0, obj.Vy or 0.0
+        self.acc[i] = obj.Ax or 0.0, obj.Ay or 0.0
+        self.static[i] = obj.StaticCoord
+        self.from_time[i] = obj.CoordFromTime
+        self.source[i] = obj.GravitySource
+        self.n += 1
+        self.version = next(_versions)
+        self.objects.append(obj)
+        # привязанный объект хранит только номер строки - собственное состояние освобождается
+        obj._store, obj._idx, obj._own = self, i, None
+        return i
+
+    def detach(self, obj):
+        """
+        Метод отвязывает объект от движка: значения атрибутов копируются обратно в объект.
+
+        """
+
+        if obj._store is not self:
+            # объект уже перепривязан к другому движку
+            return
+        obj._own = [getattr(obj, name) for name in STATE]
+        obj._store, obj._idx = None, None
+
+    def remove(self, indices):
+        """
+        Метод удаляет объекты с индексами indices: на их строки переносятся строки последних объектов
+        (swap-remove, см. registry.swap_plan()) - массивы остаются плотными, затраты пропорциональны количеству
+        удаленных объектов. Перенесенные объекты перепривязываются к новым строкам, удаленные - отвязываются
+        от движка. Порядок объектов меняется так же, как в реестре пространства (registry.Registry.swap_remove()).
+
+        """
+
+        n, holes, movers = swap_plan(self.n, indices)
+        if n == self.n:
+            return
+        for i in np.unique(np.asarray(indices, dtype=np.int64)).tolist():
+            self.detach(self.objects[i])
+        for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source'):
+            array = getattr(self, name)
+            array[holes] = array[movers]
+        for hole, mover in zip(holes.tolist(), movers.tolist()):
+            obj = self.objects[mover]
+            self.objects[hole] = obj
+            obj._idx = hole
+        del self.objects[n:]
+        self.n = n
+        self.version = next(_versions)
+
+    def extend(self, objects, **arrays):
+        """
+        Метод добавляет объекты objects пакетом: строки состояния копируются из массивов arrays
+        одной операцией на столбец, объекты привязываются к новым строкам (их собственные значения не читаются).
+
+        arrays: mass, r, pos, vel, acc, static, from_time, source - массивы длиной len(objects).
+
+        return: индекс первого добавленного объекта
+
+        """
+
+        k = len(objects)
+        start = self.n
+        self._reserve(start + k)
+        for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source'):
+            getattr(self, name)[start:start + k] = arrays[name]
+        self.objects.extend(objects)
+        for i, obj in enumerate(objects, start):
+            obj._store, obj._idx, obj._own = self, i, None
+        self.n += k
+        self.version = next(_versions)
+        return start
+
+    def clear(self):
+        """
+        Метод очищает движок, предварительно отвязав от него все объекты.
+
+        """
+
+        for obj in self.objects:
+            self.detach(obj)
+        self.objects = []
+        self.n = 0
+        self.version = next(_versions)
+
+    def adopt(self, objects, **arrays):
+        """
+        Метод заменяет содержимое движка готовыми массивами состояния без их копирования
+        (например, отображенными в память столбцами снимка snapshot.Snapshot) и привязывает к ним объекты:
+        objects[i] смотрит в строку i массивов.
+
+        arrays: mass, r, pos, vel, acc, static, from_time - массивы длиной len(objects);
+        source - необязательный (по умолчанию флаги GravitySource объектов).
+
+        """
+
+        self.clear()
+        for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time'):
+            setattr(self, name, arrays[name])
+        source = arrays.get('source')
+        if source is None:
+            source = np.array([obj.GravitySource for obj in objects], dtype=bool)
+        self.source = source
+        self.objects = list(objects)
+        self.n = len(self.objects)
+        self.version = next(_versions)
+        for i, obj in enumerate(self.objects):
+            obj._store, obj._idx, obj._own = self, i, None
+
+    def release(self, path):
+        """
+        Метод заменяет массивы движка, отображенные в память из файла path (см. adopt()), их копиями в памяти:
+        отображение файла закрывается, и файл можно перезаписать (в Windows отображенный файл заменить нельзя).
+
+        """
+
+        path = os.path.abspath(path)
+        for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source'):
+            array = getattr(self, name)
+            mapped = getattr(array, 'filename', None)
+            if isinstance(array, np.memmap) and mapped and os.path.abspath(mapped) == path:
+                setattr(self, name, np.array(array))
+
+    def accelerations(self, pos=None, out=None, targets=None):
+        """
+        Метод вычисляет суммарные гравитационные ускорения объектов выбранным решателем self.solver.
+
+        pos: координаты объектов (по умолчанию - текущие координаты движка).
+        out: массив для записи результата (по умолчанию создается новый).
+        targets: индексы объектов, для которых нужны ускорения (по умолчанию - все объекты).
+
+        return: массив (n, 2) или (len(targets), 2) проекций ускорений
+
+        """
+
+        n = self.n
+        if pos is None:
+            pos = self.pos[:n]
+        self.evaluations += n if targets is None else len(targets)
+        # пробные частицы не притягивают - притяжение считается только от массивных объектов
+        sources = self.sources()
+        params = {} if sources is None else {'sources': sources}
+        if targets is None:
+            return self.solver.accelerations(pos, self.mass[:n], out=out, **params)
+        return self.solver.accelerations(pos, self.mass[:n], out=out, targets=targets, **params)
+
+    def jerks(self, targets=None):
+        """
+        Метод вычисляет рывки (производные ускорений) объектов targets точным попарным расчетом.
+
+        """
+
+        n = self.n
+        self.evaluations += n if targets is None else len(targets)
+        return DirectSum().jerks(self.pos[:n], self.vel[:n], self.mass[:n], targets, self.sources())
+
+    def nearest(self, pos=None, targets=None):
+        """
+        Метод возвращает расстояния от объектов targets до ближайших к ним объектов.
+
+        """
+
+        n = self.n
+        return DirectSum().nearest(self.pos[:n] if pos is None else pos, targets)
+
+    def sources(self):
+        """
+        Метод возвращает индексы объектов, которые притягивают (без пробных частиц), None - притягивают все объекты.
+
+        """
+
+        source = self.source[:self.n]
+        if source.all():
+            return None
+        return np.flatnonzero(source)
+
+    def movable(self):
+        """
+        Метод возвращает маску объектов, которые перемещаются под действием гравитации
+        (без флагов StaticCoord и CoordFromTime).
+
+        """
+
+        return ~(self.static[:self.n] | self.from_time[:self.n])
+
+    def energy(self):
+        """
+        Метод вычисляет полную механическую энергию системы: кинетическую и потенциальную энергию притяжения.
+        Пробные частицы не учитываются: они не действуют на массивные объекты, и энергия системы сохраняется без них.
+
+        """
+
+        sources = self.sources()
+        if sources is None:
+            n = self.n
+            pos, mass, vel = self.pos[:n], self.mass[:n], self.vel[:n]
+        else:
+            n = len(sources)
+            pos, mass, vel = self.pos[sources], self.mass[sources], self.vel[sources]
+        kinetic = 0.5 * np.sum(mass * np.einsum('ij,ij->i', vel, vel))
+        potential = 0.0
+        block = getattr(self.solver, 'block', 512)
+        for start in range(0, n, block):
+            stop = min(start + block, n)
+            d = pos[np.newaxis, :, :] - pos[start:stop, np.newaxis, :]
+            r = np.sqrt(np.einsum('ijk,ijk->ij', d, d))
+            r[np.arange(stop - start), np.arange(start, stop)] = np.inf
+            potential -= np.sum(mass[start:stop, np.newaxis] * mass / r)
+        # каждая пара учтена дважды
+        return kinetic + G * potential / 2
+
+    def step(self, t):
+        """
+        Метод выполняет один шаг моделирования длительностью t выбранным численным методом self.integrator.
+
+        Сначала вычисляются ускорения всех объектов, затем одновременно обновляются их состояния.
+        Объекты с флагами StaticCoord и CoordFromTime не перемещаются гравитацией.
+
+        """
+
+        if self.n:
+            self.integrator.step(self, t)
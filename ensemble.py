@@ -0,0 +1,219 @@
+"""
+Ансамбль - K независимых копий одного сценария, которые моделируются одновременно.
+
+Состояние хранится в массивах с ведущей осью ансамбля: координаты (K, N, 2), скорости (K, N, 2), массы (K, N).
+Все копии продвигаются одним векторизованным вычислением (метод leapfrog), а не K отдельными объектами Space.
+Объекты на кеплеровых орбитах (CoordFromTime) на время шага ставятся в положение середины шага,
+после шага - в положение его конца, как в Space.
+У каждой копии могут быть свои параметры: начальная скорость объекта, вектор и длительность тяги.
+Результаты возвращаются массивами - например, для оценки приспособленности в генетическом алгоритме (evolution).
+
+"""
+
+
+import numpy as np
+from constants import G
+from kepler import KeplerPropagator, order_rails
+
+
+class Ensemble:
+    """
+    Класс, моделирующий K копий сценария одновременно.
+
+    k - количество копий.
+    names - имена объектов сценария (индекс объекта в массивах - его номер в списке).
+    mass - массы объектов, массив (K, N).
+    pos - координаты объектов, массив (K, N, 2).
+    vel - скорости объектов, массив (K, N, 2).
+    movable - маска объектов, перемещающихся под действием гравитации (без StaticCoord и CoordFromTime).
+    source - маска объектов, создающих гравитационное поле (GravitySource): пробные частицы притягиваются,
+    но сами не притягивают.
+    thrust - ускорение от тяги двигателя, массив (K, N, 2).
+    burn - оставшееся время работы двигателя, массив (K, N), секунды.
+    time - модельное время ансамбля (от момента Space.Time исходного сценария).
+    block - количество копий, обрабатываемых за один проход (ограничивает потребление памяти).
+
+    """
+
+    def __init__(self, space, k, block=256):
+        """
+        space: объект класса Space - исходный сценарий (копируется, сам не изменяется).
+        k: количество копий.
+
+        """
+
+        objects = space.Objects
+        self.k = k
+        self.block = block
+        self.names = [o.Name for o in objects]
+        n = len(objects)
+        self.mass = np.tile(np.array([o.Mass for o in objects], dtype=float), (k, 1))
+        self.pos = np.tile(np.array([(o.X or 0.0, o.Y or 0.0) for o in objects], dtype=float).reshape(n, 2),
+                           (k, 1, 1))
+        self.vel = np.tile(np.array([(o.Vx or 0.0, o.Vy or 0.0) for o in objects], dtype=float).reshape(n, 2),
+                           (k, 1, 1))
+        self.movable = ~np.array([o.StaticCoord or o.CoordFromTime for o in objects], dtype=bool)
+        self.source = np.array([o.GravitySource for o in objects], dtype=bool)
+        self.thrust = np.zeros((k, n, 2))
+        self.burn = np.zeros((k, n))
+        self.time = 0.0
+        self._acc = None
+        # объекты на орбитах: индексы, индексы центральных тел (-1 - тело вне сценария, его состояние постоянно)
+        self._start = space.Time
+        rails = order_rails(objects)
+        self._propagator = KeplerPropagator([o.Orbit for o in rails]) if rails else None
+        where = {id(o): i for i, o in enumerate(objects)}
+        self._rails = [(where[id(o)], where.get(id(o.Orbit.central), -1),
+                        np.array([o.Orbit.central.X or 0.0, o.Orbit.central.Y or 0.0]),
+                        np.array([o.Orbit.central.Vx or 0.0, o.Orbit.central.Vy or 0.0])) for o in rails]
+
+    def index(self, body):
+        """
+        Метод возвращает индекс объекта по его имени (или сам индекс).
+
+        """
+
+        if isinstance(body, str):
+            assert body in self.names, f"Объект '{body}' отсутствует в сценарии."
+            return self.names.index(body)
+        return body
+
+    def set_velocity(self, body, vel):
+        """
+        Метод задает скорость объекта body в каждой копии.
+
+        vel: массив (K, 2) или (2,) проекций скорости.
+
+        """
+
+        self.vel[:, self.index(body)] = vel
+        self._acc = None
+
+    def add_velocity(self, body, dv):
+        """
+        Метод добавляет к скорости объекта body приращение dv (импульс) в каждой копии.
+
+        dv: массив (K, 2) или (2,).
+
+        """
+
+        self.vel[:, self.index(body)] += dv
+        self._acc = None
+
+    def set_thrust(self, body, acc, duration=np.inf):
+        """
+        Метод задает тягу двигателя объекта body в каждой копии.
+
+        acc: ускорение от тяги, массив (K, 2) или (2,).
+        duration: время работы двигателя, секунды, массив (K,) или число.
+
+        """
+
+        i = self.index(body)
+        self.thrust[:, i] = acc
+        self.burn[:, i] = duration
+
+    def accelerations(self, pos=None):
+        """
+        Метод вычисляет гравитационные ускорения всех объектов всех копий, массив (K, N, 2).
+        Поле создают только источники (source): N целей на S источников, как в engine.ArrayEngine.
+
+        """
+
+        if pos is None:
+            pos = self.pos
+        k, n = pos.shape[:2]
+        out = np.empty((k, n, 2))
+        sources = np.flatnonzero(self.source)
+        columns = np.arange(len(sources))
+        for start in range(0, k, self.block):
+            stop = min(start + self.block, k)
+            # векторы от всех объектов к источникам копий блока: (блок, n, s, 2)
+            d = pos[start:stop][:, np.newaxis, sources, :] - pos[start:stop, :, np.newaxis, :]
+            r2 = np.einsum('bijk,bijk->bij', d, d)
+            r2[:, sources, columns] = np.inf
+            w = self.mass[start:stop][:, np.newaxis, sources] / (r2 * np.sqrt(r2))
+            out[start:stop] = G * np.einsum('bij,bijk->bik', w, d)
+        return out
+
+    def _thrust(self, t):
+        """
+        Метод возвращает ускорение от тяги на шаге длительностью t (с учетом окончания работы двигателя)
+        и уменьшает оставшееся время работы.
+
+        """
+
+        share = np.clip(self.burn / t, 0.0, 1.0)
+        self.burn = np.maximum(self.burn - t, 0.0)
+        return self.thrust * share[:, :, np.newaxis]
+
+    def _place_rails(self, time):
+        """
+        Метод ставит объекты на кеплеровых орбитах во всех копиях в положения в момент time ансамбля.
+
+        """
+
+        pos, vel = self._propagator.state(self._start + time)
+        # центральное тело идет раньше своих спутников (kepler.order_rails())
+        for j, (i, c, c_pos, c_vel) in enumerate(self._rails):
+            self.pos[:, i] = (c_pos if c < 0 else self.pos[:, c]) + pos[j]
+            self.vel[:, i] = (c_vel if c < 0 else self.vel[:, c]) + vel[j]
+
+    def step(self, t):
+        """
+        Метод продвигает все копии на один шаг длительностью t методом leapfrog (kick-drift-kick).
+
+        """
+
+        m = self.movable
+        if self._rails:
+            # объекты на орбитах на время шага - в положении его середины: ускорения начала шага пересчитываются
+            self._place_rails(self.time + t / 2)
+            self._acc = None
+        if self._acc is None:
+            self._acc = self.accelerations()
+        thrust = self._thrust(t)
+        self.vel[:, m] += 0.5 * t * (self._acc[:, m] + thrust[:, m])
+        self.pos[:, m] += t * self.vel[:, m]
+        self._acc = self.accelerations()
+        self.vel[:, m] += 0.5 * t * (self._acc[:, m] + thrust[:, m])
+        self.time += t
+        if self._rails:
+            self._place_rails(self.time)
+
+    def run(self, t, steps, record_every=None, closest=None):
+        """
+        Метод продвигает все копии на steps шагов длительностью t.
+
+        record_every: сохранять координаты всех копий каждые record_every шагов (None - не сохранять).
+        closest: пара объектов (a, b) - отслеживать наименьшее расстояние между ними в каждой копии.
+
+        return: словарь массивов:
+        pos, vel - итоговые координаты и скорости (K, N, 2);
+        trajectory - координаты (шагов записи, K, N, 2), если задан record_every;
+        min_distance, min_time - наименьшее расстояние между объектами closest (K,) и момент его достижения.
+
+        """
+
+        trajectory = []
+        if closest is not None:
+            a, b = self.index(closest[0]), self.index(closest[1])
+            min_distance = np.linalg.norm(self.pos[:, a] - self.pos[:, b], axis=1)
+            min_time = np.full(self.k, self.time)
+        for step in range(1, steps + 1):
+            self.step(t)
+            if record_every and step % record_every == 0:
+                trajectory.append(self.pos.copy())
+            if closest is not None:
+                distance = np.linalg.norm(self.pos[:, a] - self.pos[:, b], axis=1)
+                closer = distance < min_distance
+                min_distance[closer] = distance[closer]
+                min_time[closer] = self.time
+
+        result = {'pos': self.pos.copy(), 'vel': self.vel.copy()}
+        if record_every:
+            result['trajectory'] = np.array(trajectory).reshape((-1,) + self.pos.shape)
+        if closest is not None:
+            result['min_distance'] = min_distance
+            result['min_time'] = min_time
+        return result
@@ -1,5 +1,5 @@
 """
-Здесь будет описан класс, отвечающий за генетический алгоритм эволюции вектора параметров
+Здесь описан класс, отвечающий за генетический алгоритм эволюции вектора параметров
 
 Основная идея:
 агент (объект класса SpaceObjects или дочерний от него) получает на вход вектор параметров,
@@ -20,13 +20,227 @@ https://www.youtube.com/playlist?list=PLA0M1Bcd0w8zkG8DJSyqrKyBfDtRJ2Ohh
 Найти метод ускорения времени, чтобы агент, который живет в его "реальном" времени,
 относительно меня, делал все в N раз быстрее.
 
+Реализация:
+приспособленность вектора параметров оценивается задачей (InterceptProblem): кандидаты пачкой моделируются
+ансамблем (ensemble.Ensemble), пачки распределяются по процессам concurrent.futures.ProcessPoolExecutor.
+Базовый сценарий передается каждому процессу один раз (при его запуске), а не вместе с каждым кандидатом.
+Уже оцененные векторы (с точностью до кванта) берутся из кэша.
+
 """
 
 
+import copy
+import time
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from ensemble import Ensemble
+
+
+class InterceptProblem:
+    """
+    Задача перехвата: агент получает импульс (dvx, dvy) и должен пройти как можно ближе к целевому объекту.
+
+    space - базовый сценарий (объект класса Space).
+    agent, target - имена агента и целевого объекта.
+    t, steps - длительность шага и количество шагов моделирования.
+    bounds - границы параметров, массив (2, 2): [[dvx_min, dvx_max], [dvy_min, dvy_max]], м/с.
+    dv_weight - штраф за величину импульса (расход топлива), метров расстояния на 1 м/с.
+
+    Приспособленность = -(наименьшее расстояние до цели + dv_weight * |dv|), чем больше, тем лучше.
+
+    """
+
+    def __init__(self, space, agent, target, t, steps, bounds, dv_weight=0.0):
+        self.space = space
+        self.agent = agent
+        self.target = target
+        self.t = t
+        self.steps = steps
+        self.bounds = np.asarray(bounds, dtype=float)
+        self.dv_weight = dv_weight
+
+    def evaluate(self, params):
+        """
+        Метод оценивает приспособленность пачки векторов параметров params (B, 2) одним ансамблем.
+
+        return: массив (B,) приспособленностей
+
+        """
+
+        params = np.asarray(params, dtype=float)
+        ensemble = Ensemble(self.space, len(params))
+        ensemble.add_velocity(self.agent, params)
+        result = ensemble.run(self.t, self.steps, closest=(self.agent, self.target))
+        return -(result['min_distance'] + self.dv_weight * np.linalg.norm(params, axis=1))
+
+    def __getstate__(self):
+        """
+        Процессам пула передается копия сценария без записи траекторий и контрольных точек:
+        их открытые файлы и фоновые потоки не сериализуются и остаются в текущем процессе.
+
+        """
+
+        state = dict(vars(self))
+        space = copy.copy(self.space)
+        space.Recorder = space.Checkpoints = None
+        state['space'] = space
+        return state
+
+
+# задача, переданная процессу при его запуске (см. _init_worker)
+_problem = None
+
+
+def _init_worker(problem):
+    """
+    Функция запуска процесса пула: базовая задача передается процессу один раз.
+
+    """
+
+    global _problem
+    _problem = problem
+
+
+def _evaluate(params):
+    """
+    Функция, выполняемая в процессе пула: оценка пачки векторов параметров.
+
+    """
+
+    return _problem.evaluate(params)
+
+
 class Evolution:
     """
     Класс, отвечающий за эволюцию вектора параметров.
 
+    problem - задача с методом evaluate(params) и границами параметров bounds (например, InterceptProblem).
+    size - размер популяции.
+    elite - доля лучших особей, переходящих в следующее поколение без изменений.
+    crossover - вероятность скрещивания пары родителей.
+    mutation - стандартное отклонение мутации в долях диапазона параметра.
+    workers - количество процессов пула (0 - оценка в текущем процессе, None - по числу ядер).
+    batch - количество кандидатов в одной задаче процесса.
+    quantum - квант параметров для кэша приспособленности.
+    population - текущая популяция, массив (size, dim).
+    fitness - приспособленность текущей популяции.
+    cache - кэш приспособленности по квантованным векторам параметров.
+    stats - статистика поколений: generation, wall (с), evaluated (количество новых оценок - различных векторов
+    не из кэша), cache_hits, best, mean.
+
     """
 
-    pass
+    def __init__(self, problem, size=100, elite=0.1, crossover=0.7, mutation=0.1, workers=None, batch=32,
+                 quantum=1.0e-3, seed=None):
+        self.problem = problem
+        self.size = size
+        self.elite = max(1, int(elite * size))
+        self.crossover = crossover
+        self.mutation = mutation
+        self.batch = batch
+        self.quantum = quantum
+        self.rng = np.random.default_rng(seed)
+        lo, hi = problem.bounds[:, 0], problem.bounds[:, 1]
+        self.population = self.rng.uniform(lo, hi, (size, len(lo)))
+        self.fitness = None
+        self.cache = {}
+        self.stats = []
+        self.pool = None
+        if workers != 0:
+            self.pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(problem,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        """
+        Метод останавливает процессы пула.
+
+        """
+
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+
+    def _key(self, params):
+        return tuple(np.round(params / self.quantum).astype(np.int64))
+
+    def evaluate(self, population):
+        """
+        Метод возвращает приспособленность популяции: из кэша или оценивая недостающие векторы в пуле процессов.
+
+        return: массив приспособленностей и количество попаданий в кэш - векторов, не потребовавших новой оценки
+        (повторы вектора внутри популяции оцениваются один раз, повторы считаются попаданиями)
+
+        """
+
+        keys = [self._key(p) for p in population]
+        missing = list(dict.fromkeys(k for k in keys if k not in self.cache))
+        hits = len(keys) - len(missing)
+        if missing:
+            # оцениваем квантованные векторы - результат не зависит от того, какой из близких векторов пришел первым
+            params = np.array(missing, dtype=float) * self.quantum
+            batches = [params[i:i + self.batch] for i in range(0, len(params), self.batch)]
+            if self.pool is None:
+                results = map(self.problem.evaluate, batches)
+            else:
+                results = self.pool.map(_evaluate, batches)
+            for key, value in zip(missing, np.concatenate(list(results))):
+                self.cache[key] = value
+        return np.array([self.cache[k] for k in keys]), hits
+
+    def _select(self, count):
+        """
+        Метод выбирает count родителей турнирным отбором (из двух случайных особей побеждает лучшая).
+
+        """
+
+        a = self.rng.integers(self.size, size=count)
+        b = self.rng.integers(self.size, size=count)
+        return np.where((self.fitness[a] >= self.fitness[b])[:, np.newaxis], self.population[a], self.population[b])
+
+    def next_generation(self):
+        """
+        Метод формирует новое поколение: элита + потомки (отбор, скрещивание, мутация) и оценивает его.
+
+        """
+
+        start = time.perf_counter()
+        if self.fitness is None:
+            self.fitness, _ = self.evaluate(self.population)
+        lo, hi = self.problem.bounds[:, 0], self.problem.bounds[:, 1]
+        elite = self.population[np.argsort(self.fitness)[::-1][:self.elite]]
+        count = self.size - self.elite
+        mothers, fathers = self._select(count), self._select(count)
+        # смешивающее скрещивание: потомок - случайная точка на отрезке между родителями
+        share = self.rng.uniform(size=(count, 1))
+        children = np.where(self.rng.uniform(size=(count, 1)) < self.crossover,
+                            mothers * share + fathers * (1 - share), mothers)
+        children += self.rng.normal(0.0, self.mutation, children.shape) * (hi - lo)
+        self.population = np.vstack((elite, np.clip(children, lo, hi)))
+        self.fitness, hits = self.evaluate(self.population)
+        self.stats.append({'generation': len(self.stats) + 1, 'wall': time.perf_counter() - start,
+                           'evaluated': self.size - hits, 'cache_hits': hits,
+                           'best': float(self.fitness.max()), 'mean': float(self.fitness.mean())})
+        return self.stats[-1]
+
+    def run(self, generations, log=None):
+        """
+        Метод выполняет generations поколений эволюции.
+
+        log: функция вывода статистики поколения (None - без вывода).
+
+        return: лучший вектор параметров и его приспособленность
+
+        """
+
+        for _ in range(generations):
+            stats = self.next_generation()
+            if log:
+                log(f"поколение {stats['generation']}: {stats['wall']:.3f} с, оценено {stats['evaluated']}, "
+                    f"из кэша {stats['cache_hits']}, лучшая {stats['best']:.6g}, средняя {stats['mean']:.6g}")
+        best = int(np.argmax(self.fitness))
+        return self.population[best], self.fitness[best]
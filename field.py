@@ -0,0 +1,230 @@
+"""
+Отображение гравитационного поля.
+
+Потенциал и ускорение свободного падения вычисляются в узлах сетки сразу от всех объектов: квадраты расстояний
+и суммы по объектам - матричные произведения (BLAS), без цикла по объектам. Узлы сетки - центры ячеек
+фиксированного размера в пикселях экрана, поэтому подробность поля следует за масштабом. При большом количестве
+объектов ячейки укрупняются, чтобы построение поля всего окна укладывалось в бюджет пар (узел, объект).
+
+Поле строится плитками, привязанными к сетке пространства (а не окна): при перемещении камеры уже построенные
+плитки берутся из кэша, достраиваются только открывшиеся. Кэш сбрасывается при изменении масштаба сетки
+или если объекты сместились больше чем на threshold пикселей.
+
+Цвет - модуль ускорения в логарифмической шкале, полосы яркости - линии уровня потенциала.
+
+"""
+
+
+from collections import OrderedDict
+import numpy as np
+import pygame
+from stepper import SceneState
+from constants import G
+
+
+# опорные цвета шкалы: от слабого поля (цвет фона сцены) к сильному
+_STOPS = np.linspace(0.0, 1.0, 5)
+_COLORS = np.array([[0, 0, 32], [40, 0, 120], [200, 30, 80], [255, 200, 40], [255, 255, 200]], dtype=float)
+
+
+def field(points, pos, mass, softening=0.0, block=256):
+    """
+    Функция вычисляет гравитационный потенциал и ускорение в точках points от объектов pos с массами mass.
+
+    points: координаты точек, массив (p, 2).
+    softening: сглаживание - добавка к расстоянию (не дает бесконечных значений рядом с объектами), м.
+    block: количество точек, обрабатываемых за один проход (ограничивает потребление памяти).
+
+    return: потенциал - массив (p,), ускорения - массив (p, 2)
+
+    """
+
+    potential = np.zeros(len(points))
+    acc = np.zeros((len(points), 2))
+    if len(pos) == 0:
+        return potential, acc
+    for start in range(0, len(points), block):
+        stop = min(start + block, len(points))
+        # расстояния считаются от центра блока: разность близких больших чисел не теряет точность
+        center = points[start:stop].mean(axis=0)
+        p = points[start:stop] - center
+        q = pos - center
+        r2 = np.einsum('ij,ij->i', p, p)[:, np.newaxis] + np.einsum('ij,ij->i', q, q) - 2 * p @ q.T
+        np.maximum(r2, 0.0, out=r2)
+        r2 += softening ** 2
+        inv = np.reciprocal(np.sqrt(r2, out=r2), out=r2)
+        potential[start:stop] = -G * (inv @ mass)
+        inv3 = inv * inv * inv
+        acc[start:stop] = G * (inv3 @ (mass[:, np.newaxis] * q) - p * (inv3 @ mass)[:, np.newaxis])
+    return potential, acc
+
+
+class FieldOverlay:
+    """
+    Класс отображения гравитационного поля плитками с кэшем.
+
+    cell - наименьший размер ячейки сетки, пикселей.
+    tile - размер стороны плитки, пикселей.
+    pairs - бюджет пар (узел сетки, объект) на построение поля всего окна: при большем количестве объектов
+    ячейки укрупняются.
+    threshold - смещение объектов, пикселей, после которого кэш плиток сбрасывается.
+    capacity - наибольшее количество плиток в кэше.
+    stats - статистика последней отрисовки: tiles - видимых плиток, computed - построенных заново,
+    samples - узлов сетки в стороне плитки.
+
+    """
+
+    def __init__(self, cell=4, tile=128, pairs=2.0e7, threshold=2.0, capacity=256):
+        assert 1 <= cell <= tile / 2, f"Некорректный размер сетки поля: ячейка {cell}, плитка {tile}."
+        self.cell = cell
+        self.tile = tile
+        self.pairs = pairs
+        self.threshold = threshold
+        self.capacity = capacity
+        self.stats = {'tiles': 0, 'computed': 0, 'samples': tile // cell}
+        self._tiles = OrderedDict()
+        self._pos = None
+        self._mass = None
+        self._range = None
+        self._key = None
+        self._surface = None
+
+    def invalidate(self):
+        """
+        Метод сбрасывает кэш плиток.
+
+        """
+
+        self._tiles.clear()
+        self._pos = None
+        self._range = None
+        self._key = None
+
+    def _check(self, pos, mass, m):
+        """
+        Метод сбрасывает кэш, если изменился состав объектов или объекты сместились больше threshold пикселей.
+
+        """
+
+        if self._pos is not None and self._pos.shape == pos.shape and np.array_equal(self._mass, mass) \
+                and (len(pos) == 0 or np.max(np.abs(pos - self._pos)) * m <= self.threshold):
+            return
+        self.invalidate()
+        self._pos = pos.copy()
+        self._mass = mass.copy()
+
+    def _samples(self, size, n):
+        """
+        Метод возвращает количество узлов сетки в стороне плитки: ячейки не меньше cell пикселей, построение поля
+        всего окна - не больше pairs пар (узел, объект).
+
+        """
+
+        cell = max(self.cell, np.sqrt(size[0] * size[1] * max(n, 1) / self.pairs))
+        return max(2, int(self.tile // cell))
+
+    def _compute(self, keys, samples, m):
+        """
+        Метод вычисляет значения поля в узлах плиток keys (номера плиток по осям).
+
+        return: список пар (log10 модуля ускорения, log10 модуля потенциала) - массивы (samples, samples)
+
+        """
+
+        cell = self.tile / samples
+        # крайние узлы лежат на границах плитки - у соседних плиток общие значения на стыке (нет швов)
+        offset = np.linspace(0.0, self.tile, samples)
+        if not keys:
+            return []
+        # узлы всех плиток в координатах пространства - одним вызовом field()
+        tiles = np.array(keys, dtype=float) * self.tile
+        gx = (tiles[:, 0, np.newaxis, np.newaxis] + offset[np.newaxis, :, np.newaxis]) / m
+        gy = (tiles[:, 1, np.newaxis, np.newaxis] + offset[np.newaxis, np.newaxis, :]) / m
+        gx, gy = np.broadcast_arrays(gx, gy)
+        points = np.column_stack((gx.ravel(), gy.ravel()))
+        potential, acc = field(points, self._pos, self._mass, softening=cell / m)
+        # индексация узлов плитки [x, y] - как у pygame.surfarray
+        shape = (len(keys), samples, samples)
+        strength = np.log10(np.linalg.norm(acc, axis=1) + 1e-300).reshape(shape)
+        level = np.log10(-potential + 1e-300).reshape(shape)
+        values = list(zip(strength, level))
+        return values
+
+    def _paint(self, strength, level):
+        """
+        Метод раскрашивает плитку: цвет - модуль ускорения, полосы яркости - линии уровня потенциала.
+
+        return: поверхность плитки размера tile
+
+        """
+
+        low, high = self._range
+        t = np.clip((strength - low) / (high - low), 0.0, 1.0)
+        brightness = 0.85 + 0.15 * np.cos(8 * np.pi * level)
+        rgb = np.stack([np.interp(t, _STOPS, _COLORS[:, c]) for c in range(3)], axis=-1) * brightness[..., None]
+        surface = pygame.surfarray.make_surface(rgb.astype(np.uint8))
+        return pygame.transform.smoothscale(surface, (self.tile, self.tile))
+
+    def draw(self, sc, space, positions, shift=(0, 0), m=1):
+        """
+        Метод отрисовывает поле на поверхности sc (под объектами - вызывается до их отрисовки).
+
+        space: пространство (Space) или его снимок для отрисовки (stepper.SceneState).
+        positions: координаты объектов, массив (n, 2).
+        shift: смещение отрисовки, пикселей.
+        m: коэффициент масштабирования.
+
+        return: статистика отрисовки self.stats
+
+        """
+
+        # пробные частицы поля не создают
+        if isinstance(space, SceneState):
+            n = min(len(positions), len(space))
+            mass = space.mass[:n]
+        elif space.Engine is not None:
+            engine = space.Engine
+            n = min(len(positions), engine.n)
+            mass = np.where(engine.source[:n], engine.mass[:n], 0.0)
+        else:
+            n = min(len(positions), len(space.Objects))
+            mass = np.array([o.Mass if o.GravitySource else 0.0 for o in space.Objects[:n]], dtype=float)
+        pos = np.asarray(positions[:n], dtype=float)
+        self._check(pos, mass, m)
+        size = sc.get_size()
+        samples = self._samples(size, n)
+        side = self.tile
+        shift = (int(round(shift[0])), int(round(shift[1])))
+        key = (size, shift, m, samples)
+        if key == self._key:
+            # камера не двигалась - готовое изображение поля
+            sc.blit(self._surface, (0, 0))
+            self.stats = {'tiles': self.stats['tiles'], 'computed': 0, 'samples': samples}
+            return self.stats
+
+        # плитки, видимые в окне
+        columns = range(-shift[0] // side, (size[0] - shift[0] - 1) // side + 1)
+        rows = range(-shift[1] // side, (size[1] - shift[1] - 1) // side + 1)
+        visible = [(i, j) for i in columns for j in rows]
+        missing = [k for k in visible if (m, samples) + k not in self._tiles]
+        values = self._compute(missing, samples, m)
+        if values and self._range is None:
+            # шкала цвета - по первым построенным плиткам, до сброса кэша не меняется (плитки стыкуются)
+            strength = np.concatenate([v[0].ravel() for v in values])
+            self._range = tuple(np.percentile(strength, (1, 99.5)))
+            if self._range[1] - self._range[0] < 1e-6:
+                self._range = (self._range[0] - 1, self._range[0] + 1)
+        for k, (strength, level) in zip(missing, values):
+            self._tiles[(m, samples) + k] = self._paint(strength, level)
+
+        surface = pygame.Surface(size)
+        for i, j in visible:
+            tile = self._tiles[(m, samples, i, j)]
+            self._tiles.move_to_end((m, samples, i, j))
+            surface.blit(tile, (i * side + shift[0], j * side + shift[1]))
+        while len(self._tiles) > max(self.capacity, len(visible)):
+            self._tiles.popitem(last=False)
+        self._surface, self._key = surface, key
+        sc.blit(surface, (0, 0))
+        self.stats = {'tiles': len(visible), 'computed': len(missing), 'samples': samples}
+        return self.stats
@@ -0,0 +1,66 @@
+"""
+Моделирование без визуализации.
+
+Математическое пространство Space продвигается на заданное количество шагов или модельных секунд
+так быстро, как позволяет процессор, с периодическим сохранением снимков состояния.
+Модуль не импортирует pygame, win32api и tkinter - его можно запускать на сервере без дисплея:
+
+python -m osn simulate sun-earth --steps 100000 --snapshot-every 10000 --out ./date/run
+
+"""
+
+
+import os
+import time
+
+
+def simulate(space, t, steps=None, duration=None, snapshot_every=None, out=None, log=print):
+    """
+    Функция продвигает пространство space шагами длительностью t.
+
+    space: объект класса Space.
+    t: длительность одного шага, модельные секунды.
+    steps: количество шагов.
+    duration: модельное время, секунды (используется, если steps не задан).
+    snapshot_every: сохранять снимок состояния каждые snapshot_every шагов (и после последнего шага).
+    out: папка для снимков состояния.
+    log: функция вывода сообщений о ходе расчета (None - без сообщений).
+
+    return: словарь статистики: steps - шагов, time - модельное время, wall - секунд работы,
+    rate - шагов в секунду, snapshots - список путей сохраненных снимков
+
+    """
+
+    assert steps is not None or duration is not None, "Необходимо задать количество шагов или модельное время."
+    assert t > 0, f"Некорректная длительность шага: {t}."
+    # последний шаг укорачивается так, чтобы модельное время было ровно duration
+    last = t
+    if steps is None:
+        steps = max(1, int(-(-duration // t)))
+        last = duration - (steps - 1) * t
+    if snapshot_every:
+        assert out, "Не задана папка для снимков состояния."
+        os.makedirs(out, exist_ok=True)
+
+    snapshots = []
+
+    def snapshot(step):
+        path = os.path.join(out, f'snapshot_{step:09d}.snap')
+        space.save_snapshot(path)
+        snapshots.append(path)
+
+    start = time.perf_counter()
+    for step in range(1, steps + 1):
+        space.gravity_interactions(t if step < steps else last)
+        if snapshot_every and (step % snapshot_every == 0 or step == steps):
+            snapshot(step)
+            if log:
+                rate = step / (time.perf_counter() - start)
+                log(f'шаг {step}/{steps}, модельное время {space.Time:.6g} с, {rate:.4g} шаг/с')
+    wall = time.perf_counter() - start
+
+    stats = {'steps': steps, 'time': space.Time, 'wall': wall, 'rate': steps / wall if wall else float('inf'),
+             'snapshots': snapshots}
+    if log:
+        log(f'готово: {steps} шагов за {wall:.3f} с ({stats["rate"]:.4g} шаг/с), модельное время {space.Time:.6g} с')
+    return stats
@@ -0,0 +1,180 @@
+"""
+Отображение текста и строки состояния (HUD).
+
+Поверхности с отрисованным текстом кэшируются по строке, размеру шрифта и цветам (TextCache): повторная отрисовка
+той же строки - только копирование готовой поверхности. Шрифты создаются один раз для каждого размера.
+
+HUD хранит поля - строки текста в фиксированных позициях - и перерисовывает только изменившиеся поля.
+Прямоугольники, занятые старым и новым текстом измененного поля, возвращаются как "грязные": окну достаточно
+обновить только их (pygame.display.update(rects)), если остальная сцена не менялась (пауза, статичный кадр).
+
+"""
+
+
+from collections import OrderedDict
+import pygame
+
+
+class TextCache:
+    """
+    Класс кэша поверхностей с отрисованным текстом.
+
+    capacity - наибольшее количество поверхностей в кэше; при переполнении удаляется дольше всего не используемая.
+    font_type - файл шрифта (None - шрифт pygame по умолчанию).
+    hits, misses - количество обращений к кэшу с попаданием и с отрисовкой текста.
+
+    """
+
+    def __init__(self, capacity=256, font_type=None):
+        assert capacity > 0, f"Некорректный размер кэша текста: {capacity}."
+        if not pygame.font.get_init():
+            pygame.font.init()
+        if font_type is None:
+            # поиск шрифта в системе медленный - выполняется один раз
+            fonts = pygame.font.get_fonts()
+            font_type = pygame.font.match_font(fonts[0]) if fonts else None
+        self.capacity = capacity
+        self.font_type = font_type
+        self.hits = 0
+        self.misses = 0
+        self._fonts = {}
+        self._surfaces = OrderedDict()
+
+    def __len__(self):
+        return len(self._surfaces)
+
+    def font(self, size):
+        """
+        Метод возвращает шрифт размера size (шрифты создаются один раз для каждого размера).
+
+        """
+
+        font = self._fonts.get(size)
+        if font is None:
+            font = self._fonts[size] = pygame.font.Font(self.font_type, size)
+        return font
+
+    def render(self, text, size, color=(255, 255, 255), background=None):
+        """
+        Метод возвращает поверхность с текстом text размера size цвета color на фоне background
+        (None - прозрачный фон).
+
+        """
+
+        key = (text, size, tuple(color), None if background is None else tuple(background))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self._surfaces.move_to_end(key)
+            self.hits += 1
+            return surface
+        self.misses += 1
+        surface = self.font(size).render(text, True, color, background)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.capacity:
+            self._surfaces.popitem(last=False)
+        return surface
+
+
+class HUD:
+    """
+    Класс полей текста поверх сцены.
+
+    cache - кэш поверхностей текста (TextCache).
+    fields - поля по названиям: текст, позиция, размер шрифта, цвет, фон.
+
+    Поле с фоном при изменении стирается заливкой фона и перерисовывается отдельно от сцены.
+    Поле без фона (текст поверх объектов) отрисовывается только при полной перерисовке кадра.
+
+    """
+
+    def __init__(self, cache=None):
+        self.cache = TextCache() if cache is None else cache
+        self.fields = {}
+        # прямоугольники полей на экране при последней отрисовке
+        self._drawn = {}
+        self._changed = set()
+
+    def set(self, name, text, pos, size, color=(255, 255, 255), background=None):
+        """
+        Метод задает поле name: текст text в позиции pos (левый верхний угол) размера size.
+
+        return: True, если поле изменилось
+
+        """
+
+        field = (text, (int(pos[0]), int(pos[1])), int(size), tuple(color),
+                 None if background is None else tuple(background))
+        if self.fields.get(name) == field:
+            return False
+        self.fields[name] = field
+        self._changed.add(name)
+        return True
+
+    def remove(self, name):
+        """
+        Метод удаляет поле name.
+
+        """
+
+        if self.fields.pop(name, None) is not None:
+            self._changed.add(name)
+
+    def needs_redraw(self):
+        """
+        Метод возвращает True, если изменилось поле без фона - для его отрисовки нужна полная перерисовка кадра.
+
+        """
+
+        return any(self._transparent(name) for name in self._changed)
+
+    def _transparent(self, name):
+        """
+        Метод возвращает True, если поле name (новое или отрисованное ранее) без фона.
+
+        """
+
+        field = self.fields.get(name)
+        old = self._drawn.get(name)
+        return field is not None and field[4] is None or old is not None and old[1] is None
+
+    def invalidate(self):
+        """
+        Метод отмечает все поля измененными (после полной перерисовки сцены).
+
+        """
+
+        self._changed = set(self.fields) | set(self._drawn)
+
+    def draw(self, sc, full=False):
+        """
+        Метод отрисовывает измененные поля на поверхности sc.
+
+        full: кадр перерисован полностью - отрисовываются все поля, стирать старый текст не нужно.
+
+        return: список грязных прямоугольников (пустой, если ничего не изменилось)
+
+        """
+
+        if full:
+            self.invalidate()
+            self._drawn = {}
+        dirty = []
+        pending = set()
+        for name in sorted(self._changed):
+            if not full and self._transparent(name):
+                # поле без фона нельзя стереть - оно дождется полной перерисовки
+                pending.add(name)
+                continue
+            field = self.fields.get(name)
+            if name in self._drawn:
+                rect, background = self._drawn.pop(name)
+                sc.fill(background, rect)
+                dirty.append(rect)
+            if field is None:
+                continue
+            text, pos, size, color, background = field
+            rect = sc.blit(self.cache.render(text, size, color, background), pos)
+            self._drawn[name] = (rect, background)
+            dirty.append(rect)
+        self._changed = pending
+        return dirty
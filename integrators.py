@@ -0,0 +1,348 @@
+"""
+Численные методы интегрирования движения объектов векторизованного движка.
+
+Каждый шаг выполняется в две фазы: сначала вычисляются ускорения всех объектов (решателем движка),
+затем одновременно обновляются координаты и скорости всех подвижных объектов.
+Поэтому результат не зависит от порядка объектов в списке.
+
+euler - закон SpaceObjects.set_coord(): x + v*t + a*t**2 (совместимость с прежним поведением);
+leapfrog - метод "чехарды" в форме скоростного Верле (kick-drift-kick), 2-й порядок, симплектический;
+yoshida4 - композиция Иошиды из трех шагов leapfrog, 4-й порядок, симплектический;
+rk4 - классический метод Рунге-Кутты 4-го порядка (не симплектический);
+adaptive - leapfrog с переменным шагом по критерию ускорения или рывка;
+block - leapfrog с индивидуальными блочными шагами объектов t / 2**k.
+
+"""
+
+
+import numpy as np
+
+
+class Integrator:
+    """
+    Базовый класс численного метода.
+
+    evaluations - количество вычислений ускорений за один шаг.
+
+    """
+
+    evaluations = 1
+
+    def step(self, engine, t):
+        """
+        Метод выполняет один шаг длительностью t над состоянием движка engine.
+
+        """
+
+        raise NotImplementedError
+
+    @staticmethod
+    def _accelerations(engine, m):
+        """
+        Метод вычисляет ускорения подвижных объектов (маска m) в массив engine.acc.
+        Ускорения неподвижных объектов и объектов на орбитах (CoordFromTime) не вычисляются -
+        притяжение от них при этом учитывается.
+
+        """
+
+        n = engine.n
+        if m.all():
+            return engine.accelerations(out=engine.acc[:n])
+        idx = np.flatnonzero(m)
+        if len(idx):
+            engine.acc[idx] = engine.accelerations(targets=idx)
+        return engine.acc[:n]
+
+
+class Euler(Integrator):
+    """
+    Закон SpaceObjects.set_coord(): x + v*t + a*t**2, v + a*t.
+
+    """
+
+    def step(self, engine, t):
+        n = engine.n
+        m = engine.movable()
+        acc = self._accelerations(engine, m)
+        pos, vel = engine.pos[:n], engine.vel[:n]
+        pos[m] += vel[m] * t + acc[m] * t**2
+        vel[m] += acc[m] * t
+
+
+class Leapfrog(Integrator):
+    """
+    Метод "чехарды" (скоростной Верле): полшага скорости, шаг координат, полшага скорости.
+
+    Ускорения в конце шага запоминаются и используются в начале следующего, если с тех пор не менялись
+    состав объектов движка (engine.version), их координаты, массы и флаги источников и подвижности -
+    тогда на шаг нужно одно вычисление ускорений.
+
+    """
+
+    def __init__(self):
+        self._state = None
+
+    def _remember(self, engine):
+        """
+        Метод запоминает состояние движка, которому соответствуют его текущие ускорения.
+
+        """
+
+        n = engine.n
+        self._state = (engine.version, engine.pos[:n].copy(), engine.mass[:n].copy(), engine.source[:n].copy(),
+                       engine.movable())
+
+    def _remembered(self, engine):
+        """
+        Метод проверяет, что ускорения движка вычислены для его текущего состояния (см. _remember()).
+
+        """
+
+        if self._state is None or self._state[0] != engine.version:
+            return False
+        n = engine.n
+        _, pos, mass, source, movable = self._state
+        return (np.array_equal(pos, engine.pos[:n]) and np.array_equal(mass, engine.mass[:n])
+                and np.array_equal(source, engine.source[:n]) and np.array_equal(movable, engine.movable()))
+
+    def _start_acc(self, engine):
+        """
+        Метод возвращает ускорения в начале шага: из предыдущего шага или вычисляет их заново.
+
+        """
+
+        if not self._remembered(engine):
+            self._accelerations(engine, engine.movable())
+            self._remember(engine)
+        return engine.acc[:engine.n]
+
+    def step(self, engine, t):
+        n = engine.n
+        m = engine.movable()
+        pos, vel = engine.pos[:n], engine.vel[:n]
+        vel[m] += 0.5 * t * self._start_acc(engine)[m]
+        pos[m] += t * vel[m]
+        acc = self._accelerations(engine, m)
+        vel[m] += 0.5 * t * acc[m]
+        self._remember(engine)
+
+
+class Yoshida4(Integrator):
+    """
+    Симплектический метод 4-го порядка: композиция шагов с коэффициентами Иошиды
+    (drift-kick-drift-kick-drift-kick-drift).
+
+    """
+
+    evaluations = 3
+
+    _w1 = 1 / (2 - 2**(1 / 3))
+    _w0 = -2**(1 / 3) / (2 - 2**(1 / 3))
+    drifts = (_w1 / 2, (_w0 + _w1) / 2, (_w0 + _w1) / 2, _w1 / 2)
+    kicks = (_w1, _w0, _w1)
+
+    def step(self, engine, t):
+        n = engine.n
+        m = engine.movable()
+        pos, vel = engine.pos[:n], engine.vel[:n]
+        for c, d in zip(self.drifts, self.kicks + (None,)):
+            pos[m] += c * t * vel[m]
+            if d is not None:
+                acc = self._accelerations(engine, m)
+                vel[m] += d * t * acc[m]
+
+
+class RK4(Integrator):
+    """
+    Классический метод Рунге-Кутты 4-го порядка для системы x' = v, v' = a(x).
+
+    """
+
+    evaluations = 4
+
+    def step(self, engine, t):
+        n = engine.n
+        m = engine.movable()
+        pos, vel = engine.pos[:n], engine.vel[:n]
+        # неподвижные объекты не смещаются и на промежуточных стадиях
+        mv = m[:, np.newaxis]
+        x0, v0 = pos.copy(), vel.copy()
+        k1x, k1v = v0 * mv, engine.accelerations(x0)
+        k2x, k2v = (v0 + 0.5 * t * k1v) * mv, engine.accelerations(x0 + 0.5 * t * k1x)
+        k3x, k3v = (v0 + 0.5 * t * k2v) * mv, engine.accelerations(x0 + 0.5 * t * k2x)
+        k4x, k4v = (v0 + t * k3v) * mv, engine.accelerations(x0 + t * k3x)
+        pos[:] = x0 + t / 6 * (k1x + 2 * k2x + 2 * k3x + k4x)
+        vel[m] = (v0 + t / 6 * (k1v + 2 * k2v + 2 * k3v + k4v))[m]
+        engine.acc[:n] = k1v
+
+
+def timescales(engine, idx, pos, acc, jerk=None, criterion='jerk'):
+    """
+    Функция возвращает характерные времена изменения движения объектов idx.
+
+    criterion: 'jerk' - |a| / |j| (время заметного изменения ускорения);
+               'acceleration' - (d / |a|)**0.5, d - расстояние до ближайшего объекта (время свободного падения).
+    pos: координаты всех объектов; acc, jerk: ускорения и рывки объектов idx.
+
+    """
+
+    a = np.linalg.norm(acc, axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        if criterion == 'jerk':
+            scale = a / np.linalg.norm(jerk, axis=1)
+        else:
+            scale = np.sqrt(engine.nearest(pos, idx) / a)
+    # объекты без ускорения или рывка ничем не ограничивают шаг
+    return np.where(np.isfinite(scale), scale, np.inf)
+
+
+class Adaptive(Leapfrog):
+    """
+    Leapfrog с переменным общим шагом: шаг t делится на подшаги eta * min(характерное время объектов).
+
+    eta - доля характерного времени на один подшаг (точность).
+    criterion - критерий выбора шага: 'jerk' или 'acceleration' (см. timescales).
+    min_step - наименьший допустимый подшаг (защита от бесконечного дробления при сближениях).
+
+    """
+
+    def __init__(self, eta=0.01, criterion='jerk', min_step=1.0e-3):
+        assert criterion in ('jerk', 'acceleration'), f"Неизвестный критерий шага: '{criterion}'."
+        super().__init__()
+        self.eta = eta
+        self.criterion = criterion
+        self.min_step = min_step
+        self.substeps = 0
+
+    def step(self, engine, t):
+        n = engine.n
+        idx = np.flatnonzero(engine.movable())
+        if len(idx) == 0:
+            return
+        pos, vel = engine.pos[:n], engine.vel[:n]
+        done = 0.0
+        jerk = None
+        while done < t:
+            acc = self._start_acc(engine)
+            if self.criterion == 'jerk' and jerk is None:
+                jerk = engine.jerks(targets=idx)
+            dt = self.eta * timescales(engine, idx, pos, acc[idx], jerk, self.criterion).min()
+            dt = min(max(dt, self.min_step), t - done)
+            a0 = acc[idx].copy()
+            super().step(engine, dt)
+            # рывок на следующий подшаг - по изменению ускорения, без дополнительных вычислений
+            jerk = (engine.acc[idx] - a0) / dt
+            done += dt
+            self.substeps += 1
+
+
+class Block(Leapfrog):
+    """
+    Блочные шаги: каждый объект движется со своим шагом t / 2**k, k = 0...levels.
+
+    Медленные внешние объекты пересчитываются редко, тесные сближения - часто.
+    На каждом подшаге ускорения вычисляются только для активных объектов (чей шаг закончился);
+    координаты остальных объектов прогнозируются по их последнему состоянию x + v*h + a*h**2/2.
+    Активный объект переходит в спрогнозированные координаты, а скорость получает
+    среднее ускорение начала и конца своего шага (скоростной Верле).
+    Шаг объекта уменьшается сразу, а увеличивается не более чем вдвое и только когда время кратно новому шагу.
+
+    eta - доля характерного времени на один шаг объекта (точность).
+    criterion - критерий выбора шага: 'jerk' или 'acceleration' (см. timescales).
+    levels - наибольший уровень дробления шага (наименьший шаг t / 2**levels).
+
+    """
+
+    def __init__(self, eta=0.01, criterion='jerk', levels=20):
+        assert criterion in ('jerk', 'acceleration'), f"Неизвестный критерий шага: '{criterion}'."
+        super().__init__()
+        self.eta = eta
+        self.criterion = criterion
+        self.levels = levels
+        self._jerk = None
+        self.substeps = 0
+
+    def _level(self, engine, t, idx, pos, acc, jerk):
+        """
+        Метод возвращает уровни шагов k (шаг t / 2**k) по характерным временам объектов idx.
+
+        """
+
+        dt = self.eta * timescales(engine, idx, pos, acc, jerk, self.criterion)
+        with np.errstate(divide='ignore'):
+            k = np.ceil(np.log2(t / dt))
+        return np.clip(k, 0, self.levels).astype(np.int64)
+
+    def step(self, engine, t):
+        n = engine.n
+        idx = np.flatnonzero(engine.movable())
+        if len(idx) == 0:
+            return
+        fresh = not self._remembered(engine)
+        acc_all = self._start_acc(engine)
+        if fresh or self._jerk is None or len(self._jerk) != len(idx):
+            self._jerk = engine.jerks(targets=idx)
+        full = engine.pos[:n].copy()
+        x, v, a = full[idx].copy(), engine.vel[idx].copy(), acc_all[idx].copy()
+        jerk = self._jerk
+        # время в тиках наименьшего шага: объект уровня k делает шаг длиной 2**(levels - k) тиков
+        total = 2**self.levels
+        dt0 = t / total
+        k = self._level(engine, t, idx, full, a, jerk)
+        tau = np.zeros(len(idx), dtype=np.int64)
+        now = 0
+        while now < total:
+            size = total >> k
+            now = (tau + size).min()
+            active = np.flatnonzero(tau + size == now)
+            # прогноз координат всех подвижных объектов на текущий момент
+            h = (now - tau) * dt0
+            full[idx] = x + v * h[:, np.newaxis] + 0.5 * a * h[:, np.newaxis]**2
+            a_new = engine.accelerations(full, targets=idx[active])
+            ha = h[active, np.newaxis]
+            x[active] = full[idx[active]]
+            v[active] += 0.5 * (a[active] + a_new) * ha
+            jerk[active] = (a_new - a[active]) / ha
+            a[active] = a_new
+            tau[active] = now
+            # новые уровни: уменьшение шага - сразу, увеличение - на один уровень, если время кратно шагу
+            k_new = self._level(engine, t, idx[active], full, a_new, jerk[active])
+            k_old = k[active]
+            grow = (k_new < k_old) & (now % (2 * size[active]) == 0)
+            k[active] = np.where(k_new > k_old, k_new, np.where(grow, k_old - 1, k_old))
+            self.substeps += 1
+        engine.pos[idx], engine.vel[idx], engine.acc[idx] = x, v, a
+        self._remember(engine)
+
+
+integrators = {'euler': Euler, 'leapfrog': Leapfrog, 'yoshida4': Yoshida4, 'rk4': RK4,
+               'adaptive': Adaptive, 'block': Block}
+
+
+def largest_stable_step(make_space, name, tolerance=1.0e-6, t=1.0, steps=100, limit=30):
+    """
+    Функция подбирает наибольший шаг (t, 2t, 4t, ...), при котором ошибка энергии за один шаг
+    не превышает tolerance на протяжении steps шагов.
+
+    make_space: функция, возвращающая новый экземпляр сценария Space.
+    name: название численного метода.
+    tolerance: допустимая относительная ошибка энергии за шаг.
+    t: начальный шаг.
+    steps: количество шагов проверки.
+    limit: максимальное количество удвоений шага.
+
+    return: наибольший устойчивый шаг (0, если не подходит даже t)
+
+    """
+
+    best = 0.0
+    for _ in range(limit):
+        space = make_space()
+        space.set_integrator(name, track_energy=True)
+        for _ in range(steps):
+            space.gravity_interactions(t)
+            if not space.EnergyError <= tolerance:
+                return best
+        best = t
+        t *= 2
+    return best
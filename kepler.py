@@ -0,0 +1,208 @@
+"""
+Аналитическое движение по кеплеровой орбите (задача двух тел).
+
+Объекты с флагом CoordFromTime ("на рельсах") не интегрируются численно: их координаты и скорости
+относительно центрального тела вычисляются напрямую для любого момента времени Space.Time
+решением уравнения Кеплера. Решение векторизовано по всем таким объектам, ошибка интегрирования
+не накапливается, а перейти к любой дате можно без пошагового расчета.
+
+справочная информация по параметрам элипса
+https://ru.wikipedia.org/wiki/Эллипс
+
+справочная инфа по месту объекта на орбте
+https://ru.wikipedia.org/wiki/Кеплеровы_элементы_орбиты
+
+Элементы орбиты на плоскости:
+* a - большая полуось (для гиперболы - отрицательная)
+* e - эксцентриситет (0 - окружность, 0 < e < 1 - элипс, e > 1 - гипербола; e = 1 не поддерживается)
+* omega - аргумент перицентра (угол от оси Х до направления на перицентр), радианы
+* M0 - средняя аномалия в момент epoch, радианы
+* direction - направление движения: 1 - против часовой стрелки, -1 - по часовой
+* mu - гравитационный параметр G * (M + m)
+
+"""
+
+
+import numpy as np
+from constants import G
+
+
+def solve_kepler(M, e, tol=1.0e-14, iterations=50):
+    """
+    Функция решает уравнение Кеплера методом Ньютона для массивов средних аномалий M и эксцентриситетов e.
+
+    элипс (e < 1): E - e*sin(E) = M, возвращает эксцентрическую аномалию E;
+    гипербола (e > 1): e*sinh(H) - H = M, возвращает гиперболическую аномалию H.
+
+    """
+
+    M, e = np.broadcast_arrays(np.asarray(M, dtype=float), np.asarray(e, dtype=float))
+    hyperbolic = e > 1
+    # средняя аномалия элипса приводится к [-pi, pi)
+    M = np.where(hyperbolic, M, np.mod(M + np.pi, 2 * np.pi) - np.pi)
+    x = np.where(hyperbolic, np.arcsinh(M / np.where(hyperbolic, e, 1.0)),
+                 np.where(e < 0.8, M, np.pi * np.sign(M)))
+    for _ in range(iterations):
+        f = np.where(hyperbolic, e * np.sinh(x) - x - M, x - e * np.sin(x) - M)
+        df = np.where(hyperbolic, e * np.cosh(x) - 1, 1 - e * np.cos(x))
+        dx = f / df
+        x = x - dx
+        if np.all(np.abs(dx) <= tol * np.maximum(1.0, np.abs(x))):
+            break
+    return x
+
+
+def elements_from_state(pos, vel, mu):
+    """
+    Функция вычисляет элементы орбиты по вектору состояния относительно центрального тела.
+
+    pos, vel: относительные координаты и скорости, массивы (k, 2).
+    mu: гравитационные параметры, массив (k,).
+
+    return: словарь массивов a, e, omega, M0, direction
+
+    """
+
+    pos, vel = np.atleast_2d(pos).astype(float), np.atleast_2d(vel).astype(float)
+    mu = np.asarray(mu, dtype=float)
+    r = np.linalg.norm(pos, axis=1)
+    v2 = np.einsum('ij,ij->i', vel, vel)
+    rv = np.einsum('ij,ij->i', pos, vel)
+    h = pos[:, 0] * vel[:, 1] - pos[:, 1] * vel[:, 0]
+    direction = np.where(h < 0, -1.0, 1.0)
+    a = 1 / (2 / r - v2 / mu)
+    evec = ((v2 - mu / r)[:, np.newaxis] * pos - rv[:, np.newaxis] * vel) / mu[:, np.newaxis]
+    e = np.linalg.norm(evec, axis=1)
+    omega = np.arctan2(evec[:, 1], evec[:, 0])
+    # истинная аномалия в системе перицентра (ось Х - на перицентр, движение против часовой стрелки)
+    c, s = np.cos(omega), np.sin(omega)
+    xp = c * pos[:, 0] + s * pos[:, 1]
+    yp = direction * (-s * pos[:, 0] + c * pos[:, 1])
+    nu = np.arctan2(yp, xp)
+    hyperbolic = e > 1
+    with np.errstate(invalid='ignore'):
+        E = np.arctan2(np.sqrt(1 - e**2) * np.sin(nu), e + np.cos(nu))
+        H = np.arcsinh(np.sqrt(e**2 - 1) * np.sin(nu) / (1 + e * np.cos(nu)))
+    M0 = np.where(hyperbolic, e * np.sinh(np.where(hyperbolic, H, 0.0)) - H, E - e * np.sin(E))
+    return {'a': a, 'e': e, 'omega': omega, 'M0': M0, 'direction': direction}
+
+
+class KeplerOrbit:
+    """
+    Класс, описывающий орбиту космического объекта вокруг гравитирующего тела.
+
+    central - центральное (гравитирующее) тело, объект класса SpaceObjects.
+    a, e, omega, M0, direction, mu - элементы орбиты (см. описание модуля).
+    epoch - момент времени Space.Time, которому соответствует средняя аномалия M0.
+
+    """
+
+    def __init__(self, central, a, e, omega=0.0, M0=0.0, epoch=0.0, direction=1, mu=None):
+        assert e >= 0 and e != 1, f"Некорректный эксцентриситет: {e} (параболические орбиты не поддерживаются)."
+        assert (a > 0) == (e < 1), f"Большая полуось {a} не соответствует эксцентриситету {e}."
+        self.central = central
+        self.a = a
+        self.e = e
+        self.omega = omega
+        self.M0 = M0
+        self.epoch = epoch
+        self.direction = 1 if direction >= 0 else -1
+        self.mu = G * central.Mass if mu is None else mu
+
+    @classmethod
+    def from_state(cls, central, pos, vel, epoch=0.0, mu=None):
+        """
+        Метод строит орбиту по координатам и скорости относительно центрального тела в момент epoch.
+
+        """
+
+        mu = G * central.Mass if mu is None else mu
+        el = elements_from_state([pos], [vel], [mu])
+        return cls(central, float(el['a'][0]), float(el['e'][0]), float(el['omega'][0]), float(el['M0'][0]),
+                   epoch, int(el['direction'][0]), mu)
+
+    def elements(self):
+        """
+        Метод возвращает элементы орбиты без центрального тела - словарь аргументов конструктора
+        (например, для записи в снимок: KeplerOrbit(central, **orbit.elements())).
+
+        """
+
+        return {'a': float(self.a), 'e': float(self.e), 'omega': float(self.omega), 'M0': float(self.M0),
+                'epoch': float(self.epoch), 'direction': self.direction, 'mu': float(self.mu)}
+
+    def state(self, time):
+        """
+        Метод возвращает координаты и скорость объекта относительно центрального тела в момент time.
+
+        """
+
+        pos, vel = KeplerPropagator([self]).state(time)
+        return tuple(pos[0]), tuple(vel[0])
+
+
+class KeplerPropagator:
+    """
+    Векторизованный расчет положений набора объектов на кеплеровых орбитах.
+
+    orbits - список орбит (KeplerOrbit); элементы хранятся массивами.
+
+    """
+
+    def __init__(self, orbits):
+        self.orbits = list(orbits)
+        for name in ('a', 'e', 'omega', 'M0', 'epoch', 'direction', 'mu'):
+            setattr(self, name, np.array([getattr(o, name) for o in self.orbits], dtype=float))
+
+    def state(self, time):
+        """
+        Метод возвращает координаты и скорости всех объектов относительно их центральных тел в момент time.
+
+        return: массивы (k, 2) координат и скоростей
+
+        """
+
+        a, e = np.abs(self.a), self.e
+        n = np.sqrt(self.mu / a**3)
+        x = solve_kepler(self.M0 + n * (time - self.epoch), e)
+        hyperbolic = e > 1
+        with np.errstate(invalid='ignore', over='ignore'):
+            # элипс: x - эксцентрическая аномалия E
+            c, s = np.cos(x), np.sin(x)
+            k = np.sqrt(np.abs(1 - e**2))
+            el_pos = (a * (c - e), a * k * s)
+            el_vel = (-a * n * s / (1 - e * c), a * n * k * c / (1 - e * c))
+            # гипербола: x - гиперболическая аномалия H
+            ch, sh = np.cosh(x), np.sinh(x)
+            hy_pos = (a * (e - ch), a * k * sh)
+            hy_vel = (-a * n * sh / (e * ch - 1), a * n * k * ch / (e * ch - 1))
+        xp, yp = (np.where(hyperbolic, h, el) for h, el in zip(hy_pos, el_pos))
+        vxp, vyp = (np.where(hyperbolic, h, el) for h, el in zip(hy_vel, el_vel))
+        yp, vyp = self.direction * yp, self.direction * vyp
+        # поворот системы перицентра на угол omega
+        co, so = np.cos(self.omega), np.sin(self.omega)
+        pos = np.column_stack((co * xp - so * yp, so * xp + co * yp))
+        vel = np.column_stack((co * vxp - so * vyp, so * vxp + co * vyp))
+        return pos, vel
+
+
+def order_rails(objects):
+    """
+    Функция отбирает из objects объекты на кеплеровых орбитах (CoordFromTime и заданная орбита) и упорядочивает их так,
+    что центральное тело всегда идет раньше своих спутников.
+
+    return: список объектов
+
+    """
+
+    rails = [o for o in objects if o.CoordFromTime and o.Orbit is not None]
+    depth = {}
+
+    def level(o):
+        if id(o) not in depth:
+            central = o.Orbit.central
+            on_rails = central.CoordFromTime and central.Orbit is not None
+            depth[id(o)] = level(central) + 1 if on_rails else 0
+        return depth[id(o)]
+
+    return sorted(rails, key=level)
@@ -7,15 +7,18 @@
 """
 
 
+import os
+import time
 import pygame
-# import pygame_widgets
-from win32api import GetSystemMetrics
 from settings import Settings
-from pygame_widgets.button import ButtonArray
-import menu_tk as tk
-
-
-pygame.init()
+from stepper import FixedStepper
+from worker import PhysicsWorker
+from render import SceneRenderer
+from hud import HUD
+from field import FieldOverlay
+from profiler import FrameProfiler
+from menu import OverlayMenu
+from scene_io import SceneIO
 
 
 class MainLoop:
@@ -25,19 +28,42 @@ class MainLoop:
     w - Ширина экрана.
     h - Высота экрана.
     sm - Объект класса SpaceMath, отвечающего за математику.
-    t - Время.
+    t - Ускорение: модельных секунд за реальную секунду.
     fps - Количество обновлений окна в секунду.
     m - Коэффициент масштабирования отбражаемой области.
+    player - Воспроизведение записи (replay.Player): состояние объектов берется из записи,
+    а не рассчитывается Space.gravity_interactions(). None - моделирование в реальном времени.
+    stepper - Расчет шагами фиксированной длительности t / fps по реальному времени (stepper.FixedStepper):
+    ускорение увеличивает количество шагов за кадр, а не длительность шага.
+    worker - Фоновый расчет (worker.PhysicsWorker): пространство продвигается в отдельном потоке,
+    отрисовка читает согласованное состояние из двойного буфера. None - расчет между кадрами в основном потоке.
+    hud - Строка состояния и текст поверх сцены (hud.HUD): перерисовываются только изменившиеся поля.
+    redraw - Флаг полной перерисовки следующего кадра (после загрузки, очистки, открытия меню).
+    profiler - Замеры времени этапов кадра (profiler.FrameProfiler): обработка событий, обновление, отрисовка,
+    расчет сил. F3 - включить замеры и показать их процентили, F4 - выгрузить замеры в JSON,
+    F5 - профилировать cProfile Settings.profile_frames кадров. Выключенные замеры не замедляют кадр.
+    io - Сохранение и загрузка в фоне (scene_io.SceneIO): загруженное состояние подставляется на границе шага.
+    menu - Меню поверх сцены (menu.OverlayMenu, Tab): расчет и отрисовка во время работы с меню продолжаются.
+    size - Размер окна (ширина, высота); None - полноэкранный режим с размером монитора.
+    run - Запустить обработку событий из конструктора; False - объект только создается
+    (например, для замера отрисовки без дисплея, см. bench_suite).
 
     """
 
-    def __init__(self, space, t=1, fps=30, m=1.0e-08):
+    def __init__(self, space, t=1, fps=30, m=1.0e-08, player=None, worker=False, size=None, run=True):
+
+        # графическая библиотека инициализируется при создании окна, а не при импорте модуля
+        pygame.init()
 
         # название окна
         pygame.display.set_caption('OSN')
 
-        # ширина и высота окна берутся из системных настроек монитора (для режима FULLSCREEN)
-        self.width_screen, self.height_screen = GetSystemMetrics(0), GetSystemMetrics(1)
+        if size is None:
+            # ширина и высота окна берутся из системных настроек монитора (для режима FULLSCREEN)
+            from win32api import GetSystemMetrics
+            self.width_screen, self.height_screen = GetSystemMetrics(0), GetSystemMetrics(1)
+        else:
+            self.width_screen, self.height_screen = size
 
         # стартовые смещение камеры (середина области)
         self.offset_x = self.width_screen // 2
@@ -47,25 +73,89 @@ class MainLoop:
         self.fps = fps
 
         # создание пользовательского окна
-        self.sc = pygame.display.set_mode((self.width_screen, self.height_screen), pygame.FULLSCREEN)
+        self.sc = pygame.display.set_mode((self.width_screen, self.height_screen),
+                                          pygame.FULLSCREEN if size is None else 0)
 
         # расчетное пространство
         self.sm = space
 
+        # воспроизведение записи
+        self.player = player
+
         # коэффициент масштабирования
         self.m = m
 
-        # Время
+        # Время - длительность шага расчета
         self.t = t / self.fps
 
+        # таймер кадров (один на все время работы - иначе tick() не ограничивает частоту кадров)
+        self.clock = pygame.time.Clock()
+
+        # реальное время с предыдущего кадра, секунды
+        self.elapsed = 0.0
+
+        # расчет шагами фиксированной длительности, количество шагов за кадр задается ускорением
+        self.stepper = FixedStepper(space, self.t, warp=t, max_substeps=Settings.max_substeps)
+
+        # отрисовка объектов: отсечение по окну и слой точек для объектов меньше пикселя
+        self.renderer = SceneRenderer()
+
+        # строка состояния и текст поверх сцены
+        self.hud = HUD()
+
+        # отображение гравитационного поля (только на паузе)
+        self.field = FieldOverlay()
+        self.field_on = False
+
+        # замеры времени этапов кадра (обертки методов устанавливаются только при включении)
+        self.profiler = FrameProfiler()
+        self.profiler.attach(self, 'handle_events', 'events', frame=True)
+        self.profiler.attach(self, 'update')
+        self.profiler.attach(self, 'draw')
+        self.profile_on = False
+        self.profile_wall = 0.0
+        self.profile_lines = 0
+
+        # сообщение о выполненной команде и время его скрытия (см. notify())
+        self.message = None
+
+        # состояние сцены последнего отрисованного кадра: на паузе неизменная сцена не перерисовывается
+        self.scene = None
+        self.redraw = True
+
+        # замер количества шагов расчета в секунду (обновляется раз в полсекунды)
+        self.steps_per_second = 0.0
+        self.rate_wall = time.perf_counter()
+        self.rate_time = space.Time
+
+        # фоновый расчет (при воспроизведении записи не используется)
+        self.worker = None
+        if worker and player is None:
+            self.worker = PhysicsWorker(self.stepper, budget=1 / self.fps).start()
+
+        # расчет сил - в движке или в попарном цикле (при фоновом расчете замеряется в его потоке)
+        self.kernel = None
+        self.attach_kernel()
+        if Settings.profile:
+            self.profiler.enable()
+
         # События
         self.events = None
 
         # флаг паузы
         self.pause = False
 
-        # флаг отображения меню
-        self.menu_on = False
+        # сохранение и загрузка в фоне: состояние фиксируется и подставляется на границе шага
+        # (при фоновом расчете - в его потоке, поток кадров не ждет копирования столбцов)
+        self.io = SceneIO(space, self.worker.call if self.worker is not None else None)
+
+        # меню поверх сцены (Tab): не останавливает расчет и отрисовку
+        self.menu = OverlayMenu([('Файл', None),
+                                 ('Загрузить', lambda: self.io.load(self.menu.text)),
+                                 ('Сохранить', lambda: self.io.save(self.menu.text)),
+                                 ('Очистить список объектов', lambda: self.sync(self.sm.clear_objects)),
+                                 ('Закрыть', lambda: self.menu.toggle())],
+                                text='save1.snap', cache=self.hud.cache, size=int(self.height_screen * 0.03))
 
         # Список обрабатываемых объектов
         self.objects = []
@@ -76,27 +166,9 @@ class MainLoop:
         self.offset_left = False
         self.offset_right = False
 
-        # Создание кнопок
-        self.MenuButtonArray = ButtonArray(
-            # Mandatory Parameters
-            self.sc,  # Surface to place button array on
-            self.width_screen * 0.2,  # X-coordinate
-            self.height_screen * 0.2,  # Y-coordinate
-            self.width_screen * 0.6,  # Width
-            self.height_screen * 0.6,  # Height
-            (1, 4),  # Shape: 2 buttons wide, 2 buttons tall
-            border=50,  # Distance between buttons and edge of array
-            # Sets the texts of each button (counts left to right then top to bottom)
-            texts=('Очистить список объектов', 'SAVE', 'LOAD', '4'),
-            # When clicked, print number
-            onClicks=(self.sm.clear_objects,
-                      self.sm.save_obj,
-                      lambda: self.sm.load_obj(file_name="save1.csv"),
-                      lambda: print('4'))
-        )
-
         # обработка событий (этот метод в конструкторе идет последним, после него конструктор не читает)
-        self.event_loop()
+        if run:
+            self.event_loop()
 
     def handle_events(self):
         """
@@ -112,6 +184,14 @@ class MainLoop:
             if event.type == pygame.QUIT:
                 exit()
 
+            # окно перекрывалось или восстановлено - нужна полная перерисовка
+            if event.type in (pygame.VIDEOEXPOSE, pygame.WINDOWEXPOSED):
+                self.redraw = True
+
+            # открытое меню получает клавиатуру и мышь первым
+            if self.menu.handle(event):
+                continue
+
             # обработка нажатий клавиш
             if event.type == pygame.KEYDOWN:
 
@@ -131,11 +211,8 @@ class MainLoop:
 
                 # отображение меню
                 if event.key == pygame.K_TAB:
-                    # if self.menu_on:
-                    #     self.menu_on = False
-                    # else:
-                    #     self.menu_on = True
-                    tk.Run(self.sm, self)
+                    self.menu.toggle()
+                    self.redraw = True
 
                 # пауза
                 if event.key == pygame.K_SPACE or event.key == pygame.K_p:
@@ -144,15 +221,29 @@ class MainLoop:
                     else:
                         self.pause = True
 
-                # отрисовка гравитационного поля
+                # ускорение времени: больше или меньше шагов расчета за кадр
+                if event.key in (pygame.K_EQUALS, pygame.K_PLUS, pygame.K_KP_PLUS):
+                    self.stepper.warp *= 2
+                elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                    self.stepper.warp /= 2
+                # режим "как можно быстрее"
+                elif event.key == pygame.K_m:
+                    self.stepper.uncapped = not self.stepper.uncapped
+
+                # управление воспроизведением записи
+                if self.player is not None:
+                    self.handle_player_keys(event.key)
+
+                # замеры времени этапов кадра
+                if event.key in (pygame.K_F3, pygame.K_F4, pygame.K_F5):
+                    self.handle_profiler_keys(event.key)
+
+                # отрисовка гравитационного поля во всей видимой области (плитки поля кэшируются)
                 if event.key == pygame.K_g and self.pause:
-                    pass
-                    # TODO включить отрисовку гравитационного поля во всей расчетной области или отключить
-                    #  поле должно отрисоваться один раз (протестировать, если не получится,
-                    #  то один раз создать рисунок поля и в цикле его выводить)
+                    self.field_on = not self.field_on
+                # если пауза снята, отрисовка поля гравитации отключается
                 if not self.pause:
-                    pass
-                    # TODO если пауза снята, принудительно отключить отрисовку поля гравитации
+                    self.field_on = False
 
             # обработка отжатий клавиш
             elif event.type == pygame.KEYUP:
@@ -196,66 +287,223 @@ class MainLoop:
             pass
 
         # держим цикл на правильной скорости
-        pygame.time.Clock().tick(self.fps)
+        self.elapsed = self.clock.tick(self.fps) / 1000
+
+    def handle_player_keys(self, key):
+        """
+        Метод обрабатывает клавиши управления воспроизведением записи.
+
+        """
+
+        span = self.player.stop - self.player.start
+        if key == pygame.K_r:
+            self.player.reverse()
+        elif key == pygame.K_RIGHTBRACKET:
+            self.player.faster()
+        elif key == pygame.K_LEFTBRACKET:
+            self.player.slower()
+        elif key == pygame.K_HOME:
+            self.player.seek(self.player.start)
+        elif key == pygame.K_END:
+            self.player.seek(self.player.stop)
+        elif key == pygame.K_PAGEUP:
+            self.player.seek(self.player.time + span / 10)
+        elif key == pygame.K_PAGEDOWN:
+            self.player.seek(self.player.time - span / 10)
+
+    def handle_profiler_keys(self, key):
+        """
+        Метод обрабатывает клавиши замеров времени: F3 - показ замеров, F4 - выгрузка, F5 - cProfile.
+
+        """
+
+        os.makedirs(Settings.path, exist_ok=True)
+        stamp = time.strftime('%Y%m%d_%H%M%S')
+        if key == pygame.K_F3:
+            self.profile_on = not self.profile_on
+            if self.profile_on:
+                self.profiler.enable()
+            else:
+                self.profiler.disable()
+        elif key == pygame.K_F4:
+            path = self.profiler.export(os.path.join(Settings.path, f'profile_{stamp}.json'))
+            self.notify(f'Замеры записаны: {path}')
+        elif key == pygame.K_F5:
+            self.profiler.profile(Settings.profile_frames, os.path.join(Settings.path, f'profile_{stamp}.pstats'))
+            self.notify(f'Профилирование {Settings.profile_frames} кадров: profile_{stamp}.pstats')
+
+    def notify(self, text, seconds=5.0):
+        """
+        Метод показывает сообщение text над строкой состояния в течение seconds секунд.
+
+        """
+
+        self.message = (text, time.perf_counter() + seconds)
+
+    def attach_kernel(self):
+        """
+        Метод добавляет в замеры расчет сил текущего пространства (после загрузки или замены движка).
+
+        """
+
+        self.profiler.detach(self.kernel)
+        self.kernel = self.sm.Engine if self.sm.Engine is not None else self.sm
+        self.profiler.attach(self.kernel, 'accelerations' if self.sm.Engine is not None else '_pair_loop', 'forces')
+
+    def sync(self, func, *args, **kwargs):
+        """
+        Метод выполняет действие интерфейса над пространством (загрузка, очистка, сохранение)
+        согласованно с расчетом: при фоновом расчете - в его потоке между шагами.
+
+        """
+
+        self.redraw = True
+        if self.worker is not None:
+            return self.worker.call(func, *args, **kwargs)
+        return func(*args, **kwargs)
 
     def update(self):
+        # завершенная фоновая загрузка подставляется в пространство
+        if self.io.poll():
+            self.redraw = True
+            self.attach_kernel()
+        if self.worker is not None:
+            # расчет идет в фоновом потоке - передаем только состояние паузы
+            self.worker.paused = self.pause
+            return
         if not self.pause:
-            self.sm.gravity_interactions(self.t)
+            if self.player is not None:
+                self.player.advance(self.elapsed * self.stepper.warp)
+            else:
+                self.stepper.frame(self.elapsed, budget=1 / self.fps)
+
+    def model_time(self):
+        """
+        Метод возвращает модельное время отображаемого состояния.
+
+        """
+
+        if self.player is not None:
+            return self.player.time
+        if self.worker is not None:
+            return self.worker.time()
+        return self.sm.Time
+
+    def update_hud(self, count):
+        """
+        Метод обновляет поля строки состояния; перерисуются только поля, текст которых изменился.
+        count - количество объектов в отрисовываемом снимке.
+
+        """
+
+        size_text = int(self.height_screen * 0.03)
+        y = self.height_screen - size_text
+        bar = pygame.Color('lavender')
+        black = (0, 0, 0)
+        model_time = self.model_time()
+
+        # шагов расчета в секунду - по приросту модельного времени за последние полсекунды
+        now = time.perf_counter()
+        if now - self.rate_wall >= 0.5:
+            self.steps_per_second = max(model_time - self.rate_time, 0.0) / self.stepper.dt / (now - self.rate_wall)
+            self.rate_wall, self.rate_time = now, model_time
+
+        self.hud.set('scale', f'Коэф. масш.: {self.m:1.3g}', (5, y), size_text, black, bar)
+        if self.player is None:
+            if self.stepper.uncapped:
+                warp = 'макс.'
+            else:
+                warp = f'x{self.stepper.warp:1.3g}' + (' (не успевает)' if self.stepper.limited else '')
+            self.hud.set('mode', f'Ускорение: {warp}, шагов за кадр: {self.stepper.substeps}',
+                         (self.width_screen * 0.15, y), size_text, black, bar)
+            self.hud.set('rate', f'Шагов/с: {self.steps_per_second:.0f}, кадров/с: {self.clock.get_fps():.0f}',
+                         (self.width_screen * 0.8, y), size_text, black, bar)
+        else:
+            direction = 'вперед' if self.player.direction > 0 else 'назад'
+            self.hud.set('mode', f'Запись: {self.player.time:.6g} с из {self.player.stop:.6g} с, '
+                                 f'скорость x{self.player.speed:g}, {direction}',
+                         (self.width_screen * 0.15, y), size_text, black, bar)
+            self.hud.remove('rate')
+        self.hud.set('time', f'Время: {model_time / 86400:.2f} сут', (self.width_screen * 0.5, y), size_text,
+                     black, bar)
+        self.hud.set('bodies', f'Объектов: {count}', (self.width_screen * 0.65, y), size_text,
+                     black, bar)
+
+        # замеры времени этапов кадра - обновляются раз в полсекунды
+        if self.profile_on and now - self.profile_wall >= 0.5 or not self.profile_on and self.profile_lines:
+            self.profile_wall = now
+            lines = self.profiler.lines() if self.profile_on else []
+            for i, line in enumerate(lines):
+                self.hud.set(f'profile {i}', line, (5, 5 + i * size_text), size_text, (255, 255, 255), (0, 0, 32))
+            for i in range(len(lines), self.profile_lines):
+                self.hud.remove(f'profile {i}')
+            self.profile_lines = len(lines)
+
+        # сообщение о выполненной команде (например, выгрузке замеров) - над строкой состояния
+        if self.message is not None and now < self.message[1]:
+            self.hud.set('message', self.message[0], (5, y - size_text), size_text, black, bar)
+        else:
+            self.message = None
+            self.hud.remove('message')
+
+        # сообщение о паузе - поверх сцены, без фона
+        if self.pause:
+            self.hud.set('pause', 'ПАУЗА', (-75 + self.width_screen // 2, -25 + self.height_screen // 2), 50)
+        else:
+            self.hud.remove('pause')
 
     def draw(self):
         """
         Метод отрисовки сцены и объектов сцены.
         Метод только отрисовывает объекты - не обрабатывает события.
 
+        Если сцена не изменилась с прошлого кадра (пауза, камера на месте), она не перерисовывается:
+        на экране обновляются только изменившиеся поля строки состояния.
+
         """
 
-        def print_text(message, x, y, font_color=(255, 255, 255),
-                       font_type=pygame.font.match_font(pygame.font.get_fonts()[0]),
-                       font_size=50):
-            """
-            Метод отображения текста на экране
-
-            """
-
-            font_type = pygame.font.Font(font_type, font_size)
-            text = font_type.render(message, True, font_color)
-            self.sc.blit(text, (x, y))
-
-        def string_of_status():
-            # нижняя строка состояния
-            size_text = self.height_screen * 0.03
-            pygame.draw.rect(self.sc, pygame.Color('lavender'),
-                             (0, self.height_screen - size_text,
-                              self.width_screen, self.height_screen))
-            print_text(f'Коэф. масш.: {self.m:1.3g}',
-                       5, self.height_screen - size_text,
-                       font_size=int(size_text),
-                       font_color=(0, 0, 0))
-
-        # Цвет фона
-        self.sc.fill(pygame.Color('#000020'))
-
-        # Визуализация объектов
-        for object_in_space in self.sm.Objects:
-            object_in_space.draw(self.sc, shift=(self.offset_x, self.offset_y), m=self.m)
-
-        # отрисовка сообщения о паузе
-        if self.pause:
-            print_text('ПАУЗА',
-                       -75 + self.width_screen // 2,
-                       -25 + self.height_screen // 2)
+        # Снимок для отрисовки (при расчете - координаты, интерполированные между двумя последними шагами):
+        # при фоновом расчете объекты пространства не читаются - снимок берется из двойного буфера
+        if self.player is None:
+            state, positions = (self.worker or self.stepper).render_state()
+        else:
+            state, positions = self.stepper.scene(), self.stepper.positions()
+
+        scene = (self.model_time(), self.offset_x, self.offset_y, self.m, len(state), self.pause, self.field_on)
+        full = self.redraw or not self.pause or scene != self.scene or self.menu.visible
+        self.update_hud(len(state))
+        full = full or self.hud.needs_redraw()
+
+        if not full:
+            # статичный кадр - обновляются только грязные прямоугольники строки состояния
+            rects = self.hud.draw(self.sc)
+            if rects:
+                pygame.display.update(rects)
+            return
+
+        # Цвет фона или гравитационное поле
+        if self.field_on:
+            self.field.draw(self.sc, state, positions, shift=(self.offset_x, self.offset_y), m=self.m)
+        else:
+            self.sc.fill(pygame.Color('#000020'))
+        self.renderer.draw(self.sc, state, positions, shift=(self.offset_x, self.offset_y), m=self.m)
 
         # отрисовка меню пользователя
-        if self.menu_on:
-            # pygame_widgets.update(self.events)
-            pass
+        if self.menu.visible:
+            self.menu.status = self.io.status
+            self.menu.draw(self.sc)
 
-        # отрисовка статусной строки
-        string_of_status()
+        # отрисовка строки состояния и сообщения о паузе
+        size_text = int(self.height_screen * 0.03)
+        pygame.draw.rect(self.sc, pygame.Color('lavender'),
+                         (0, self.height_screen - size_text, self.width_screen, size_text))
+        self.hud.draw(self.sc, full=True)
 
         # после отрисовки всего, переворачиваем экран
         # pygame.display.flip()
         pygame.display.update()
+        self.scene = scene
+        self.redraw = False
 
     def event_loop(self):
 
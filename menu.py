@@ -0,0 +1,122 @@
+"""
+Меню поверх сцены.
+
+Меню отрисовывается в основном цикле pygame поверх кадра и не останавливает ни расчет, ни отрисовку.
+Пункты выбираются стрелками и Enter или мышью; пункт с полем ввода (имя файла) принимает набираемый текст.
+Действия пунктов не должны выполнять долгих операций в кадре - файловые операции выполняются в фоне (scene_io).
+
+"""
+
+
+import pygame
+from hud import TextCache
+
+
+class OverlayMenu:
+    """
+    Класс меню поверх сцены.
+
+    items - пункты меню: список пар (название, действие без аргументов); действие None - поле ввода текста.
+    text - текст поля ввода.
+    visible - меню открыто.
+    selected - номер выбранного пункта.
+    status - строка состояния под пунктами (например, ход фоновой операции).
+
+    """
+
+    def __init__(self, items, text='', cache=None, size=32):
+        assert items, "Меню без пунктов."
+        self.items = list(items)
+        self.text = text
+        self.visible = False
+        self.selected = 0
+        self.status = ''
+        self.size = size
+        self.cache = cache or TextCache()
+        # прямоугольники пунктов при последней отрисовке (для выбора мышью)
+        self._rects = []
+
+    def toggle(self):
+        self.visible = not self.visible
+        if self.visible:
+            pygame.key.start_text_input()
+        else:
+            pygame.key.stop_text_input()
+
+    def label(self, index):
+        name, action = self.items[index]
+        return f'{name}: {self.text}' + ('_' if index == self.selected else '') if action is None else name
+
+    def activate(self, index):
+        """
+        Метод выполняет действие пункта index.
+
+        """
+
+        self.selected = index
+        action = self.items[index][1]
+        if action is not None:
+            action()
+
+    def handle(self, event):
+        """
+        Метод обрабатывает событие, если меню открыто.
+
+        return: True, если событие обработано меню (не передается дальше). Отпускание клавиш (KEYUP) передается
+        дальше: клавиша, нажатая до открытия меню, не остается нажатой для сцены (например, перемещение камеры)
+
+        """
+
+        if not self.visible:
+            return False
+        editing = self.items[self.selected][1] is None
+        if event.type == pygame.KEYDOWN:
+            if event.key in (pygame.K_ESCAPE, pygame.K_TAB):
+                self.toggle()
+            elif event.key == pygame.K_UP:
+                self.selected = (self.selected - 1) % len(self.items)
+            elif event.key == pygame.K_DOWN:
+                self.selected = (self.selected + 1) % len(self.items)
+            elif event.key in (pygame.K_RETURN, pygame.K_KP_ENTER):
+                self.activate(self.selected)
+            elif event.key == pygame.K_BACKSPACE and editing:
+                self.text = self.text[:-1]
+            return True
+        if event.type == pygame.TEXTINPUT:
+            if editing:
+                self.text += event.text
+            return True
+        if event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
+            for index, rect in enumerate(self._rects):
+                if rect.collidepoint(event.pos):
+                    self.activate(index)
+            return True
+        if event.type in (pygame.MOUSEBUTTONUP, pygame.MOUSEMOTION):
+            return True
+        return False
+
+    def draw(self, sc):
+        """
+        Метод отрисовывает меню в центре поверхности sc.
+
+        return: прямоугольник меню
+
+        """
+
+        width, height = sc.get_size()
+        lines = [self.label(i) for i in range(len(self.items))]
+        step = int(self.size * 1.5)
+        panel = pygame.Rect(0, 0, width // 2, step * (len(lines) + 2))
+        panel.center = (width // 2, height // 2)
+        pygame.draw.rect(sc, (20, 20, 60), panel)
+        pygame.draw.rect(sc, pygame.Color('lavender'), panel, 2)
+        self._rects = []
+        for i, line in enumerate(lines):
+            color = (255, 255, 0) if i == self.selected else (255, 255, 255)
+            rect = pygame.Rect(panel.x + step // 2, panel.y + step // 2 + i * step, panel.width - step, step)
+            self._rects.append(rect)
+            sc.blit(self.cache.render(line, self.size, color), rect.topleft)
+        if self.status:
+            sc.blit(self.cache.render(self.status, self.size * 2 // 3, (180, 180, 220)),
+                    (panel.x + step // 2, panel.bottom - step))
+        return panel
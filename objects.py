@@ -1,68 +1,54 @@
-import pygame
 from settings import Settings
-from scipy.constants import G
-
-
-# class ObjectOrbit:
-#     """
-#     Класс, описывающий орбиту космического объекта
-#     Данная орбита формируется на основе ограниченной задачи движения двух тел
-#     (не учитывает влияние прочих гравитирующих тел)
-#
-#     справочная информация по параметрам элипса
-#     https://ru.wikipedia.org/wiki/Эллипс
-#
-#     справочная инфа по месту объекта на орбте
-#     https://ru.wikipedia.org/wiki/Кеплеровы_элементы_орбиты
-#
-#     Атрибуты класса ObjectOrbit:
-#
-#     * satellite - спутник, тело, которое движется по орбите, вокруг гравитирующего тела
-#     * r - расстояние от гравитирующего тела до спутника
-#     * g_obj - гравитирующее тело, вокруг которого происходит движение
-#     * а - большая полуось элипса орбиты
-#     * b - малая полуось элипса орбиты
-#     * e - коэффициент элептичности орбиты (эксцентриситет)
-#         e = (1 - b**2/a**2)**0.5
-#         e = 0 - окружность
-#         0 < e < 1 - элипс
-#         e = 1 - парабола
-#         1 < e < inf - гипербола
-#         e = inf - прямая (вырожденный случай)
-#     * GM - гравитационая постоянная гравитирующего тела
-#     * Ra, Rp - аргументы аппоцентра (дальняя точка от гравитирующего тела) и
-#              перицентра (ближайщая точка к гравитирующему телу) орбиты
-#
-#     """
-#
-#     def __init__(self, satellite):
-#         self.Satellite = satellite
-#         self.r = 0
-#         self.a = 0
-#         self.b = 0
-#         self.e = 0
-#         self.GM = 0
-#         self.GObj = None
-#         self.Ra = 0
-#         self.Rp = 0
-#
-#     def init_orbit_around(self, g_obj):
-#         self.GObj = g_obj
-#         self.GM = g_obj.Mass * G
-#         self.r = self.Satellite.distance_to(self.GObj)
-#         # TODO расчитать прочие параметры орбиты (И.Д.: параметры скорости спутника и его расстояние до грав. тела)
-#         if self.a > 0:
-#             self.e = (1 - self.b**2/self.a**2)**0.5
-#         elif self.a == 0:
-#             self.e = 1  # считаем, что дальше парабалического случая не рассматрваем
-#
-#     def draw(self):
-#         """
-#         Метод визуализации траектории движения
-#
-#         """
-#
-#         pass
+from constants import G
+from kepler import KeplerOrbit
+
+
+# атрибуты состояния объекта: пока объект не привязан к хранилищу, их значения - в списке obj._own в этом порядке
+STATE = ('Mass', 'R', 'X', 'Y', 'Vx', 'Vy', 'Ax', 'Ay', 'StaticCoord', 'CoordFromTime')
+
+
+class _StateField:
+    """
+    Дескриптор атрибута состояния космического объекта.
+
+    Пока объект не привязан к хранилищу (obj._store is None), значение хранится в самом объекте
+    (в списке obj._own). После привязки к векторизованному движку (engine.ArrayEngine) чтение и запись идут
+    напрямую в его массивы - объект становится "окном" (view) в общее хранилище, собственный список
+    состояния не хранится.
+
+    array: имя массива в хранилище.
+    column: номер столбца для двумерных массивов (0 - ось Х, 1 - ось У).
+    kind: тип, к которому приводится значение при чтении из хранилища.
+
+    """
+
+    def __init__(self, array, column=None, kind=float):
+        self.array = array
+        self.column = column
+        self.kind = kind
+        self.index = None
+
+    def __set_name__(self, owner, name):
+        self.index = STATE.index(name)
+
+    def __get__(self, obj, owner=None):
+        if obj is None:
+            return self
+        store = obj._store
+        if store is None:
+            return obj._own[self.index]
+        if self.column is None:
+            return self.kind(getattr(store, self.array)[obj._idx])
+        return self.kind(getattr(store, self.array)[obj._idx, self.column])
+
+    def __set__(self, obj, value):
+        store = obj._store
+        if store is None:
+            obj._own[self.index] = value
+        elif self.column is None:
+            getattr(store, self.array)[obj._idx] = value
+        else:
+            getattr(store, self.array)[obj._idx, self.column] = value
 
 
 class SpaceObjects:
@@ -70,6 +56,8 @@ class SpaceObjects:
     Класс космических объектов
 
     self.Name: Имя объекта.
+    self.Id: Номер объекта в пространстве (registry.Registry), не меняется до удаления объекта;
+    None - объект не добавлен в пространство.
     self.Mass: Масса объекта.
     self.R: Радиус объекта.
     self.X: Координата Х объекта.
@@ -85,25 +73,64 @@ class SpaceObjects:
     По умолчанию имеет значение False - координаты объекта не зависят от времени.
     True - координаты объекта зависят только от времени, а не от гравитации.
     self.Color: Цвет объекта.
-    self.Orbit: Орбита данного объекта, вокруг выбраного небесного тела (его необходиом предварительно добавить:
-    методом self.Orbit.init_orbit_around(g_obj))
+    self.Orbit: Орбита данного объекта вокруг выбранного небесного тела (kepler.KeplerOrbit),
+    задается методом self.set_orbit(g_obj). Используется при CoordFromTime = True.
+    GravitySource: Логический флаг класса. True - объект притягивает другие объекты;
+    False - пробная частица (TestParticle): объект только притягивается массивными объектами.
+
+    Атрибуты состояния (Mass, R, X, Y, Vx, Vy, Ax, Ay, StaticCoord, CoordFromTime) после добавления объекта
+    в Space с векторизованным движком читаются и записываются напрямую в массивы движка.
+
+    Атрибуты объекта перечислены в __slots__ - у объектов нет словаря атрибутов (__dict__), а привязанный
+    к движку объект не хранит и собственного состояния: это легкий указатель (номер строки) в общие массивы.
+    Новые атрибуты объекту назначить нельзя.
 
     """
 
+    __slots__ = ('_store', '_idx', '_own', 'Name', 'Id', 'Color', 'Orbit')
+
+    Mass = _StateField('mass')
+    R = _StateField('r')
+    X = _StateField('pos', 0)
+    Y = _StateField('pos', 1)
+    Vx = _StateField('vel', 0)
+    Vy = _StateField('vel', 1)
+    Ax = _StateField('acc', 0)
+    Ay = _StateField('acc', 1)
+    StaticCoord = _StateField('static', kind=bool)
+    CoordFromTime = _StateField('from_time', kind=bool)
+    GravitySource = True
+
     def __init__(self, name='', mass=0, r=0):  # TODO добавить методы чтения массы и радиуса - убрать из инит
+        # хранилище состояния (engine.ArrayEngine) и индекс объекта в нем, None - объект не привязан
+        self._store = None
+        self._idx = None
+        # собственное состояние непривязанного объекта в порядке STATE: масса, радиус (TODO сделать класс "планеты"
+        # и там будет этот парамтр), координаты, скорости и ускорения (None - не установлены), StaticCoord,
+        # CoordFromTime
+        self._own = [mass, r, None, None, None, None, None, None, False, False]
         self.Name = name
-        self.Mass = mass
-        self.R = r  # TODO сделать класс "планеты" и там будет этот парамтр
-        self.X = None
-        self.Y = None
-        self.Vx = None
-        self.Vy = None
-        self.Ax = None
-        self.Ay = None
-        self.StaticCoord = False
-        self.CoordFromTime = False
+        self.Id = None
         self.Color = None  # pygame.Color('green')
-        # self.Orbit = ObjectOrbit(self)a
+        self.Orbit = None
+
+    @classmethod
+    def _view(cls, name, color=None):
+        """
+        Метод создает объект без собственного состояния - для немедленной привязки к хранилищу
+        (engine.ArrayEngine.adopt()): атрибуты состояния сразу читаются из массивов хранилища.
+
+        """
+
+        obj = cls.__new__(cls)
+        obj._store = None
+        obj._idx = None
+        obj._own = None
+        obj.Name = name
+        obj.Id = None
+        obj.Color = color
+        obj.Orbit = None
+        return obj
 
     def set_coord(self, x=0.0, y=0.0, vx=0.0, vy=0.0, ax=0.0, ay=0.0, t=1.0):
         """
@@ -145,8 +172,7 @@ class SpaceObjects:
             # ничего не происходит - при этом флаге координаты объекта статичны (не изменяются)
             return
         if self.CoordFromTime:
-            # координаты зависят только от времени
-            # TODO метод перестроения координат по времени (время передается в закон движения по орбите)
+            # координаты зависят только от времени - их задает Space по орбите self.Orbit (Space.set_time())
             return
         if not x:
             x = self.X
@@ -162,6 +188,29 @@ class SpaceObjects:
             ay = self.Ay
         self.set_coord(x, y, vx, vy, ax, ay, t)
 
+    def set_orbit(self, g_obj, a=None, e=0.0, omega=0.0, m0=0.0, epoch=0.0, direction=1):
+        """
+        Метод переводит объект на кеплерову орбиту вокруг гравитирующего тела g_obj ("на рельсы"):
+        устанавливается флаг CoordFromTime, координаты объекта далее зависят только от времени Space.Time.
+
+        g_obj: Объект класса SpaceObjects - центральное тело.
+        a, e, omega, m0, direction: элементы орбиты (см. kepler). Если a не задана,
+        орбита строится по текущим координатам и скорости объекта относительно g_obj.
+        epoch: момент времени Space.Time, которому соответствуют элементы орбиты.
+
+        return: орбита объекта (kepler.KeplerOrbit)
+
+        """
+
+        mu = G * (g_obj.Mass + self.Mass)
+        if a is None:
+            self.Orbit = KeplerOrbit.from_state(g_obj, (self.X - g_obj.X, self.Y - g_obj.Y),
+                                                (self.Vx - g_obj.Vx, self.Vy - g_obj.Vy), epoch, mu)
+        else:
+            self.Orbit = KeplerOrbit(g_obj, a, e, omega, m0, epoch, direction, mu)
+        self.CoordFromTime = True
+        return self.Orbit
+
     def set_color(self, color):
         """
         Метод позволяет изменить цвет объекта.
@@ -178,17 +227,22 @@ class SpaceObjects:
         else:
             return min_r
 
-    def draw(self, sc, shift=(0, 0), m=1):
+    def draw(self, sc, shift=(0, 0), m=1, pos=None):
         """
         Метод отрисовки объекта на плоскости sc.
 
         sc: плоскость для отрсовки объекта.
         shift: смещение отрисовки
         m: коэффициент масштабирования
+        pos: координаты отрисовки (по умолчанию - текущие координаты объекта)
 
         """
 
-        pygame.draw.circle(sc, self.Color, (self.X * m + shift[0], self.Y * m + shift[1]), self.set_r(m))
+        # pygame нужен только для отрисовки - математическое ядро работает и без графических библиотек
+        import pygame
+
+        x, y = (self.X, self.Y) if pos is None else pos
+        pygame.draw.circle(sc, self.Color, (x * m + shift[0], y * m + shift[1]), self.set_r(m))
 
     def distance_to(self, obj, to_orient=False):
         """
@@ -230,6 +284,19 @@ class SpaceObjects:
 
         return G * self.Mass * obj.Mass / self.distance_to(obj)**2
 
+    def gravity_acceleration(self, obj):
+        """
+        Метод возвращает модуль ускорения, которое сообщает объекту притяжение объекта obj
+        (не зависит от массы самого объекта - применимо и к пробным частицам).
+
+        obj: Объект класса SpaceObjects.
+
+        return: Значение ускорения (Float)
+
+        """
+
+        return G * obj.Mass / self.distance_to(obj)**2
+
     def first_cosmic_velocity(self):
         """
         Пе́рвая косми́ческая ско́рость (кругова́я ско́рость) — минимальная (для заданной высоты над поверхностью
@@ -264,6 +331,21 @@ class SpaceObjects:
         pass
 
 
+class TestParticle(SpaceObjects):
+    """
+    Класс пробной частицы: космического аппарата, астероида или обломка, масса которого не влияет
+    на движение массивных объектов.
+
+    Пробная частица движется в поле притяжения массивных объектов, но сама никого не притягивает,
+    поэтому расчет N массивных объектов и M частиц стоит O(N**2 + N*M), а не O((N+M)**2).
+    Масса частицы может быть нулевой.
+
+    """
+
+    __slots__ = ()
+    GravitySource = False
+
+
 class Aircraft(SpaceObjects):
     """
     Класс, описывающий летательный аппарат - ракету
@@ -281,4 +363,4 @@ class Aircraft(SpaceObjects):
 
     """
 
-    pass
+    __slots__ = ()
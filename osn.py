@@ -17,59 +17,167 @@
 """
 
 
-import pygame
-from objects import SpaceObjects
-from space import Space
-from main_cycle import MainLoop
+import argparse
+import sys
 from settings import Settings
 
 
-def run():
+def run(player=None):
     """
     Функция run() запускает программу
 
+    player: воспроизведение записи (replay.Player) - вместо моделирования по сценарию по умолчанию
+
     Данная функция:
     - считывает настройки по умолчанию
     - запускает математическое пространство Space()
-    - формирует начальные космические объекты SpaceObjects()
+    - формирует начальные космические объекты SpaceObjects() по сценарию по умолчанию
     - добавляет SpaceObjects() в Space()
     - запускает процесс визуализации
     """
 
-    # запускаем математическую среду
-    space = Space()
-
-    # создаем объекты
-    # Солнце
-    mass_of_sun = 1.9891 * 10**30
-    sun = SpaceObjects('Sun', mass_of_sun,  695990000)
-    sun.set_color(pygame.Color('gold'))
-    sun.set_coord(0, 0)
-    # Солнце стоит неподвижно и никуда в дальнейшем не сдвинется
-    sun.StaticCoord = True
-
-    # Земля
-    mass_of_earth = 5.9722 * 10 ** 24
-    earth = SpaceObjects('Earth', mass_of_earth, 6371302)
-    earth.set_color(pygame.Color('blue'))
-    earth.set_coord(149.6 * 10 ** 9, 0, 0, 29765)
-
-    # # Марс
-    # # mass_of_mars = ...
-    # mass_of_mars = 45000000
-    # mars = SpaceObjects('Mars', mass_of_mars, 25)
-    # mars.set_color(pygame.Color('red'))
-    # mars.set_coord(x0, y0 - 250, -0.35)
-
-    # добавляем объекты в математической пространство
-    space.add_obj(sun, earth)
+    # графические библиотеки загружаются только для режима визуализации
+    from main_cycle import MainLoop
+    from scenarios import load_scenario
+
+    if player is not None:
+        MainLoop(player.space, Settings.t, Settings.fps, Settings.m, player=player)
+        return
+
+    # запускаем математическую среду и создаем объекты
+    space = load_scenario('sun-earth', engine=Settings.engine)
+    if Settings.solver == 'barnes-hut':
+        space.set_solver(Settings.solver, theta=Settings.theta)
+    if Settings.engine:
+        space.set_integrator(Settings.integrator)
+    space.use_collisions(Settings.collisions)
 
     # запуск основного цикла
-    MainLoop(space, Settings.t, Settings.fps, Settings.m)
+    MainLoop(space, Settings.t, Settings.fps, Settings.m, worker=Settings.worker)
 
     # после закрытия окна визуализации, программа останавливается и не производит никаких действий
 
 
+def simulate(args, space=None):
+    """
+    Функция запускает моделирование без визуализации (команда simulate).
+
+    space: пространство для продолжения расчета (команда resume) - вместо сценария args.scenario.
+
+    """
+
+    import headless
+
+    if space is None:
+        from scenarios import load_scenario
+        space = load_scenario(args.scenario, engine=True)
+    space.set_solver(args.solver, **({'theta': args.theta} if args.solver == 'barnes-hut' else {}))
+    space.set_integrator(args.integrator)
+    space.use_collisions(args.collisions)
+    if args.record:
+        space.attach_recorder(args.record, args.record_frames, args.record_every)
+    if args.checkpoint:
+        # без заданного интервала - контрольная точка каждые 10 минут реального времени
+        wall = args.checkpoint_wall * 60 if args.checkpoint_wall else None
+        space.attach_checkpoints(args.checkpoint, args.checkpoint_every, wall or (None if args.checkpoint_every else 600),
+                                 args.keyframe_every, args.keep)
+    headless.simulate(space, args.dt, steps=args.steps, duration=args.time,
+                      snapshot_every=args.snapshot_every, out=args.out)
+    space.detach_recorder()
+    space.detach_checkpoints()
+
+
+def resume(args):
+    """
+    Функция продолжает моделирование без визуализации с последней целой контрольной точки (команда resume).
+    Контрольные точки продолжают записываться в ту же папку.
+
+    """
+
+    from checkpoint import resume as load_checkpoint
+
+    space, entry = load_checkpoint(args.folder)
+    print(f"продолжение с контрольной точки {entry['file']}, модельное время {space.Time:.6g} с")
+    args.checkpoint = args.checkpoint or args.folder
+    simulate(args, space)
+
+
+def replay(args):
+    """
+    Функция запускает воспроизведение записи траекторий с визуализацией (команда replay).
+
+    """
+
+    from replay import Player
+
+    space = None
+    if args.scenario:
+        from scenarios import load_scenario
+        space = load_scenario(args.scenario, engine=True)
+    player = Player(args.record, space)
+    if args.time is not None:
+        player.seek(args.time)
+    run(player)
+
+
+def main(argv=None):
+    """
+    Разбор аргументов командной строки.
+
+    python osn.py - запуск с визуализацией;
+    python -m osn simulate <сценарий> (--steps N | --time T) [...] - моделирование без визуализации;
+    python -m osn resume <папка контрольных точек> (--steps N | --time T) [...] - продолжение моделирования;
+    python -m osn replay <файл записи> [--scenario S] [--time T] - воспроизведение записи.
+
+    """
+
+    parser = argparse.ArgumentParser(prog='osn', description='OrySpaceNavigation')
+    commands = parser.add_subparsers(dest='command')
+
+    sim = commands.add_parser('simulate', help='моделирование без визуализации')
+    sim.add_argument('scenario', nargs='?', default='sun-earth',
+                     help='встроенный сценарий или путь к файлу сохранения')
+    res = commands.add_parser('resume', help='продолжение моделирования с последней контрольной точки')
+    res.add_argument('folder', help='папка контрольных точек (osn simulate --checkpoint)')
+    for command in (sim, res):
+        length = command.add_mutually_exclusive_group(required=True)
+        length.add_argument('--steps', type=int, help='количество шагов')
+        length.add_argument('--time', type=float, help='модельное время, с')
+        command.add_argument('--dt', type=float, default=Settings.t / Settings.fps, help='длительность шага, с')
+        command.add_argument('--integrator', default=Settings.integrator, help='численный метод')
+        command.add_argument('--solver', default=Settings.solver, help="решатель: 'direct' или 'barnes-hut'")
+        command.add_argument('--theta', type=float, default=Settings.theta, help='угол раскрытия для barnes-hut')
+        command.add_argument('--collisions', action='store_true', help='слияние столкнувшихся объектов')
+        command.add_argument('--snapshot-every', type=int, default=None, help='сохранять снимок каждые N шагов')
+        command.add_argument('--out', default=Settings.path, help='папка для снимков состояния')
+        command.add_argument('--record', default=None, help='файл записи траекторий (кольцевой буфер)')
+        command.add_argument('--record-every', type=int, default=1, help='записывать кадр каждые N шагов')
+        command.add_argument('--record-frames', type=int, default=10000, help='емкость буфера записи, кадров')
+        command.add_argument('--checkpoint', default=None, help='папка контрольных точек')
+        command.add_argument('--checkpoint-every', type=float, default=None,
+                             help='контрольная точка каждые T модельных секунд')
+        command.add_argument('--checkpoint-wall', type=float, default=None,
+                             help='контрольная точка каждые M минут реального времени (по умолчанию 10)')
+        command.add_argument('--keyframe-every', type=int, default=10,
+                             help='каждая N-я контрольная точка - полный снимок, остальные - дельты')
+        command.add_argument('--keep', type=int, default=3, help='хранить точки последних N полных снимков')
+
+    rep = commands.add_parser('replay', help='воспроизведение записи траекторий')
+    rep.add_argument('record', help='файл записи (osn simulate --record)')
+    rep.add_argument('--scenario', default=None, help='сценарий записи - для цветов и радиусов объектов')
+    rep.add_argument('--time', type=float, default=None, help='начать с момента T, с')
+
+    args = parser.parse_args(argv)
+    if args.command == 'simulate':
+        simulate(args)
+    elif args.command == 'resume':
+        resume(args)
+    elif args.command == 'replay':
+        replay(args)
+    else:
+        run()
+
+
 if __name__ == "__main__":
 
-    run()
+    main(sys.argv[1:])
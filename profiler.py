@@ -0,0 +1,262 @@
+"""
+Замеры времени кадра по этапам.
+
+Профилировщик подменяет методы объектов (обработка событий, обновление, отрисовка, расчет сил) обертками,
+которые замеряют время вызова. Обертки устанавливаются только на время включения профилировщика - в выключенном
+состоянии методы вызываются напрямую, без накладных расходов.
+
+Для каждого этапа хранятся последние capacity замеров (кольцевой буфер): по ним считаются процентили
+p50/p95/p99. Длительность кадра - интервал между началами этапа, отмеченного как начало кадра.
+Замеры можно выгрузить в JSON для анализа вне программы.
+
+Режим cProfile: следующие N кадров профилируются cProfile, статистика записывается в файл (pstats)
+и в текстовый отчет рядом с ним. cProfile профилирует только поток, из которого он включен.
+
+"""
+
+
+import cProfile
+import json
+import pstats
+import time
+import numpy as np
+
+
+class Samples:
+    """
+    Кольцевой буфер последних замеров времени.
+
+    capacity - количество хранимых замеров.
+    count - количество замеров с начала работы.
+
+    """
+
+    def __init__(self, capacity=600):
+        assert capacity > 0, f"Некорректный размер буфера замеров: {capacity}."
+        self.values = np.zeros(capacity)
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.count % len(self.values)] = value
+        self.count += 1
+
+    def last(self):
+        """
+        Метод возвращает хранимые замеры в порядке поступления.
+
+        """
+
+        n = len(self.values)
+        if self.count <= n:
+            return self.values[:self.count].copy()
+        start = self.count % n
+        return np.concatenate((self.values[start:], self.values[:start]))
+
+
+class FrameProfiler:
+    """
+    Класс замеров времени этапов кадра.
+
+    capacity - количество хранимых замеров каждого этапа.
+    enabled - профилировщик включен (обертки установлены).
+    sections - буферы замеров по названиям этапов (Samples), 'frame' - длительность кадра.
+
+    """
+
+    def __init__(self, capacity=600):
+        self.capacity = capacity
+        self.enabled = False
+        self.sections = {}
+        # подменяемые методы: (объект, имя метода, название этапа, этап начинает кадр)
+        self._targets = []
+        self._frame_start = None
+        self._profile = None
+        self._profile_frames = 0
+        self._profile_path = None
+        self._profile_enabled = False
+
+    def attach(self, obj, method, name=None, frame=False):
+        """
+        Метод добавляет метод method объекта obj в замеры под названием name (по умолчанию - имя метода).
+
+        frame: начало этого этапа - начало нового кадра.
+
+        """
+
+        assert callable(getattr(obj, method, None)), f"У объекта {obj} нет метода '{method}'."
+        target = (obj, method, name or method, frame)
+        self._targets.append(target)
+        if self.enabled:
+            self._patch(target)
+
+    def detach(self, obj):
+        """
+        Метод убирает из замеров все методы объекта obj (например, замененного движка).
+
+        """
+
+        for target in [t for t in self._targets if t[0] is obj]:
+            if self.enabled:
+                self._unpatch(target)
+            self._targets.remove(target)
+
+    def enable(self):
+        """
+        Метод включает замеры: устанавливает обертки методов.
+
+        """
+
+        if not self.enabled:
+            self.enabled = True
+            self._frame_start = None
+            for target in self._targets:
+                self._patch(target)
+
+    def disable(self):
+        """
+        Метод выключает замеры: восстанавливает исходные методы (накопленные замеры сохраняются).
+
+        """
+
+        if self.enabled:
+            self.enabled = False
+            for target in self._targets:
+                self._unpatch(target)
+
+    def toggle(self):
+        if self.enabled:
+            self.disable()
+        else:
+            self.enable()
+
+    def clear(self):
+        """
+        Метод удаляет накопленные замеры.
+
+        """
+
+        self.sections = {}
+        self._frame_start = None
+
+    def _patch(self, target):
+        obj, method, name, frame = target
+        func = getattr(obj, method)
+        clock = time.perf_counter
+        record = self.record
+
+        def timed(*args, **kwargs):
+            start = clock()
+            if frame:
+                self._frame(start)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                record(name, clock() - start)
+
+        # обертка - атрибут экземпляра: перекрывает метод класса, удаляется при выключении
+        setattr(obj, method, timed)
+
+    @staticmethod
+    def _unpatch(target):
+        obj, method = target[:2]
+        if method in vars(obj):
+            delattr(obj, method)
+
+    def _frame(self, start):
+        """
+        Метод отмечает начало нового кадра.
+
+        """
+
+        if self._frame_start is not None:
+            self.record('frame', start - self._frame_start)
+        self._frame_start = start
+        if self._profile is not None:
+            self._profile_frames -= 1
+            if self._profile_frames < 0:
+                self._dump()
+
+    def record(self, name, seconds):
+        """
+        Метод добавляет замер seconds этапа name.
+
+        """
+
+        samples = self.sections.get(name)
+        if samples is None:
+            samples = self.sections[name] = Samples(self.capacity)
+        samples.add(seconds)
+
+    def stats(self):
+        """
+        Метод возвращает статистику этапов по хранимым замерам, миллисекунды.
+
+        return: словарь {этап: {'count', 'mean', 'p50', 'p95', 'p99', 'max'}}
+
+        """
+
+        result = {}
+        for name, samples in self.sections.items():
+            values = samples.last() * 1000
+            if not len(values):
+                continue
+            p50, p95, p99 = np.percentile(values, (50, 95, 99))
+            result[name] = {'count': samples.count, 'mean': float(values.mean()), 'p50': float(p50),
+                            'p95': float(p95), 'p99': float(p99), 'max': float(values.max())}
+        return result
+
+    def lines(self):
+        """
+        Метод возвращает строки статистики для отображения на экране.
+
+        """
+
+        lines = [f'{"этап":<8} {"p50":>7} {"p95":>7} {"p99":>7} мс']
+        for name, s in self.stats().items():
+            lines.append(f'{name:<8} {s["p50"]:>7.2f} {s["p95"]:>7.2f} {s["p99"]:>7.2f}')
+        if self._profile is not None:
+            lines.append(f'cProfile: осталось кадров {self._profile_frames + 1}')
+        return lines
+
+    def export(self, path):
+        """
+        Метод записывает статистику и хранимые замеры (секунды, в порядке поступления) в JSON-файл path.
+
+        """
+
+        data = {'time': time.time(), 'capacity': self.capacity, 'stats': self.stats(),
+                'samples': {name: samples.last().tolist() for name, samples in self.sections.items()}}
+        with open(path, 'w') as file:
+            json.dump(data, file, indent=1)
+        return path
+
+    def profile(self, frames, path):
+        """
+        Метод профилирует cProfile следующие frames кадров; статистика записывается в файл path (pstats),
+        отчет по суммарному времени - в path + '.txt'. Замеры на это время включаются.
+
+        """
+
+        assert frames > 0, f"Некорректное количество кадров: {frames}."
+        if self._profile is not None:
+            return
+        self._profile_enabled = self.enabled
+        self.enable()
+        self._profile_frames = frames
+        self._profile_path = path
+        self._profile = cProfile.Profile()
+        self._profile.enable()
+
+    def _dump(self):
+        """
+        Метод завершает профилирование cProfile и записывает статистику.
+
+        """
+
+        profile, self._profile = self._profile, None
+        profile.disable()
+        profile.dump_stats(self._profile_path)
+        with open(self._profile_path + '.txt', 'w') as file:
+            pstats.Stats(profile, stream=file).sort_stats('cumulative').print_stats(40)
+        if not self._profile_enabled:
+            self.disable()
@@ -0,0 +1,317 @@
+"""
+Запись траекторий в кольцевой буфер на диске.
+
+Recorder, подключенный к Space (Space.attach_recorder()), каждые every шагов дописывает полное состояние
+(модельное время, координаты и скорости всех объектов) в файл фиксированного размера - кольцевой буфер
+из capacity кадров, отображенный в память (np.memmap). Когда буфер заполнен, новые кадры замещают самые старые:
+размер файла и потребление памяти не растут при сколь угодно долгом расчете, запись кадра не создает новых массивов.
+
+Trajectory читает такой файл (в том числе во время записи из другого процесса) и возвращает траекторию
+любого объекта за интервал времени, обращаясь только к нужным кадрам, а не ко всему файлу.
+Состояние на любой момент времени восстанавливается интерполяцией между соседними кадрами (кубический
+многочлен Эрмита по координатам и скоростям); нужный кадр находится по индексу времени за постоянное время.
+
+Кадр хранит состояние всех объектов в порядке их строк, поэтому при изменении состава объектов (слияние
+при столкновении, удаление, добавление, загрузка - новая версия реестра Space.Objects) запись продолжается
+в новом сегменте - новом файле с текущим составом объектов (см. segment_path()): <имя>.1.traj, <имя>.2.traj и т. д.
+Каждый сегмент читается Trajectory как отдельная запись.
+
+Формат файла - как у снимков состояния (см. snapshot), сигнатура b'SPTRAJ'. Заголовок: n - количество объектов,
+capacity - емкость буфера в кадрах, every - шагов между кадрами, names - имена объектов.
+Столбцы: count - количество записанных кадров за все время (1,), time (capacity,),
+pos (capacity, n, 2), vel (capacity, n, 2). Кадр номер k хранится в ячейке k % capacity.
+
+"""
+
+
+import os
+import numpy as np
+import snapshot
+
+
+MAGIC = b'SPTRAJ'
+
+
+def segment_path(path, k):
+    """
+    Функция возвращает путь к сегменту номер k записи path (сегмент 0 - сам файл path).
+
+    """
+
+    if k == 0:
+        return path
+    root, ext = os.path.splitext(path)
+    return f'{root}.{k}{ext}'
+
+
+class Recorder:
+    """
+    Класс, записывающий состояние объектов пространства в кольцевой буфер на диске.
+
+    path - путь к файлу записи (текущего сегмента).
+    paths - пути ко всем сегментам записи (см. описание модуля).
+    n - количество объектов.
+    names - имена объектов.
+    capacity - емкость буфера в кадрах.
+    every - записывать кадр каждые every шагов.
+    count - количество записанных кадров текущего сегмента.
+    steps - количество шагов с момента подключения.
+    version - версия состава объектов пространства (registry.Registry.version) текущего сегмента.
+
+    """
+
+    def __init__(self, path, names, capacity=10000, every=1):
+        assert capacity > 0, f"Некорректная емкость буфера: {capacity}."
+        assert every > 0, f"Некорректный интервал записи: {every}."
+        self.capacity = capacity
+        self.every = every
+        self.steps = 0
+        self.version = None
+        self.paths = []
+        self._base = path
+        self._open(path, names)
+
+    def _open(self, path, names):
+        """
+        Метод создает файл записи path для объектов с именами names.
+
+        """
+
+        capacity = self.capacity
+        self.path = path
+        self.paths.append(path)
+        self.names = list(names)
+        self.n = len(self.names)
+        self.count = 0
+        columns = {'count': ('<i8', (1,)), 'time': ('<f8', (capacity,)),
+                   'pos': ('<f8', (capacity, self.n, 2)), 'vel': ('<f8', (capacity, self.n, 2))}
+        prefix, table, size = snapshot.layout(MAGIC, {'n': self.n, 'capacity': capacity, 'every': self.every,
+                                                      'names': self.names}, columns)
+        with open(path, 'wb') as file:
+            file.write(prefix)
+            # файл сразу получает полный размер (на большинстве файловых систем - без записи нулей на диск)
+            file.truncate(size)
+        for name, (dtype, shape, offset) in table.items():
+            setattr(self, '_' + name, np.memmap(path, dtype=dtype, mode='r+', offset=offset, shape=tuple(shape)))
+
+    def record(self, space):
+        """
+        Метод вызывается после каждого шага пространства space и каждые every шагов записывает кадр.
+
+        """
+
+        self.steps += 1
+        if self.steps % self.every == 0:
+            self.write(space)
+
+    def restart(self, space):
+        """
+        Метод завершает текущий сегмент и начинает новый с текущим составом объектов пространства space.
+
+        """
+
+        self.close()
+        self._open(segment_path(self._base, len(self.paths)), [o.Name for o in space.Objects])
+        self.version = space.Objects.version
+
+    def write(self, space):
+        """
+        Метод записывает текущее состояние пространства space в очередной кадр буфера.
+        Если состав объектов изменился - кадр записывается в новый сегмент.
+
+        """
+
+        if self.version is None:
+            self.version = space.Objects.version
+        elif space.Objects.version != self.version:
+            self.restart(space)
+        slot = self.count % self.capacity
+        engine = space.Engine
+        if engine is not None:
+            self._pos[slot] = engine.pos[:self.n]
+            self._vel[slot] = engine.vel[:self.n]
+        else:
+            pos, vel = self._pos[slot], self._vel[slot]
+            for i, o in enumerate(space.Objects):
+                pos[i, 0], pos[i, 1] = o.X or 0.0, o.Y or 0.0
+                vel[i, 0], vel[i, 1] = o.Vx or 0.0, o.Vy or 0.0
+        self._time[slot] = space.Time
+        # счетчик кадров обновляется последним - читатель не увидит недописанный кадр
+        self.count += 1
+        self._count[0] = self.count
+
+    def flush(self):
+        """
+        Метод сбрасывает записанные кадры на диск.
+
+        """
+
+        for array in (self._time, self._pos, self._vel, self._count):
+            array.flush()
+
+    def close(self):
+        """
+        Метод завершает запись.
+
+        """
+
+        self.flush()
+        self._time = self._pos = self._vel = self._count = None
+
+
+class Trajectory:
+    """
+    Класс для чтения записи траекторий (файла Recorder).
+
+    n - количество объектов.
+    names - имена объектов.
+    capacity - емкость буфера в кадрах.
+    every - шагов между кадрами.
+
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as file:
+            header = snapshot.read_header(file, MAGIC)
+        self.path = path
+        self.n = header['n']
+        self.names = header['names']
+        self.capacity = header['capacity']
+        self.every = header['every']
+        for name, (dtype, shape, offset) in header['columns'].items():
+            setattr(self, '_' + name, np.memmap(path, dtype=dtype, mode='r', offset=offset, shape=tuple(shape)))
+        # индекс времени (см. self._build_index()), строится при первом обращении и после записи новых кадров
+        self._indexed = None
+
+    def __len__(self):
+        return min(int(self._count[0]), self.capacity)
+
+    def index(self, body):
+        """
+        Метод возвращает индекс объекта по его имени (или сам индекс).
+
+        """
+
+        if isinstance(body, str):
+            assert body in self.names, f"Объект '{body}' отсутствует в записи."
+            return self.names.index(body)
+        return body
+
+    def slots(self, start=None, stop=None):
+        """
+        Метод возвращает ячейки буфера с кадрами интервала времени start <= time <= stop
+        в хронологическом порядке (None - без ограничения).
+
+        """
+
+        count = int(self._count[0])
+        frames = min(count, self.capacity)
+        slots = np.arange(count - frames, count) % self.capacity
+        time = self._time[slots]
+        first = 0 if start is None else np.searchsorted(time, start, side='left')
+        last = frames if stop is None else np.searchsorted(time, stop, side='right')
+        return slots[first:last]
+
+    def times(self, start=None, stop=None):
+        """
+        Метод возвращает моменты времени кадров интервала [start, stop].
+
+        """
+
+        return np.array(self._time[self.slots(start, stop)])
+
+    def trajectory(self, body, start=None, stop=None):
+        """
+        Метод возвращает траекторию объекта body (имя или индекс) за интервал времени [start, stop].
+        С диска читаются только координаты и скорости этого объекта в кадрах интервала.
+
+        return: словарь массивов time (k,), pos (k, 2), vel (k, 2)
+
+        """
+
+        i = self.index(body)
+        slots = self.slots(start, stop)
+        return {'time': np.array(self._time[slots]), 'pos': np.array(self._pos[slots, i]),
+                'vel': np.array(self._vel[slots, i])}
+
+    def _build_index(self):
+        """
+        Метод строит индекс времени: моменты кадров в хронологическом порядке и таблицу равных интервалов
+        времени (по одному на кадр), для каждого из которых записан номер последнего кадра не позднее его начала.
+        Кадр для любого момента находится по таблице и нескольким шагам вперед - без поиска по всей записи.
+
+        """
+
+        count = int(self._count[0])
+        if self._indexed == count:
+            return
+        assert count, "Запись не содержит кадров."
+        frames = min(count, self.capacity)
+        self._chrono = np.arange(count - frames, count) % self.capacity
+        self._times = np.array(self._time[self._chrono])
+        self._first, self._last = float(self._times[0]), float(self._times[-1])
+        self._width = (self._last - self._first) / frames or 1.0
+        edges = self._first + self._width * np.arange(frames)
+        self._bins = np.searchsorted(self._times, edges, side='right') - 1
+        self._indexed = count
+
+    def span(self):
+        """
+        Метод возвращает моменты первого и последнего кадров записи.
+
+        """
+
+        self._build_index()
+        return self._first, self._last
+
+    def seek(self, time):
+        """
+        Метод возвращает хронологический номер последнего кадра, записанного не позднее момента time
+        (для моментов раньше начала записи - номер первого кадра).
+
+        """
+
+        self._build_index()
+        times = self._times
+        b = min(max(int((time - self._first) / self._width), 0), len(self._bins) - 1)
+        i = max(self._bins[b], 0)
+        while i + 1 < len(times) and times[i + 1] <= time:
+            i += 1
+        return int(i)
+
+    def state(self, time):
+        """
+        Метод возвращает состояние всех объектов в момент time: между кадрами координаты и скорости
+        интерполируются кубическим многочленом Эрмита, вне записи - берутся из крайних кадров.
+
+        return: массивы (n, 2) координат и скоростей
+
+        """
+
+        i = self.seek(time)
+        slot = self._chrono[i]
+        pos0, vel0 = np.array(self._pos[slot]), np.array(self._vel[slot])
+        if i + 1 == len(self._times) or time <= self._times[i]:
+            return pos0, vel0
+        slot = self._chrono[i + 1]
+        pos1, vel1 = self._pos[slot], self._vel[slot]
+        h = self._times[i + 1] - self._times[i]
+        s = (time - self._times[i]) / h
+        s2, s3 = s * s, s * s * s
+        pos = (2 * s3 - 3 * s2 + 1) * pos0 + (s3 - 2 * s2 + s) * h * vel0 + \
+              (3 * s2 - 2 * s3) * pos1 + (s3 - s2) * h * vel1
+        vel = ((6 * s2 - 6 * s) * (pos0 - pos1) / h + (3 * s2 - 4 * s + 1) * vel0 + (3 * s2 - 2 * s) * vel1)
+        return pos, vel
+
+    def frame(self, time):
+        """
+        Метод возвращает последний кадр, записанный не позднее момента time.
+
+        return: словарь: time - момент кадра, pos, vel - массивы (n, 2) всех объектов
+
+        """
+
+        slots = self.slots(None, time)
+        assert len(slots), f"Нет кадров до момента {time}."
+        slot = slots[-1]
+        return {'time': float(self._time[slot]), 'pos': np.array(self._pos[slot]), 'vel': np.array(self._vel[slot])}
@@ -0,0 +1,211 @@
+"""
+Реестр объектов математического пространства.
+
+Space.Objects - реестр: список объектов, в котором индекс объекта совпадает с его строкой в массивах
+движка (engine.ArrayEngine), дополненный постоянными номерами объектов и указателем по именам:
+* каждому добавленному объекту присваивается целочисленный номер SpaceObjects.Id - он не меняется
+  при перестановках объектов и не используется повторно;
+* поиск объекта по номеру (get()) и по имени (find()) и проверка принадлежности (in) - O(1);
+* удаление - перенос последних объектов на освободившиеся места (swap-remove, см. swap_plan()):
+  O(1) на удаленный объект, список и массивы движка остаются плотными, но порядок объектов меняется;
+* пакетное добавление (add()) - номера и индексы присваиваются одним проходом.
+
+Указатель по номерам - массив из 8 байт на каждый когда-либо выданный номер (номера не используются повторно):
+он растет с количеством добавлений, а не с количеством объектов - миллион добавлений занимают 8 МБ, даже
+если объекты уже удалены (Space.clear_objects() создает новый реестр).
+
+Указатель по именам строится при первом поиске по имени и далее поддерживается при изменениях состава за O(1):
+уникальное имя указывает на объект, повторяющееся - на словарь объектов с этим именем по номерам.
+При повторяющихся именах find() возвращает первый добавленный из оставшихся объектов с этим именем.
+
+version - номер состава объектов: новый при каждом изменении состава (уникален среди всех реестров),
+по нему кэши (цвета отрисовки, ключевые кадры контрольных точек) определяют, что состав изменился.
+
+"""
+
+
+import itertools
+import numpy as np
+
+
+# общий счетчик версий: версия реестра не совпадает с версией любого другого реестра
+_versions = itertools.count(1)
+
+
+def swap_plan(n, indices):
+    """
+    Функция планирует удаление элементов indices из плотного массива длины n: на места удаленных элементов
+    переносятся оставшиеся элементы из конца массива.
+
+    return: новая длина, индексы освободившихся мест (holes), индексы переносимых на них элементов (movers)
+
+    """
+
+    gone = np.unique(np.asarray(indices, dtype=np.int64))
+    m = n - len(gone)
+    holes = gone[gone < m]
+    # в хвосте [m, n) остаются неудаленные элементы - ровно столько, сколько мест освободилось до m
+    tail = np.ones(n - m, dtype=bool)
+    tail[gone[gone >= m] - m] = False
+    movers = np.flatnonzero(tail) + m
+    return m, holes, movers
+
+
+class Registry(list):
+    """
+    Список объектов пространства с постоянными номерами и указателем по именам.
+
+    version - номер состава объектов (см. описание модуля).
+    next_id - номер, который получит следующий добавленный объект.
+
+    Состав меняется только методами add() и swap_remove(), которые пространство вызывает вместе с изменением
+    массивов движка (Space.add_obj(), Space.remove_obj()). Изменяющие методы списка (append(), extend(), +=,
+    remove(), pop(), del, clear(), insert(), sort(), reverse(), присваивание по индексу, *=) изменили бы реестр
+    без строк движка - они запрещены (TypeError).
+
+    """
+
+    def __init__(self, objects=(), ids=None):
+        super().__init__()
+        self.version = next(_versions)
+        self.next_id = 0
+        # индексы объектов в списке по их номерам (-1 - номер не занят): массив, а не словарь - 8 байт на номер
+        self._where = np.full(16, -1, dtype=np.int64)
+        # имя -> объект или словарь {номер: объект} для повторяющегося имени (None - указатель еще не построен)
+        self._names = None
+        self.add(objects, ids)
+
+    def add(self, objects, ids=None):
+        """
+        Метод добавляет объекты objects в конец списка и присваивает им номера.
+
+        ids: номера объектов (например, сохраненные в снимке); отрицательный номер или None - новый номер.
+
+        return: массив номеров добавленных объектов
+
+        """
+
+        objects = list(objects)
+        k = len(objects)
+        start = len(self)
+        if ids is None:
+            ids = np.arange(self.next_id, self.next_id + k)
+        else:
+            ids = np.asarray(ids, dtype=np.int64).copy()
+            assert len(ids) == k, f"Количество номеров {len(ids)} не совпадает с количеством объектов {k}."
+            fresh = ids < 0
+            first = max(self.next_id, int(ids.max(initial=-1)) + 1)
+            ids[fresh] = np.arange(first, first + int(fresh.sum()))
+            known = ids[ids < len(self._where)]
+            used = known[self._where[known] >= 0].tolist()
+            assert len(np.unique(ids)) == k and not used, f"Номера объектов повторяются: {used or ids}."
+        self.next_id = max(self.next_id, int(ids.max(initial=-1)) + 1)
+        if self.next_id > len(self._where):
+            where = np.full(max(self.next_id, 2 * len(self._where)), -1, dtype=np.int64)
+            where[:len(self._where)] = self._where
+            self._where = where
+        for obj, i in zip(objects, ids.tolist()):
+            obj.Id = i
+        super().extend(objects)
+        self._where[ids] = np.arange(start, start + k)
+        if self._names is not None:
+            for obj in objects:
+                self._index_name(obj)
+        self.version = next(_versions)
+        return ids
+
+    def _forbidden(self, *args, **kwargs):
+        raise TypeError("Реестр объектов изменяется только вместе с массивами движка: используйте "
+                        "Space.add_obj(), Space.remove_obj() и Space.clear_objects().")
+
+    # изменяющие методы списка не переносят строки движка - состав меняется только через add() и swap_remove()
+    append = extend = __iadd__ = remove = pop = __delitem__ = clear = _forbidden
+    insert = sort = reverse = __setitem__ = __imul__ = _forbidden
+
+    def __reduce__(self):
+        # передача в другой процесс (pickle): реестр строится заново с прежними номерами
+        return Registry, (list(self), [obj.Id for obj in self])
+
+    def __contains__(self, obj):
+        obj_id = getattr(obj, 'Id', None)
+        return obj_id is not None and self.get(obj_id) is obj
+
+    def get(self, id):
+        """
+        Метод возвращает объект с номером id (None - такого объекта нет).
+
+        """
+
+        if not 0 <= id < len(self._where):
+            return None
+        position = int(self._where[id])
+        return None if position < 0 else self[position]
+
+    def position(self, obj):
+        """
+        Метод возвращает индекс объекта obj в списке (и строку в массивах движка).
+
+        """
+
+        assert obj in self, f"Объект {obj} не принадлежит пространству."
+        return int(self._where[obj.Id])
+
+    def find(self, name):
+        """
+        Метод возвращает объект с именем name (None - такого объекта нет).
+
+        """
+
+        if self._names is None:
+            self._names = {}
+            for obj in self:
+                self._index_name(obj)
+        found = self._names.get(name)
+        return next(iter(found.values())) if isinstance(found, dict) else found
+
+    def _index_name(self, obj):
+        name = obj.Name
+        found = self._names.get(name)
+        if found is None:
+            self._names[name] = obj
+        elif isinstance(found, dict):
+            found[obj.Id] = obj
+        else:
+            self._names[name] = {found.Id: found, obj.Id: obj}
+
+    def swap_remove(self, positions):
+        """
+        Метод удаляет объекты с индексами positions: на их места переносятся объекты из конца списка.
+
+        return: план удаления (см. swap_plan()) - по нему же переставляются строки массивов движка
+
+        """
+
+        m, holes, movers = plan = swap_plan(len(self), positions)
+        if m == len(self):
+            return plan
+        gone = [self[i] for i in np.unique(np.asarray(positions, dtype=np.int64)).tolist()]
+        moved = []
+        for hole, mover in zip(holes.tolist(), movers.tolist()):
+            obj = self[mover]
+            super().__setitem__(hole, obj)
+            moved.append(obj.Id)
+        super().__delitem__(slice(m, None))
+        self._where[[obj.Id for obj in gone]] = -1
+        self._where[moved] = holes
+        if self._names is not None:
+            for obj in gone:
+                self._unindex_name(obj)
+        self.version = next(_versions)
+        return plan
+
+    def _unindex_name(self, obj):
+        name = obj.Name
+        found = self._names.get(name)
+        if found is obj:
+            del self._names[name]
+        elif isinstance(found, dict):
+            found.pop(obj.Id, None)
+            if len(found) == 1:
+                # имя больше не повторяется - указатель снова ссылается прямо на объект
+                self._names[name] = next(iter(found.values()))
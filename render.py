@@ -0,0 +1,119 @@
+"""
+Отрисовка больших сцен.
+
+Координаты всех объектов переводятся в экранные одной векторной операцией, объекты за пределами окна
+отбрасываются. Окружностями рисуются только видимые объекты:
+* объекты, радиус которых на экране не меньше пикселя;
+* объекты меньше пикселя, пока их немного (не больше max_circles) - с радиусом min_r, как SpaceObjects.set_r().
+Если видимых объектов меньше пикселя больше max_circles, они собираются в слой точек: объекты, попавшие
+в один пиксель, объединяются, цвет пикселя - средний цвет объектов, яркость растет с их количеством.
+Слой точек записывается прямо в массив пикселей поверхности (pygame.surfarray), без вызовов pygame.draw.
+
+"""
+
+
+import numpy as np
+import pygame
+from settings import Settings
+from stepper import SceneState
+
+
+class SceneRenderer:
+    """
+    Класс отрисовки объектов пространства.
+
+    min_r - наименьший радиус окружности объекта, пикселей.
+    max_circles - наибольшее количество объектов меньше пикселя, рисуемых окружностями.
+    stats - статистика последней отрисовки: circles - окружностей, points - объектов в слое точек,
+    pixels - пикселей слоя точек, culled - объектов за пределами окна.
+
+    """
+
+    def __init__(self, min_r=Settings.min_r, max_circles=Settings.lod_circles):
+        self.min_r = min_r
+        self.max_circles = max_circles
+        self.stats = {'circles': 0, 'points': 0, 'pixels': 0, 'culled': 0}
+        self._scene = None
+
+    def invalidate(self):
+        """
+        Метод сбрасывает кэш цветов объектов (например, после изменения цвета объекта).
+
+        """
+
+        self._scene = None
+
+    def draw(self, sc, space, positions, shift=(0, 0), m=1):
+        """
+        Метод отрисовывает объекты пространства space на поверхности sc.
+
+        space: пространство (Space) или его снимок для отрисовки (stepper.SceneState, например, опубликованный
+        потоком расчета); цвета объектов пространства кэшируются до изменения состава объектов.
+        positions: координаты объектов для отрисовки, массив (n, 2).
+        shift: смещение отрисовки, пикселей.
+        m: коэффициент масштабирования.
+
+        return: статистика отрисовки self.stats
+
+        """
+
+        if not isinstance(space, SceneState):
+            # версия реестра объектов меняется при любом изменении состава (registry.Registry)
+            space = self._scene = SceneState(space, self._scene)
+        n = min(len(positions), len(space))
+        colors, radii = space.colors, space.radii
+        if n == 0:
+            self.stats = {'circles': 0, 'points': 0, 'pixels': 0, 'culled': 0}
+            return self.stats
+        width, height = sc.get_size()
+        screen = np.asarray(positions[:n], dtype=float) * m + shift
+        radius = radii[:n] * m
+        small = radius < 1
+        # окружность меньше пикселя рисуется радиусом min_r - с ним и проверяется видимость
+        reach = np.where(small, self.min_r, radius)
+        x, y = screen[:, 0], screen[:, 1]
+        visible = (x + reach >= 0) & (x - reach < width) & (y + reach >= 0) & (y - reach < height)
+        circles = visible & ~small
+        small_visible = visible & small
+        points = np.zeros(0, dtype=int)
+        if np.count_nonzero(small_visible) > self.max_circles:
+            # в слой точек попадают только объекты, пиксель которых лежит в пределах окна
+            points = np.flatnonzero(small_visible & (x >= 0) & (x < width) & (y >= 0) & (y < height))
+        else:
+            circles |= small_visible
+
+        # слой точек - под окружностями крупных объектов
+        pixels = 0
+        if len(points):
+            pixels = self._draw_points(sc, screen.take(points, axis=0), colors.take(points, axis=0))
+        for i in np.flatnonzero(circles).tolist():
+            pygame.draw.circle(sc, colors[i].tolist(), (x[i], y[i]), max(radius[i], self.min_r))
+        drawn = int(np.count_nonzero(circles))
+        self.stats = {'circles': drawn, 'points': len(points), 'pixels': pixels, 'culled': n - drawn - len(points)}
+        return self.stats
+
+    @staticmethod
+    def _draw_points(sc, screen, colors):
+        """
+        Метод записывает слой точек в массив пикселей поверхности sc.
+        Координаты screen должны лежать в пределах поверхности.
+
+        return: количество закрашенных пикселей
+
+        """
+
+        height = sc.get_height()
+        pixel = np.floor(screen).astype(np.int64)
+        cells, inverse, counts = np.unique(pixel[:, 0] * height + pixel[:, 1], return_inverse=True,
+                                           return_counts=True)
+        # цвет пикселя - средний цвет объектов в нем, яркость растет с количеством объектов (до 4 объектов)
+        brightness = np.minimum(0.4 + 0.15 * counts, 1.0)
+        rgb = np.empty((len(cells), 3))
+        for c in range(3):
+            rgb[:, c] = np.bincount(inverse, weights=colors[:, c], minlength=len(cells)) / counts * brightness
+        array = pygame.surfarray.pixels3d(sc)
+        try:
+            array[cells // height, cells % height] = rgb.astype(np.uint8)
+        finally:
+            del array
+        return len(cells)
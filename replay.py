@@ -0,0 +1,102 @@
+"""
+Воспроизведение записанных расчетов (файлов recorder.Recorder).
+
+Player восстанавливает состояние объектов пространства Space на любой момент записи вместо пошагового
+расчета Space.gravity_interactions(): MainLoop отрисовывает это пространство как обычно.
+Поддерживаются переход к любому моменту (за постоянное время по индексу времени записи),
+скорость воспроизведения, обратное воспроизведение и интерполяция между записанными кадрами.
+
+"""
+
+
+from objects import SpaceObjects
+from recorder import Trajectory
+from space import Space
+
+
+class Player:
+    """
+    Класс воспроизведения записи траекторий.
+
+    trajectory - запись (recorder.Trajectory).
+    space - пространство, объекты которого расставляются по записи.
+    time - текущий момент воспроизведения.
+    start, stop - моменты первого и последнего кадров записи.
+    speed - скорость воспроизведения: множитель модельного времени одного кадра визуализации.
+    direction - направление воспроизведения: 1 - вперед, -1 - назад.
+
+    """
+
+    def __init__(self, path, space=None):
+        """
+        path: путь к файлу записи.
+        space: пространство с объектами записи (например, исходный сценарий - для цветов и радиусов),
+        None - объекты создаются по именам из записи.
+
+        """
+
+        self.trajectory = Trajectory(path)
+        if space is None:
+            space = Space(engine=True)
+            for name in self.trajectory.names:
+                o = SpaceObjects(name, 1.0, 0)
+                o.set_color((255, 255, 255, 255))
+                space.add_obj(o)
+        names = [o.Name for o in space.Objects]
+        assert names == self.trajectory.names, \
+            f"Объекты пространства {names} не совпадают с объектами записи {self.trajectory.names}."
+        space.use_engine()
+        self.space = space
+        self.start, self.stop = self.trajectory.span()
+        self.speed = 1.0
+        self.direction = 1
+        self.seek(self.start)
+
+    def seek(self, time):
+        """
+        Метод переходит к моменту time (в пределах записи).
+
+        """
+
+        self.time = min(max(time, self.start), self.stop)
+        pos, vel = self.trajectory.state(self.time)
+        engine = self.space.Engine
+        engine.pos[:engine.n] = pos
+        engine.vel[:engine.n] = vel
+        self.space.Time = self.time
+
+    def advance(self, t):
+        """
+        Метод продвигает воспроизведение на t модельных секунд (с учетом скорости и направления).
+        У границ записи воспроизведение останавливается.
+
+        return: True - воспроизведение может продолжаться, False - достигнута граница записи
+
+        """
+
+        self.seek(self.time + self.direction * self.speed * t)
+        return self.start < self.time < self.stop
+
+    def faster(self, k=2.0):
+        """
+        Метод увеличивает скорость воспроизведения в k раз.
+
+        """
+
+        self.speed *= k
+
+    def slower(self, k=2.0):
+        """
+        Метод уменьшает скорость воспроизведения в k раз.
+
+        """
+
+        self.speed /= k
+
+    def reverse(self):
+        """
+        Метод меняет направление воспроизведения.
+
+        """
+
+        self.direction = -self.direction
@@ -0,0 +1,68 @@
+"""
+Сценарии - начальные наборы космических объектов.
+
+Сценарий формируется без графических библиотек, поэтому его можно моделировать и без окна визуализации.
+Цвета задаются кортежами (R, G, B, A) - как их возвращает pygame.Color.
+
+"""
+
+
+import os
+from objects import SpaceObjects
+from space import Space
+from settings import Settings
+
+
+def sun_earth(space):
+    """
+    Сценарий по умолчанию: неподвижное Солнце и Земля на круговой орбите.
+
+    """
+
+    # Солнце
+    mass_of_sun = 1.9891 * 10**30
+    sun = SpaceObjects('Sun', mass_of_sun,  695990000)
+    sun.set_color((255, 215, 0, 255))  # pygame.Color('gold')
+    sun.set_coord(0, 0)
+    # Солнце стоит неподвижно и никуда в дальнейшем не сдвинется
+    sun.StaticCoord = True
+
+    # Земля
+    mass_of_earth = 5.9722 * 10 ** 24
+    earth = SpaceObjects('Earth', mass_of_earth, 6371302)
+    earth.set_color((0, 0, 255, 255))  # pygame.Color('blue')
+    earth.set_coord(149.6 * 10 ** 9, 0, 0, 29765)
+
+    # # Марс
+    # # mass_of_mars = ...
+    # mass_of_mars = 45000000
+    # mars = SpaceObjects('Mars', mass_of_mars, 25)
+    # mars.set_color(pygame.Color('red'))
+    # mars.set_coord(x0, y0 - 250, -0.35)
+
+    # добавляем объекты в математической пространство
+    space.add_obj(sun, earth)
+
+
+scenarios = {'sun-earth': sun_earth}
+
+
+def load_scenario(name='sun-earth', engine=Settings.engine):
+    """
+    Функция создает математическое пространство Space и заполняет его объектами сценария.
+
+    name: название встроенного сценария (см. scenarios) или путь к файлу сохранения Space.save()
+    (двоичный снимок или CSV-файл).
+    engine: включить векторизованный движок.
+
+    return: объект класса Space
+
+    """
+
+    space = Space(engine=engine)
+    if name in scenarios:
+        scenarios[name](space)
+    else:
+        assert os.path.isfile(name), f"Сценарий '{name}' не найден: доступны {list(scenarios)} или путь к файлу."
+        space.load(name)
+    return space
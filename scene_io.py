@@ -0,0 +1,126 @@
+"""
+Сохранение и загрузка пространства в фоне.
+
+Файловые операции выполняются в отдельном потоке (concurrent.futures), отрисовка и расчет не ждут их:
+* сохранение - состояние фиксируется на границе шага (Space.save_later(): копия столбцов и, если движок
+  отображает этот же файл, отвязка от него), файл записывается в фоне;
+* загрузка - файл читается в новое пространство в фоне, готовое состояние подставляется в рабочее
+  пространство на границе шага одной перестановкой ссылок (Space.swap_state()).
+
+Границу шага обеспечивает функция sync (например, PhysicsWorker.call): она выполняет действие в потоке
+расчета между шагами. Тогда и фиксация состояния при сохранении запрашивается из фонового потока - поток
+кадров не ждет копирования столбцов. Без sync расчет идет в потоке вызывающего, действия выполняются сразу,
+между кадрами.
+
+"""
+
+
+from concurrent.futures import ThreadPoolExecutor
+from space import Space
+
+
+class SceneIO:
+    """
+    Класс фоновых файловых операций пространства.
+
+    space - рабочее пространство.
+    sync - функция выполнения действия над пространством в потоке расчета между шагами: sync(func, *args);
+           None - расчет идет в потоке вызывающего.
+    status - сообщение о последней операции.
+
+    """
+
+    def __init__(self, space, sync=None):
+        self.space = space
+        # фиксация состояния при сохранении - из фонового потока, если расчет идет в отдельном потоке
+        self._deferred = sync is not None
+        self.sync = sync or (lambda func, *args: func(*args))
+        self.status = ''
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='scene-io')
+        # выполняемые операции: (вид операции, файл, Future)
+        self._tasks = []
+
+    @property
+    def busy(self):
+        return bool(self._tasks)
+
+    def save(self, file_name):
+        """
+        Метод сохраняет пространство в файл file_name: состояние фиксируется на ближайшей границе шага (без
+        sync - сразу), файл записывается в фоне.
+
+        return: Future операции
+
+        """
+
+        if self._deferred:
+            return self._submit('save', file_name, self._write, file_name)
+        write = self.space.save_later(file_name)
+        return self._submit('save', file_name, write)
+
+    def _write(self, file_name):
+        # копирование столбцов - в потоке расчета между шагами, запись файла - в этом потоке
+        write = self.sync(self.space.save_later, file_name)
+        return write()
+
+    def load(self, file_name):
+        """
+        Метод загружает файл file_name в фоне; состояние подставляется в пространство методом poll().
+
+        return: Future операции (результат - загруженное пространство)
+
+        """
+
+        return self._submit('load', file_name, self._read, file_name, self.space.Engine is not None,
+                            self.space.Time)
+
+    @staticmethod
+    def _read(file_name, engine, time):
+        staged = Space(engine=engine)
+        # CSV-файл не хранит модельное время - как и при обычной загрузке, оно остается прежним
+        staged.Time = time
+        staged.load(file_name)
+        return staged
+
+    def _submit(self, kind, file_name, func, *args):
+        future = self._executor.submit(func, *args)
+        self._tasks.append((kind, file_name, future))
+        self.status = ('Сохранение ' if kind == 'save' else 'Загрузка ') + f'{file_name}...'
+        return future
+
+    def poll(self):
+        """
+        Метод проверяет завершенные операции (вызывается раз в кадр): загруженное состояние подставляется
+        в пространство на границе шага.
+
+        return: True, если состояние пространства заменено
+
+        """
+
+        swapped = False
+        for task in [t for t in self._tasks if t[2].done()]:
+            self._tasks.remove(task)
+            kind, file_name, future = task
+            error = future.exception()
+            if error is not None:
+                self.status = f'Ошибка: {file_name}: {error}'
+            elif kind == 'load':
+                self.sync(self.space.swap_state, future.result())
+                swapped = True
+                self.status = f'Загружено: {file_name}'
+            else:
+                self.status = f'Сохранено: {file_name}'
+        return swapped
+
+    def wait(self):
+        """
+        Метод дожидается завершения всех операций и применяет их результаты.
+
+        """
+
+        for _, _, future in list(self._tasks):
+            future.exception()
+        return self.poll()
+
+    def close(self):
+        self._executor.shutdown(wait=True)
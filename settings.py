@@ -6,9 +6,15 @@
 
 class Settings:
 
-    # ускорение
+    # ускорение (модельных секунд за реальную секунду); длительность шага расчета - t / fps
     t = 3000
 
+    # наибольшее количество шагов расчета за кадр (если расчет не успевает за ускорением)
+    max_substeps = 100
+
+    # расчет в фоновом потоке: медленный расчет не задерживает отрисовку и обработку событий
+    worker = False
+
     # количество кадров в секунду
     fps = 30
 
@@ -21,5 +27,28 @@ class Settings:
     # минимальный радиус космических тел для отрисовки
     min_r = 10
 
+    # наибольшее количество видимых тел меньше пикселя, рисуемых окружностями радиуса min_r;
+    # при большем количестве они рисуются слоем точек
+    lod_circles = 500
+
+    # векторизованный движок гравитационного взаимодействия (массивы NumPy вместо попарного цикла)
+    engine = True
+
+    # решатель гравитации: 'direct' - точный попарный, 'barnes-hut' - по дереву квадрантов
+    solver = 'direct'
+
+    # численный метод интегрирования: 'euler', 'leapfrog', 'yoshida4', 'rk4'
+    integrator = 'leapfrog'
+
+    # угол раскрытия узлов дерева квадрантов для решателя 'barnes-hut'
+    theta = 0.5
+
+    # столкновения: объекты, сблизившиеся на сумму радиусов, сливаются с сохранением импульса
+    collisions = False
+
+    # замеры времени этапов кадра с запуска (включаются и клавишей F3); количество кадров для cProfile (F5)
+    profile = False
+    profile_frames = 300
+
     # путь для сохранения/загрузки данных
     path = "./date/"
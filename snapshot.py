@@ -0,0 +1,198 @@
+"""
+Двоичный формат снимков состояния математического пространства.
+
+Файл состоит из заголовка и столбцов - массивов NumPy, записанных подряд без преобразования в текст:
+
+* 8 байт - сигнатура b'SPSNAP' и версия формата (uint16, little-endian);
+* 8 байт - длина заголовка (uint64);
+* заголовок - JSON: version, n - количество объектов, time - модельное время Space.Time,
+  columns - словарь {имя столбца: [тип, форма, смещение в файле]}, orbits - элементы орбит объектов
+  на кеплеровых орбитах (см. Space.orbits(); в снимках прежних версий отсутствует);
+* столбцы, выровненные по границе ALIGN байт.
+
+Столбцы: mass, r, pos (n, 2), vel (n, 2), acc (n, 2), static, from_time - состояние объектов;
+source - объект притягивает (False - пробная частица, TestParticle); id - номера объектов SpaceObjects.Id;
+color (n, 4), has_color - цвета RGBA; name_bytes, name_offsets - имена в UTF-8 подряд и границы имен (n + 1).
+
+Столбцы читаются отображением файла в память (np.memmap): открытие снимка не зависит от числа объектов,
+данные подгружаются с диска по мере обращения к ним. Значения сохраняются побитово - без потери точности.
+
+"""
+
+
+import json
+import os
+import numpy as np
+
+
+MAGIC = b'SPSNAP'
+VERSION = 1
+ALIGN = 64
+COLUMNS = {'mass': ('<f8', ()), 'r': ('<f8', ()), 'pos': ('<f8', (2,)), 'vel': ('<f8', (2,)), 'acc': ('<f8', (2,)),
+           'static': ('|b1', ()), 'from_time': ('|b1', ()), 'color': ('|u1', (4,)), 'has_color': ('|b1', ()),
+           'source': ('|b1', ()), 'id': ('<i8', ())}
+# значения необязательных столбцов, если они не переданы при записи или отсутствуют в файле (снимки прежних версий);
+# номер -1 - объекту присваивается новый номер при загрузке
+DEFAULTS = {'source': True, 'id': -1}
+
+
+def is_snapshot(path):
+    """
+    Функция проверяет, является ли файл path снимком двоичного формата.
+
+    """
+
+    with open(path, 'rb') as file:
+        return file.read(len(MAGIC)) == MAGIC
+
+
+def layout(magic, meta, columns):
+    """
+    Функция формирует начало файла (сигнатура, версия, длина заголовка, заголовок) и размещение столбцов.
+
+    magic: сигнатура файла.
+    meta: словарь данных заголовка (дополняется версией и таблицей столбцов).
+    columns: словарь {имя столбца: (тип, форма)}.
+
+    return: байты начала файла, таблица {имя: [тип, форма, смещение]}, размер файла
+
+    """
+
+    def place(start):
+        table, offset = {}, start
+        for name, (dtype, shape) in columns.items():
+            offset = -(-offset // ALIGN) * ALIGN
+            dtype = np.dtype(dtype)
+            table[name] = [dtype.str, list(shape), offset]
+            offset += dtype.itemsize * int(np.prod(shape))
+        return table, offset
+
+    # смещения столбцов зависят от длины заголовка - уточняем, пока длина не перестанет меняться
+    header, size = b'', -1
+    while len(header) != size:
+        size = len(header)
+        table, end = place(16 + size)
+        header = json.dumps(dict(meta, version=VERSION, columns=table)).encode('utf-8')
+    prefix = magic + np.uint16(VERSION).astype('<u2').tobytes() + np.uint64(len(header)).astype('<u8').tobytes()
+    return prefix + header, table, end
+
+
+def read_header(file, magic):
+    """
+    Функция читает заголовок файла file (открытого в двоичном режиме) и проверяет его сигнатуру и версию.
+
+    return: словарь заголовка
+
+    """
+
+    start = file.read(8)
+    assert start[:len(magic)] == magic, f"Файл '{file.name}' имеет неверный формат."
+    version = int(np.frombuffer(start[len(magic):], dtype='<u2')[0])
+    assert version <= VERSION, f"Версия файла {version} новее поддерживаемой ({VERSION})."
+    size = int(np.frombuffer(file.read(8), dtype='<u8')[0])
+    return json.loads(file.read(size))
+
+
+def write(path, time, names, orbits=(), **columns):
+    """
+    Функция записывает снимок в файл path.
+
+    time: модельное время.
+    names: список имен объектов.
+    orbits: записи орбит объектов на кеплеровых орбитах (см. Space.orbits()) - сохраняются в заголовке.
+    columns: массивы состояния объектов (см. COLUMNS); необязательные столбцы (DEFAULTS) можно не передавать.
+
+    """
+
+    n = len(names)
+    encoded = [str(name).encode('utf-8') for name in names]
+    arrays = {name: np.ascontiguousarray(columns[name], dtype=dtype).reshape((n,) + shape) if name in columns
+              else np.full((n,) + shape, DEFAULTS[name], dtype=dtype)
+              for name, (dtype, shape) in COLUMNS.items()}
+    arrays['name_offsets'] = np.cumsum([0] + [len(b) for b in encoded], dtype='<i8')
+    arrays['name_bytes'] = np.frombuffer(b''.join(encoded), dtype='|u1')
+    prefix, table, _ = layout(MAGIC, {'n': n, 'time': time, 'orbits': list(orbits)},
+                              {name: (array.dtype, array.shape) for name, array in arrays.items()})
+
+    # запись во временный файл с последующей заменой: прежний файл может быть отображен в память
+    # (например, загруженным из него движком) - усекать его на месте нельзя. В Windows отображенный в память файл
+    # нельзя и заменить (PermissionError) - перед записью отображение нужно закрыть (см. ArrayEngine.release())
+    temp = path + '.tmp'
+    with open(temp, 'wb') as file:
+        file.write(prefix)
+        for name, array in arrays.items():
+            file.write(b'\0' * (table[name][2] - file.tell()))
+            file.write(array.tobytes())
+    os.replace(temp, path)
+    return True
+
+
+class Snapshot:
+    """
+    Снимок состояния, прочитанный из файла.
+
+    n - количество объектов.
+    time - модельное время снимка.
+    version - версия формата файла.
+    orbits - записи орбит объектов на кеплеровых орбитах (см. Space.orbits()).
+    mass, r, pos, vel, acc, static, from_time, color, has_color, source, id, name_bytes, name_offsets - столбцы
+    (np.memmap или np.ndarray); отсутствующие в файле необязательные столбцы заполняются значениями DEFAULTS.
+
+    """
+
+    def __init__(self, path, mmap='r'):
+        """
+        path: путь к файлу снимка.
+        mmap: режим отображения файла в память ('r' - только чтение, 'c' - копирование при записи:
+        изменения массивов не попадают в файл), None - столбцы читаются в память целиком.
+
+        """
+
+        with open(path, 'rb') as file:
+            header = read_header(file, MAGIC)
+            self.version = header['version']
+            self.n = header['n']
+            self.time = header['time']
+            self.orbits = header.get('orbits', [])
+            for name, (dtype, shape, offset) in header['columns'].items():
+                if mmap and np.prod(shape):
+                    array = np.memmap(path, dtype=dtype, mode=mmap, offset=offset, shape=tuple(shape))
+                else:
+                    file.seek(offset)
+                    count = int(np.prod(shape))
+                    array = np.fromfile(file, dtype=dtype, count=count).reshape(shape)
+                setattr(self, name, array)
+        for name, value in DEFAULTS.items():
+            if name not in header['columns']:
+                dtype, shape = COLUMNS[name]
+                setattr(self, name, np.full((self.n,) + shape, value, dtype=dtype))
+
+    def names(self):
+        """
+        Метод возвращает список имен объектов.
+
+        """
+
+        blob = self.name_bytes.tobytes()
+        bounds = self.name_offsets.tolist()
+        return [blob[a:b].decode('utf-8') for a, b in zip(bounds[:-1], bounds[1:])]
+
+    def colors(self):
+        """
+        Метод возвращает список цветов объектов - списков [R, G, B, A] (как в SpaceObjects.set_color()) или None.
+
+        """
+
+        colors = [None] * self.n
+        for i in np.flatnonzero(self.has_color).tolist():
+            colors[i] = self.color[i].tolist()
+        return colors
+
+
+def read(path, mmap='r'):
+    """
+    Функция открывает снимок path (см. Snapshot).
+
+    """
+
+    return Snapshot(path, mmap)
@@ -1,22 +1,156 @@
 import datetime
 import csv
-from objects import SpaceObjects
+import gc
+import re
+from objects import SpaceObjects, TestParticle
 from settings import Settings
+from engine import ArrayEngine, DirectSum
+from barnes_hut import BarnesHut
+from integrators import integrators
+from kepler import KeplerOrbit, KeplerPropagator, order_rails
+import snapshot
+from recorder import Recorder
+from collisions import Collisions
+from registry import Registry
+import numpy as np
 
 
 class Space:
     """
     Класс, описывающий математику взаимодействий обектов.
 
-    Objects - список объектов для обработки в математическом пространстве данного класса
+    Objects - список объектов для обработки в математическом пространстве данного класса (registry.Registry):
+    объекты с постоянными номерами SpaceObjects.Id, поиск по номеру и имени (get_obj(), find_obj()),
+    удаление переносом последних объектов на место удаленных (порядок объектов при удалении меняется)
     Time - время
+    Engine - векторизованный движок (engine.ArrayEngine), хранящий состояние объектов в массивах NumPy.
+    None - взаимодействия рассчитываются попарным циклом по объектам.
+    Energy - полная энергия системы после последнего шага (при включенном контроле энергии).
+    EnergyError - относительное изменение полной энергии за последний шаг (при включенном контроле энергии).
+    EnergyDrift - относительное изменение полной энергии с момента включения контроля.
+    Recorder - запись траекторий (recorder.Recorder), None - запись не ведется.
+    Collisions - обработка столкновений (collisions.Collisions): столкнувшиеся объекты сливаются в один.
+    None - объекты пролетают друг сквозь друга.
+    Checkpoints - автоматические контрольные точки (checkpoint.Checkpointer), None - не записываются.
 
     """
 
-    def __init__(self):
-        self.Objects = []
+    def __init__(self, engine=False):
+        self.Objects = Registry()
         self.StartTime = datetime.datetime(2000, 1, 1)
         self.Time = 0
+        self.Engine = None
+        self.use_engine(engine)
+        self.TrackEnergy = False
+        # кэш векторизованного расчета кеплеровых орбит (см. self._place_rails())
+        self._propagator = None
+        self.Energy = None
+        self.Energy0 = None
+        self.EnergyError = 0.0
+        self.EnergyDrift = 0.0
+        self.Recorder = None
+        self.Collisions = None
+        self.Checkpoints = None
+
+    def use_engine(self, on=True):
+        """
+        Метод включает или отключает векторизованный движок.
+
+        on: True - состояние объектов переносится в массивы движка, объекты становятся их "окнами";
+        False - объекты отвязываются от движка и снова хранят состояние сами.
+
+        """
+
+        if on and self.Engine is None:
+            self.Engine = ArrayEngine()
+            for o in self.Objects:
+                self.Engine.add(o)
+        elif not on and self.Engine is not None:
+            self.Engine.clear()
+            self.Engine = None
+
+    def use_collisions(self, on=True):
+        """
+        Метод включает или отключает обработку столкновений (см. collisions): перед каждым шагом объекты,
+        которые за шаг сблизятся на сумму радиусов SpaceObjects.R, сливаются с сохранением импульса.
+
+        """
+
+        if on and self.Collisions is None:
+            self.Collisions = Collisions()
+        elif not on:
+            self.Collisions = None
+
+    def set_solver(self, name='direct', **params):
+        """
+        Метод выбирает решатель, вычисляющий гравитационные ускорения (включает векторизованный движок).
+
+        name: 'direct' - точный попарный расчет O(N**2);
+              'barnes-hut' - приближенный расчет по дереву квадрантов O(N log N).
+        params: параметры решателя (например, theta - угол раскрытия узлов дерева).
+
+        """
+
+        solvers = {'direct': DirectSum, 'barnes-hut': BarnesHut}
+        assert name in solvers, f"Неизвестный решатель: '{name}', доступны: {list(solvers)}."
+        self.use_engine()
+        self.Engine.solver = solvers[name](**params)
+
+    def set_integrator(self, name='leapfrog', track_energy=False, **params):
+        """
+        Метод выбирает численный метод интегрирования движения (включает векторизованный движок).
+
+        name: 'euler' - закон SpaceObjects.set_coord() (прежнее поведение);
+              'leapfrog' - скоростной Верле, 2-й порядок, симплектический;
+              'yoshida4' - метод Иошиды, 4-й порядок, симплектический;
+              'rk4' - метод Рунге-Кутты 4-го порядка;
+              'adaptive' - leapfrog с переменным общим шагом по критерию ускорения или рывка;
+              'block' - leapfrog с индивидуальными блочными шагами объектов t / 2**k:
+              ускорения пересчитываются только для объектов, чей шаг закончился.
+        track_energy: True - после каждого шага вычислять полную энергию системы и ее ошибку за шаг
+        (self.EnergyError) - позволяет подобрать наибольший устойчивый шаг для сценария.
+        Расчет энергии стоит O(N**2) операций.
+        params: параметры численного метода (например, eta и criterion для 'adaptive' и 'block').
+
+        """
+
+        assert name in integrators, f"Неизвестный численный метод: '{name}', доступны: {list(integrators)}."
+        self.use_engine()
+        self.Engine.integrator = integrators[name](**params)
+        self.TrackEnergy = track_energy
+        self.Energy = self.Energy0 = None
+        self.EnergyError = self.EnergyDrift = 0.0
+
+    def energy(self):
+        """
+        Метод возвращает полную механическую энергию системы (кинетическая + потенциальная энергия притяжения).
+
+        """
+
+        if self.Engine is not None:
+            return self.Engine.energy()
+        # пробные частицы не учитываются (см. ArrayEngine.energy())
+        sources = [o for o in self.Objects if o.GravitySource]
+        kinetic = sum(o.Mass * (o.Vx**2 + o.Vy**2) / 2 for o in sources)
+        potential = sum(-o1.gravity_force(o2) * o1.distance_to(o2)
+                        for n, o1 in enumerate(sources) for o2 in sources[n + 1:])
+        return kinetic + potential
+
+    def force_error(self, sample=1000):
+        """
+        Метод оценивает относительную ошибку ускорений текущего решателя относительно точного попарного расчета.
+
+        sample: количество случайных объектов, по которым оценивается ошибка.
+
+        return: словарь ошибок 'rms', 'median', 'p99', 'max' (нули для точного решателя)
+
+        """
+
+        solver = self.Engine.solver if self.Engine is not None else None
+        if not isinstance(solver, BarnesHut):
+            return {'rms': 0.0, 'median': 0.0, 'p99': 0.0, 'max': 0.0}
+        n = self.Engine.n
+        return solver.force_error(self.Engine.pos[:n], self.Engine.mass[:n], sample, sources=self.Engine.sources())
 
     def add_obj(self, *args):
         """
@@ -29,17 +163,172 @@ class Space:
         -------
         Все объекты из списка args добавлены в среду self.Objects для вычисления их взаимодействий.
         Если хотя бы один из объектов не содержит параметра self.Mass возвращае исключение.
+        Масса пробной частицы (TestParticle) может быть нулевой.
 
         """
 
         # сначала проверим объекты
         for i in args:
-            assert type(i) is SpaceObjects, f"Передаваемый объект: '{i}' является объектом {type(i)}, " \
-                                            f"а должент быть объектом <class 'SpaceObjects'>."
-            assert i.Mass > 0, f"Объект {i} обладает некорректной массой: {i.Mass}."
+            assert isinstance(i, SpaceObjects), f"Передаваемый объект: '{i}' является объектом {type(i)}, " \
+                                                f"а должент быть объектом <class 'SpaceObjects'>."
+            assert i.Mass > 0 or not i.GravitySource and i.Mass == 0, \
+                f"Объект {i} обладает некорректной массой: {i.Mass}."
 
         # добавить объекты в общий список объектов взаимодействий
-        self.Objects += args
+        self.Objects.add(args)
+        if self.Engine is not None:
+            for i in args:
+                self.Engine.add(i)
+        # состав системы изменился - контроль энергии начинается заново
+        self.Energy = self.Energy0 = None
+
+    def add_arrays(self, mass, r, pos, vel=None, acc=None, static=None, from_time=None, source=None, names=None,
+                   colors=None):
+        """
+        Метод добавляет объекты пакетом из массивов состояния (например, миллион частиц генератора).
+        При включенном движке значения копируются в его массивы одной операцией на столбец, а объекты
+        создаются только как "окна" в них (SpaceObjects._view()) - без заполнения атрибутов по одному.
+
+        mass, r: массы и радиусы, массивы (n,).
+        pos, vel, acc: координаты, скорости, ускорения, массивы (n, 2) (по умолчанию скорости и ускорения нулевые).
+        static, from_time: флаги StaticCoord и CoordFromTime (по умолчанию False).
+        source: флаги GravitySource (по умолчанию True; False - пробная частица TestParticle).
+        names: имена объектов (по умолчанию 'Body <номер>'); colors: цвета [R, G, B(, A)] или None.
+
+        return: массив номеров добавленных объектов SpaceObjects.Id
+
+        """
+
+        n = len(mass)
+        columns = {'mass': np.asarray(mass, dtype=float), 'r': np.asarray(r, dtype=float),
+                   'pos': np.asarray(pos, dtype=float).reshape(n, 2)}
+        for name, value, shape, kind in (('vel', vel, (n, 2), float), ('acc', acc, (n, 2), float),
+                                         ('static', static, (n,), bool), ('from_time', from_time, (n,), bool),
+                                         ('source', source, (n,), bool)):
+            default = name == 'source'
+            columns[name] = np.full(shape, default, dtype=kind) if value is None else \
+                np.asarray(value, dtype=kind).reshape(shape)
+        assert np.all((columns['mass'] > 0) | ~columns['source'] & (columns['mass'] == 0)), \
+            "Объекты обладают некорректной массой."
+        if names is None:
+            first = self.Objects.next_id
+            names = [f'Body {i}' for i in range(first, first + n)]
+        assert len(names) == n, f"Количество имен {len(names)} не совпадает с количеством объектов {n}."
+        colors = [None] * n if colors is None else colors
+        if self.Engine is not None:
+            objects = self._views(names, colors, columns['source'])
+            self.Engine.extend(objects, **columns)
+        else:
+            objects = self._objects(names, colors, columns)
+        ids = self.Objects.add(objects)
+        self.Energy = self.Energy0 = None
+        return ids
+
+    @staticmethod
+    def _views(names, colors, source):
+        """
+        Метод создает объекты - "окна" в массивы движка (SpaceObjects._view()) для немедленной привязки.
+
+        """
+
+        # массовое создание объектов: сборщик мусора на это время отключается (объекты не образуют циклов)
+        collect = gc.isenabled()
+        gc.disable()
+        try:
+            kinds = (TestParticle, SpaceObjects)
+            return [kinds[s]._view(name, color) for name, color, s in zip(names, colors, source.tolist())]
+        finally:
+            if collect:
+                gc.enable()
+
+    @staticmethod
+    def _objects(names, colors, columns):
+        """
+        Метод создает объекты с собственным состоянием (без движка) по массивам состояния columns.
+
+        """
+
+        objects = []
+        rows = zip(names, colors, *(np.asarray(columns[name]).tolist() for name in
+                                    ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source')))
+        for name, color, mass, r, (x, y), (vx, vy), (ax, ay), static, from_time, source in rows:
+            so = (SpaceObjects if source else TestParticle)(name, mass, r)
+            so.set_coord(x, y, vx, vy, ax, ay, t=0)
+            so.StaticCoord = static
+            so.CoordFromTime = from_time
+            so.Color = color
+            objects.append(so)
+        return objects
+
+    def remove_obj(self, *args):
+        """
+        Метод удаляет объекты args из пространства одним пакетом: на места удаленных объектов переносятся
+        последние объекты (см. registry) - затраты пропорциональны количеству удаленных объектов.
+        Объекты, не принадлежащие пространству, пропускаются.
+
+        """
+
+        positions = [self.Objects.position(o) for o in args if o in self.Objects]
+        # индексы объектов реестра - это строки массивов движка: перестановки одинаковые
+        self.Objects.swap_remove(positions)
+        if self.Engine is not None:
+            self.Engine.remove(positions)
+        self.Energy = self.Energy0 = None
+
+    def get_obj(self, id):
+        """
+        Метод возвращает объект с номером id (SpaceObjects.Id), None - такого объекта нет.
+
+        """
+
+        return self.Objects.get(id)
+
+    def find_obj(self, name):
+        """
+        Метод возвращает объект с именем name, None - такого объекта нет.
+
+        """
+
+        return self.Objects.find(name)
+
+    def _collide(self, t):
+        """
+        Метод сливает объекты, которые столкнутся за шаг длительностью t (см. collisions).
+
+        return: количество поглощенных объектов
+
+        """
+
+        engine = self.Engine
+        if engine is not None:
+            n = engine.n
+            mass, radius = engine.mass[:n], engine.r[:n]
+            pos, vel, acc = engine.pos[:n], engine.vel[:n], engine.acc[:n]
+            movable = engine.movable()
+            source = engine.source[:n]
+        else:
+            objects = self.Objects
+            mass = np.array([o.Mass for o in objects], dtype=float)
+            radius = np.array([o.R for o in objects], dtype=float)
+            pos = np.array([[o.X or 0.0, o.Y or 0.0] for o in objects], dtype=float).reshape(-1, 2)
+            vel = np.array([[o.Vx or 0.0, o.Vy or 0.0] for o in objects], dtype=float).reshape(-1, 2)
+            acc = np.array([[o.Ax or 0.0, o.Ay or 0.0] for o in objects], dtype=float).reshape(-1, 2)
+            movable = np.array([not (o.StaticCoord or o.CoordFromTime) for o in objects], dtype=bool)
+            source = np.array([o.GravitySource for o in objects], dtype=bool)
+        i, j = self.Collisions.detect(pos, vel, acc, radius, movable, t, source)
+        if len(i) == 0:
+            return 0
+        keep, new_mass, new_r, new_pos, new_vel, gone = self.Collisions.merge(mass, radius, pos, vel, ~movable, i, j,
+                                                                                 source)
+        # индексы массивов - это индексы объектов движка (или списка объектов без движка)
+        objects = engine.objects if engine is not None else self.Objects
+        for k, idx in enumerate(keep.tolist()):
+            o = objects[idx]
+            o.Mass, o.R = float(new_mass[k]), float(new_r[k])
+            o.X, o.Y = float(new_pos[k, 0]), float(new_pos[k, 1])
+            o.Vx, o.Vy = float(new_vel[k, 0]), float(new_vel[k, 1])
+        self.remove_obj(*[objects[idx] for idx in gone.tolist()])
+        return len(gone)
 
     def gravity_interactions(self, t):
         """
@@ -47,12 +336,102 @@ class Space:
         Результатом работы метода является изменение состаяний всех объектов в self.Objects
         по результатам их совместных взаимотействий.
 
+        При включенном движке ускорения всех объектов вычисляются одним пакетным проходом,
+        после чего состояния всех объектов обновляются одновременно.
+
+        """
+
+        # столкновения за шаг: столкнувшиеся объекты сливаются до расчета притяжения
+        if self.Collisions is not None:
+            self._collide(t)
+
+        # объекты на орбитах (CoordFromTime) на время шага ставятся в положение середины шага
+        rails = self._rails()
+        if rails:
+            self._place_rails(rails, self.Time + t / 2)
+
+        if self.Engine is not None:
+            if self.TrackEnergy and self.Energy is None:
+                self.Energy = self.Energy0 = self.Engine.energy()
+            self.Engine.step(t)
+            if self.TrackEnergy:
+                energy = self.Engine.energy()
+                self.EnergyError = abs(energy - self.Energy) / abs(self.Energy or 1.0)
+                self.EnergyDrift = abs(energy - self.Energy0) / abs(self.Energy0 or 1.0)
+                self.Energy = energy
+        else:
+            self._pair_loop(t)
+
+        self.Time += t
+        if rails:
+            self._place_rails(rails, self.Time)
+        if self.Recorder is not None:
+            self.Recorder.record(self)
+        if self.Checkpoints is not None:
+            self.Checkpoints.step(self)
+
+    def attach_recorder(self, file_name, capacity=10000, every=1):
         """
+        Метод подключает запись траекторий: каждые every шагов состояние всех объектов дописывается
+        в кольцевой буфер из capacity кадров в файле file_name (см. recorder). Первый кадр - текущее состояние.
+        Записанное читается классом recorder.Trajectory.
+
+        return: объект класса recorder.Recorder
+
+        """
+
+        self.detach_recorder()
+        self.Recorder = Recorder(file_name, [o.Name for o in self.Objects], capacity, every)
+        self.Recorder.write(self)
+        return self.Recorder
+
+    def detach_recorder(self):
+        """
+        Метод завершает запись траекторий.
+
+        """
+
+        if self.Recorder is not None:
+            self.Recorder.close()
+            self.Recorder = None
+
+    def attach_checkpoints(self, folder, every=None, wall=None, keyframe_every=10, keep=3):
+        """
+        Метод подключает автоматические контрольные точки (см. checkpoint): каждые every модельных секунд и/или
+        каждые wall секунд реального времени состояние записывается в папку folder в фоне. Первая контрольная
+        точка - текущее состояние. Расчет восстанавливается функцией checkpoint.resume().
+
+        return: объект класса checkpoint.Checkpointer
 
+        """
+
+        from checkpoint import Checkpointer
+        self.detach_checkpoints()
+        self.Checkpoints = Checkpointer(folder, every, wall, keyframe_every, keep)
+        self.Checkpoints.save(self)
+        return self.Checkpoints
+
+    def detach_checkpoints(self):
+        """
+        Метод отключает контрольные точки, дождавшись записи начатых.
+
+        """
+
+        if self.Checkpoints is not None:
+            self.Checkpoints.close()
+            self.Checkpoints = None
+
+    def _pair_loop(self, t):
+        """
+        Метод попарного расчета взаимодействий (без векторизованного движка).
+
+        """
+
+        sources = [o for o in self.Objects if o.GravitySource]
         # Сравниваем каждый объект с каждым (только один раз)
-        for n, obj1 in enumerate(self.Objects):
-            for j in range(n+1, len(self.Objects)):
-                obj2 = self.Objects[j]
+        for n, obj1 in enumerate(sources):
+            for j in range(n+1, len(sources)):
+                obj2 = sources[j]
                 # вычисляем силу взаимодействия между двумя объектами
                 force = obj1.gravity_force(obj2)
                 # выисляем ускорение для каждого из двух объектов
@@ -63,40 +442,142 @@ class Space:
                 # умножаем модуль ускорения на направление и обновляем состояния каждого из двух объектов
                 obj1.change_coord(t, ax=a1 * ort_vector[0], ay=a1 * ort_vector[1])
                 obj2.change_coord(t, ax=a2 * ort_vector[0], ay=a2 * ort_vector[1])
+        # пробные частицы только притягиваются к массивным объектам: O(N * M) вместо O((N + M)**2)
+        for particle in self.Objects:
+            if particle.GravitySource:
+                continue
+            for obj in sources:
+                a = particle.gravity_acceleration(obj)
+                ort_vector = particle.orientation_to_obj(obj)
+                particle.change_coord(t, ax=a * ort_vector[0], ay=a * ort_vector[1])
+
+    def set_time(self, time):
+        """
+        Метод переводит пространство к моменту времени time без пошагового расчета:
+        объекты на кеплеровых орбитах (CoordFromTime, SpaceObjects.set_orbit()) ставятся в свои положения,
+        остальные объекты не изменяются.
+
+        """
+
+        self.Time = time
+        rails = self._rails()
+        if rails:
+            self._place_rails(rails, time)
+
+    def _rails(self):
+        """
+        Метод возвращает объекты на кеплеровых орбитах, упорядоченные так,
+        что центральное тело всегда идет раньше своих спутников.
+
+        """
+
+        if self.Engine is not None:
+            engine = self.Engine
+            candidates = [engine.objects[i] for i in np.flatnonzero(engine.from_time[:engine.n])]
+        else:
+            candidates = [o for o in self.Objects if o.CoordFromTime]
+        return order_rails(candidates)
+
+    def _place_rails(self, rails, time):
+        """
+        Метод ставит объекты rails в положения на их кеплеровых орбитах в момент time.
+        Уравнение Кеплера решается сразу для всех объектов (kepler.KeplerPropagator),
+        при включенном движке результат записывается в его массивы без перебора объектов.
+
+        """
+
+        # кэш сравнивается с самими орбитами, а не с их id: id удаленной орбиты может достаться новой
+        orbits = [o.Orbit for o in rails]
+        cached = self._propagator
+        if cached is None or len(cached.orbits) != len(orbits) or \
+                any(a is not b for a, b in zip(cached.orbits, orbits)):
+            self._propagator = KeplerPropagator(orbits)
+        pos, vel = self._propagator.state(time)
+        centrals = [o.Orbit.central for o in rails]
+        engine = self.Engine
+        if engine is not None and all(c._store is engine for c in centrals):
+            idx = np.array([o._idx for o in rails])
+            cidx = np.array([c._idx for c in centrals])
+            # спутник тела на орбите ставится после своего центрального тела
+            rest = np.ones(len(rails), dtype=bool)
+            while rest.any():
+                ready = rest & ~np.isin(cidx, idx[rest])
+                engine.pos[idx[ready]] = engine.pos[cidx[ready]] + pos[ready]
+                engine.vel[idx[ready]] = engine.vel[cidx[ready]] + vel[ready]
+                rest &= ~ready
+            return
+        for i, (o, c) in enumerate(zip(rails, centrals)):
+            o.X, o.Y = c.X + pos[i, 0], c.Y + pos[i, 1]
+            o.Vx, o.Vy = c.Vx + vel[i, 0], c.Vy + vel[i, 1]
 
     def save_obj(self, file_name="save1.csv"):
         """
-        Метод сохранения объектов и их состояния.
+        Метод сохранения объектов и их состояния в CSV-файл (экспорт в текстовом виде).
+        Основной формат сохранения - двоичный снимок (см. self.save_snapshot()).
 
         """
 
-        with open(file_name, mode="w") as file:
-            names = ["Название", "Масса", "Радиус", "X", "Y", "Vx", "Vy", "Ax", "Ay",
-                     "Статические координаты", "Зависит от времени", "Цвет"]
-            file_writer = csv.writer(file,
-                                     delimiter=";",
-                                     lineterminator="\r")
-            file_writer.writerow(names)
-            for o in self.Objects:
+        return self._csv_writer(file_name)()
+
+    def _csv_writer(self, file_name):
+        """
+        Метод фиксирует строки CSV-файла и возвращает функцию их записи в файл file_name.
 
-                file_writer.writerow(list(map(str, [o.Name,
-                                                    o.Mass,
-                                                    o.R,
-                                                    o.X,
-                                                    o.Y,
-                                                    o.Vx,
-                                                    o.Vy,
-                                                    o.Ax,
-                                                    o.Ay,
-                                                    o.StaticCoord,
-                                                    o.CoordFromTime,
-                                                    o.Color])))
+        """
 
-        return True
+        rows = [list(map(str, [o.Name,
+                               o.Mass,
+                               o.R,
+                               o.X,
+                               o.Y,
+                               o.Vx,
+                               o.Vy,
+                               o.Ax,
+                               o.Ay,
+                               o.StaticCoord,
+                               o.CoordFromTime,
+                               o.Color,
+                               o.GravitySource])) for o in self.Objects]
+
+        def write():
+            with open(file_name, mode="w") as file:
+                names = ["Название", "Масса", "Радиус", "X", "Y", "Vx", "Vy", "Ax", "Ay",
+                         "Статические координаты", "Зависит от времени", "Цвет", "Источник притяжения"]
+                file_writer = csv.writer(file,
+                                         delimiter=";",
+                                         lineterminator="\r")
+                file_writer.writerow(names)
+                file_writer.writerows(rows)
+            return True
+
+        return write
+
+    @staticmethod
+    def _csv_value(text, kind):
+        """
+        Метод разбирает значение поля CSV-файла без выполнения кода (вместо eval()).
+
+        kind: float - число или None; bool - True или False; list - цвет [R, G, B[, A]] или None.
+
+        """
+
+        text = text.strip()
+        if kind is bool:
+            assert text in ("True", "False"), f"Некорректное логическое значение: '{text}'."
+            return text == "True"
+        if text == "None":
+            return None
+        if kind is list:
+            color = [int(c) for c in re.findall(r"\d+", text)]
+            assert len(color) in (3, 4), f"Некорректный цвет: '{text}'."
+            return color
+        return float(text)
 
     def load_obj(self, file_name):
         """
-        Метод загрузки объектов.
+        Метод загрузки объектов из CSV-файла (импорт).
+        Значения разбираются по типам полей - содержимое файла не выполняется как код.
+        Файлы без поля "Источник притяжения" (прежних версий) загружаются как массивные объекты.
 
         """
 
@@ -104,21 +585,198 @@ class Space:
             # Создаем объект reader, указываем символ-разделитель ";"
             file_reader = csv.DictReader(r_file, delimiter=";")
             # Считывание данных из CSV файла
-            self.Objects = []  # очистили список объектов для последующей замены
+            objects = []  # новый список объектов для последующей замены
+            value = self._csv_value
             for o in file_reader:
-                so = SpaceObjects(o["Название"], eval(o["Масса"]), eval(o["Радиус"]))
-                so.X = eval(o["X"])
-                so.Y = eval(o["Y"])
-                so.Vx = eval(o["Vx"])
-                so.Vy = eval(o["Vy"])
-                so.Ax = eval(o["Ax"])
-                so.Ay = eval(o["Ay"])
-                so.StaticCoord = eval(o["Статические координаты"])
-                so.CoordFromTime = eval(o["Зависит от времени"])
-                so.Color = eval(o["Цвет"])
-                self.Objects += [so]
+                cls = SpaceObjects if value(o.get("Источник притяжения") or "True", bool) else TestParticle
+                so = cls(o["Название"], value(o["Масса"], float), value(o["Радиус"], float))
+                so.X = value(o["X"], float)
+                so.Y = value(o["Y"], float)
+                so.Vx = value(o["Vx"], float)
+                so.Vy = value(o["Vy"], float)
+                so.Ax = value(o["Ax"], float)
+                so.Ay = value(o["Ay"], float)
+                so.StaticCoord = value(o["Статические координаты"], bool)
+                so.CoordFromTime = value(o["Зависит от времени"], bool)
+                so.Color = value(o["Цвет"], list)
+                objects.append(so)
+            self.Objects = Registry(objects)
+
+            if self.Engine is not None:
+                self.Engine.clear()
+                for so in self.Objects:
+                    self.Engine.add(so)
+            self.Energy = self.Energy0 = None
 
             return True
 
+    def save_snapshot(self, file_name="save1.snap"):
+        """
+        Метод сохраняет состояние всех объектов и модельное время в двоичный снимок (см. snapshot).
+        При включенном движке массивы состояния записываются целиком, без перебора объектов.
+        Неустановленные координаты, скорости и ускорения (None) сохраняются нулями.
+
+        """
+
+        return self._snapshot_writer(file_name)()
+
+    def _snapshot_writer(self, file_name):
+        """
+        Метод фиксирует копию состояния объектов и возвращает функцию записи снимка в файл file_name.
+
+        """
+
+        if self.Engine is not None:
+            # файл может быть отображен в массивы движка (load_snapshot()) - в Windows его нельзя заменить
+            self.Engine.release(file_name)
+        colors = np.zeros((len(self.Objects), 4), dtype=np.uint8)
+        has_color = np.zeros(len(self.Objects), dtype=bool)
+        for i, o in enumerate(self.Objects):
+            if o.Color is not None:
+                color = list(o.Color)
+                colors[i] = color + [255] * (4 - len(color))
+                has_color[i] = True
+        if self.Engine is not None:
+            e, n = self.Engine, self.Engine.n
+            # копии: расчет может продолжаться, пока снимок записывается
+            columns = {name: getattr(e, name)[:n].copy()
+                       for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source')}
+        else:
+            def pairs(a, b):
+                return [(getattr(o, a) or 0.0, getattr(o, b) or 0.0) for o in self.Objects]
+
+            columns = {'mass': [o.Mass for o in self.Objects], 'r': [o.R for o in self.Objects],
+                       'pos': pairs('X', 'Y'), 'vel': pairs('Vx', 'Vy'), 'acc': pairs('Ax', 'Ay'),
+                       'static': [o.StaticCoord for o in self.Objects],
+                       'from_time': [o.CoordFromTime for o in self.Objects],
+                       'source': [o.GravitySource for o in self.Objects]}
+        time, names, orbits = self.Time, [o.Name for o in self.Objects], self.orbits()
+        columns['id'] = [o.Id for o in self.Objects]
+        return lambda: snapshot.write(file_name, time, names, orbits, color=colors, has_color=has_color, **columns)
+
+    def orbits(self):
+        """
+        Метод возвращает записи орбит объектов на кеплеровых орбитах (для заголовка снимка, см. snapshot):
+        row - индекс объекта, central - индекс центрального тела, элементы орбиты (kepler.KeplerOrbit.elements()).
+        Если центрального тела нет в пространстве (central = None), его имя, масса, координаты и скорость
+        записываются в central_body.
+
+        """
+
+        records = []
+        for o in self._rails():
+            central = o.Orbit.central
+            record = {'row': self.Objects.position(o), 'central': None}
+            if central in self.Objects:
+                record['central'] = self.Objects.position(central)
+            else:
+                record['central_body'] = [central.Name, float(central.Mass), float(central.X or 0.0),
+                                          float(central.Y or 0.0), float(central.Vx or 0.0), float(central.Vy or 0.0)]
+            record.update(o.Orbit.elements())
+            records.append(record)
+        return records
+
+    def _restore_orbits(self, records):
+        """
+        Метод восстанавливает орбиты объектов по записям records (см. self.orbits()).
+
+        """
+
+        for record in records:
+            record = dict(record)
+            obj = self.Objects[record.pop('row')]
+            central = record.pop('central')
+            body = record.pop('central_body', None)
+            if central is None:
+                name, mass, x, y, vx, vy = body
+                central = SpaceObjects(name, mass)
+                central.set_coord(x, y, vx, vy, t=0)
+            else:
+                central = self.Objects[central]
+            obj.Orbit = KeplerOrbit(central, **record)
+
+    def load_snapshot(self, file_name, mmap=True):
+        """
+        Метод загружает объекты и модельное время из двоичного снимка (см. snapshot).
+
+        mmap: True - файл отображается в память, при включенном движке его столбцы становятся
+        массивами движка без копирования (изменения в файл не записываются);
+        False - снимок читается в память целиком.
+
+        """
+
+        snap = snapshot.read(file_name, 'c' if mmap else None)
+        names, colors = snap.names(), snap.colors()
+        if self.Engine is not None:
+            self.Objects = Registry(self._views(names, colors, snap.source), snap.id)
+            self.Engine.adopt(self.Objects, mass=snap.mass, r=snap.r, pos=snap.pos, vel=snap.vel, acc=snap.acc,
+                              static=snap.static, from_time=snap.from_time, source=snap.source)
+        else:
+            columns = {name: getattr(snap, name) for name in
+                       ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time', 'source')}
+            self.Objects = Registry(self._objects(names, colors, columns), snap.id)
+        self._restore_orbits(snap.orbits)
+        self._propagator = None
+        self.Time = snap.time
+        self.Energy = self.Energy0 = None
+
+        return True
+
+    def save(self, file_name="save1.snap"):
+        """
+        Метод сохраняет объекты: в CSV-файл, если имя файла оканчивается на .csv, иначе - в двоичный снимок.
+
+        """
+
+        return self.save_later(file_name)()
+
+    def save_later(self, file_name="save1.snap"):
+        """
+        Метод фиксирует текущее состояние объектов для сохранения (как self.save()) и возвращает функцию
+        записи файла без аргументов. Запись можно выполнить в другом потоке, пока расчет продолжается:
+        состояние скопировано в момент вызова метода.
+
+        """
+
+        if file_name.lower().endswith(".csv"):
+            return self._csv_writer(file_name)
+        return self._snapshot_writer(file_name)
+
+    def load(self, file_name):
+        """
+        Метод загружает объекты из двоичного снимка или CSV-файла (формат определяется по содержимому файла).
+
+        """
+
+        if snapshot.is_snapshot(file_name):
+            return self.load_snapshot(file_name)
+        return self.load_obj(file_name)
+
+    def swap_state(self, other):
+        """
+        Метод заменяет объекты и модельное время состоянием пространства other (например, загруженного в фоне):
+        замена - только перестановка ссылок, без копирования состояния. Решатель, численный метод,
+        обработка столкновений и запись траекторий остаются прежними; запись траекторий продолжается
+        в новом сегменте (recorder.segment_path()) - состав объектов и модельное время меняются.
+
+        """
+
+        assert (self.Engine is None) == (other.Engine is None), \
+            "Пространства с движком и без движка не могут обменяться состоянием."
+        if self.Engine is not None:
+            other.Engine.solver, other.Engine.integrator = self.Engine.solver, self.Engine.integrator
+            self.Engine = other.Engine
+        self.Objects = other.Objects
+        self.Time = other.Time
+        self._propagator = None
+        self.Energy = self.Energy0 = None
+        if self.Recorder is not None:
+            self.Recorder.restart(self)
+            self.Recorder.write(self)
+        return True
+
     def clear_objects(self):
-        self.Objects = []
+        self.Objects = Registry()
+        if self.Engine is not None:
+            self.Engine.clear()
+        self.Energy = self.Energy0 = None
@@ -0,0 +1,202 @@
+"""
+Расчет с фиксированным шагом, независимый от частоты отрисовки.
+
+Время визуализации (реальные секунды между кадрами) умножается на ускорение warp и накапливается;
+из накопленного модельного времени выполняется столько шагов фиксированной длительности dt,
+сколько в нем помещается. Ускорение увеличивает количество шагов за кадр, а не длительность шага,
+поэтому устойчивость и точность расчета от ускорения не зависят.
+
+Остаток накопленного времени (меньше одного шага) используется для интерполяции отображаемых координат
+между двумя последними рассчитанными состояниями - движение на экране плавное при любом соотношении
+частоты кадров и шагов.
+
+Для отрисовки из другого потока (worker.PhysicsWorker) состояние публикуется снимками SceneState:
+массивы снимка не изменяются расчетом.
+
+"""
+
+
+import time
+import numpy as np
+
+
+class SceneState:
+    """
+    Снимок пространства для отрисовки (только для чтения): массивы снимка не изменяются расчетом,
+    поэтому снимок можно читать из другого потока.
+
+    version - номер состава объектов (registry.Registry.version).
+    colors - цвета объектов, массив (n, 4) uint8; при неизменном составе берутся из предыдущего снимка.
+    radii - радиусы объектов, массив (n,).
+    mass - массы объектов, создающих гравитационное поле (пробные частицы - 0), массив (n,).
+
+    """
+
+    __slots__ = ('version', 'colors', 'radii', 'mass')
+
+    def __init__(self, space, previous=None):
+        objects = space.Objects
+        self.version = objects.version
+        if previous is not None and previous.version == self.version:
+            self.colors = previous.colors
+        else:
+            colors = np.full((len(objects), 4), 255, dtype=np.uint8)
+            for i, o in enumerate(objects):
+                if o.Color is not None:
+                    color = list(o.Color)
+                    colors[i, :len(color)] = color
+            self.colors = colors
+        engine = space.Engine
+        if engine is not None:
+            n = engine.n
+            self.radii = engine.r[:n].copy()
+            self.mass = np.where(engine.source[:n], engine.mass[:n], 0.0)
+        else:
+            self.radii = np.array([o.R for o in objects], dtype=float)
+            self.mass = np.array([o.Mass if o.GravitySource else 0.0 for o in objects], dtype=float)
+        for array in (self.colors, self.radii, self.mass):
+            array.flags.writeable = False
+
+    def __len__(self):
+        return len(self.radii)
+
+
+class FixedStepper:
+    """
+    Класс, продвигающий пространство шагами фиксированной длительности по реальному времени.
+
+    space - пространство (Space).
+    dt - длительность шага, модельные секунды.
+    warp - ускорение: модельных секунд за реальную секунду.
+    max_substeps - наибольшее количество шагов за кадр: если расчет не успевает за ускорением,
+    лишнее накопленное время отбрасывается (модельное время идет медленнее заданного), а не копится.
+    uncapped - режим "как можно быстрее": шаги выполняются, пока не истечет бюджет времени кадра.
+    accumulator - накопленное, но еще не рассчитанное модельное время.
+    substeps - количество шагов, выполненных за последний кадр.
+    limited - True, если на последнем кадре расчет не успел за ускорением.
+
+    """
+
+    def __init__(self, space, dt, warp=None, max_substeps=100):
+        assert dt > 0, f"Некорректная длительность шага: {dt}."
+        self.space = space
+        self.dt = dt
+        self.warp = dt if warp is None else warp
+        self.max_substeps = max_substeps
+        self.uncapped = False
+        self.accumulator = 0.0
+        self.substeps = 0
+        self.limited = False
+        self._prev = np.zeros((0, 2))
+        self._cur = np.zeros((0, 2))
+        self._scene = None
+
+    def positions(self, out=None):
+        """
+        Метод копирует текущие координаты объектов пространства в массив out
+        (None или размер, не совпадающий с количеством объектов, - в новый массив).
+
+        return: массив координат (n, 2)
+
+        """
+
+        engine = self.space.Engine
+        n = len(self.space.Objects)
+        if out is None or out.shape[0] != n:
+            out = np.zeros((n, 2))
+        if engine is not None:
+            out[:] = engine.pos[:engine.n]
+        else:
+            for i, o in enumerate(self.space.Objects):
+                out[i] = o.X or 0.0, o.Y or 0.0
+        return out
+
+    def frame(self, wall, budget=None):
+        """
+        Метод выполняет шаги расчета, соответствующие wall реальным секундам.
+
+        wall: реальное время с предыдущего кадра, секунды.
+        budget: бюджет времени на расчет в режиме uncapped, секунды (по умолчанию - wall).
+
+        return: количество выполненных шагов
+
+        """
+
+        n = 0
+        self.limited = False
+        if self.uncapped:
+            # как можно быстрее: шаги до истечения бюджета кадра (хотя бы один шаг)
+            deadline = time.perf_counter() + (wall if budget is None else budget)
+            while n == 0 or time.perf_counter() < deadline:
+                self._prev = self.positions(self._prev)
+                self.space.gravity_interactions(self.dt)
+                n += 1
+            self.accumulator = self.dt
+        else:
+            self.accumulator += wall * self.warp
+            n = int(self.accumulator // self.dt)
+            if n > self.max_substeps:
+                n = self.max_substeps
+                self.limited = True
+            for i in range(n):
+                if i == n - 1:
+                    self._prev = self.positions(self._prev)
+                self.space.gravity_interactions(self.dt)
+            self.accumulator -= n * self.dt
+            if self.limited:
+                # расчет не успевает за ускорением - остаток отбрасывается
+                self.accumulator = min(self.accumulator, self.dt)
+        if n:
+            self._cur = self.positions(self._cur)
+        self.substeps = n
+        return n
+
+    def alpha(self):
+        """
+        Метод возвращает долю шага между двумя последними состояниями, соответствующую текущему моменту.
+
+        """
+
+        return min(self.accumulator / self.dt, 1.0)
+
+    def previous(self, current):
+        """
+        Метод возвращает координаты предыдущего рассчитанного состояния - начало интерполяции к текущим
+        координатам current (новый массив). Если состояние изменено не шагом расчета (загрузка, добавление
+        объектов), интерполяция не выполняется - возвращается копия current.
+
+        """
+
+        if self._prev.shape != current.shape or not np.array_equal(self._cur, current):
+            return current.copy()
+        return self._prev.copy()
+
+    def scene(self):
+        """
+        Метод возвращает снимок пространства для отрисовки (SceneState): цвета объектов пересчитываются
+        только при изменении состава объектов.
+
+        """
+
+        self._scene = SceneState(self.space, self._scene)
+        return self._scene
+
+    def render_positions(self):
+        """
+        Метод возвращает координаты объектов для отрисовки: интерполяция между двумя последними
+        рассчитанными состояниями по доле накопленного времени, массив (n, 2).
+        Если состояние изменено не шагом расчета (загрузка, добавление объектов), возвращаются текущие координаты.
+
+        """
+
+        current = self.positions()
+        prev = self.previous(current)
+        return prev + self.alpha() * (current - prev)
+
+    def render_state(self):
+        """
+        Метод возвращает снимок пространства для отрисовки (SceneState) и координаты объектов (render_positions()).
+
+        """
+
+        return self.scene(), self.render_positions()
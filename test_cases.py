@@ -3,8 +3,39 @@
 
 """
 
+import json
+import os
+import pickle
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import numpy as np
+from constants import G
 from space import Space
 from objects import SpaceObjects
+import objects
+from engine import DirectSum
+from barnes_hut import BarnesHut
+from integrators import integrators
+from scenarios import load_scenario
+import headless
+from ensemble import Ensemble
+from evolution import Evolution, InterceptProblem
+from kepler import solve_kepler
+from recorder import Trajectory
+from replay import Player
+from stepper import FixedStepper
+from worker import PhysicsWorker
+from collisions import candidate_pairs
+import bench_suite
+from profiler import FrameProfiler
+from scene_io import SceneIO
+import checkpoint
+import snapshot
+from registry import Registry, swap_plan
+# графические модули (pygame) импортируются в тестах отрисовки: тесты ядра выполняются без них
 
 
 class Test:
@@ -45,17 +76,367 @@ class Test:
         except AssertionError:
             pass
 
-        # сохранение
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'save1.csv')
+
+            # сохранение
+            space = Space()
+            space.add_obj(object_test)
+            assert space.save_obj(path)
+
+            # загрузка
+            space1 = Space()
+            assert space1.load_obj(path)
+            space2 = Space()
+            space2.add_obj(object_test)
+            assert space1.Objects[0].Name == space2.Objects[0].Name
+
+    def test_engine(self):
+        """
+        Метод для тестирования векторизованного движка engine.
+
+        """
+
+        def scene(engine):
+            space = Space(engine=engine)
+            sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+            sun.set_coord(0, 0)
+            sun.StaticCoord = True
+            earth = SpaceObjects('Earth', 5.9722 * 10 ** 24, 6371302)
+            earth.set_coord(149.6 * 10 ** 9, 0, 0, 29765)
+            space.add_obj(sun, earth)
+            return space
+
+        # для двух объектов движок совпадает с попарным циклом
+        loop, engine = scene(False), scene(True)
+        for _ in range(10):
+            loop.gravity_interactions(3000)
+            engine.gravity_interactions(3000)
+        for o1, o2 in zip(loop.Objects, engine.Objects):
+            for name in ('X', 'Y', 'Vx', 'Vy'):
+                assert abs(getattr(o1, name) - getattr(o2, name)) <= 1e-9 * abs(getattr(o1, name)) + 1e-9
+
+        # объекты являются "окнами" в массивы движка
+        earth = engine.Objects[1]
+        earth.X = 1.0
+        assert engine.Engine.pos[1, 0] == 1.0
+        assert type(earth.X) is float and type(earth.StaticCoord) is bool
+
+        # суммарные ускорения совпадают с попарным расчетом SpaceObjects.gravity_force()
+        space = Space(engine=True)
+        for i in range(5):
+            o = SpaceObjects(str(i), 10.0**(20 + i), 1)
+            o.set_coord(1.0e9 * i**2, 3.0e8 * (-1)**i)
+            space.add_obj(o)
+        acc = space.Engine.accelerations()
+        for i, o1 in enumerate(space.Objects):
+            ax = ay = 0.0
+            for o2 in space.Objects:
+                if o2 is not o1:
+                    a = o1.gravity_force(o2) / o1.Mass
+                    ax += a * o1.orientation_to_obj(o2)[0]
+                    ay += a * o1.orientation_to_obj(o2)[1]
+            assert abs(acc[i, 0] - ax) <= 1e-9 * abs(ax) and abs(acc[i, 1] - ay) <= 1e-9 * abs(ay)
+
+        # при отключении движка объекты сохраняют состояние
+        space.use_engine(False)
+        assert space.Objects[4].X == 1.6e10 and space.Objects[4]._store is None
+
+    def test_barnes_hut(self):
+        """
+        Метод для тестирования решателя barnes_hut.
+
+        """
+
+        rng = np.random.default_rng(1)
+        pos = rng.normal(size=(2000, 2)) * 1.0e9
+        mass = rng.uniform(1.0e20, 1.0e25, len(pos))
+        # совпадающие объекты не должны давать бесконечных ускорений
+        pos[1] = pos[0]
+        exact = DirectSum().accelerations(pos[1:], mass[1:])
+
+        # при theta = 0 дерево раскрывается полностью - расчет точный
+        approx = BarnesHut(0).accelerations(pos[1:], mass[1:])
+        assert np.allclose(approx, exact, rtol=1e-9, atol=0)
+        assert np.isfinite(BarnesHut(0.5).accelerations(pos, mass)).all()
+
+        # ошибка растет вместе с углом раскрытия
+        errors = [BarnesHut(theta).force_error(pos[1:], mass[1:], sample=300)['rms'] for theta in (0.2, 0.5, 1.0)]
+        assert errors[0] < errors[1] < errors[2] < 0.2
+        # эталон строится по тем же источникам: при theta = 0 ошибки нет и для пробных частиц
+        sources = np.arange(1, len(pos), 3) - 1
+        assert BarnesHut(0).force_error(pos[1:], mass[1:], sample=300, sources=sources)['max'] < 1e-9
+
+        # выбор решателя в Space
         space = Space()
-        space.add_obj(object_test)
-        assert space.save_obj()
+        for i in range(50):
+            o = SpaceObjects(str(i), 1.0e22, 1)
+            o.set_coord(*pos[i + 2], 0, 0)
+            space.add_obj(o)
+        space.set_solver('barnes-hut', theta=0.5)
+        assert isinstance(space.Engine.solver, BarnesHut)
+        assert space.force_error()['rms'] < 0.1
+        space.gravity_interactions(1000)
+
+    def test_integrators(self):
+        """
+        Метод для тестирования численных методов integrators.
+
+        """
+
+        def scene(order=(0, 1, 2)):
+            space = Space()
+            sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+            sun.set_coord(0, 0)
+            sun.StaticCoord = True
+            earth = SpaceObjects('Earth', 5.9722 * 10 ** 24, 6371302)
+            earth.set_coord(149.6 * 10 ** 9, 0, 0, 29765)
+            moon = SpaceObjects('Moon', 7.35 * 10 ** 22, 1737000)
+            moon.set_coord(149.6 * 10 ** 9 + 384.4 * 10 ** 6, 0, 0, 29765 + 1022)
+            objects = (sun, earth, moon)
+            space.add_obj(*(objects[i] for i in order))
+            return space
+
+        drift = {}
+        for name in integrators:
+            # результат шага не зависит от порядка объектов
+            s1, s2 = scene(), scene((2, 0, 1))
+            s1.set_integrator(name)
+            s2.set_integrator(name, track_energy=True)
+            for _ in range(100):
+                s1.gravity_interactions(3000)
+                s2.gravity_interactions(3000)
+            for o in s1.Objects:
+                twin = next(i for i in s2.Objects if i.Name == o.Name)
+                assert (o.X, o.Y, o.Vx, o.Vy) == (twin.X, twin.Y, twin.Vx, twin.Vy)
+            # неподвижное Солнце не сдвинулось, время идет
+            assert (s1.Objects[0].X, s1.Objects[0].Y) == (0, 0)
+            assert s1.Time == 300000
+            drift[name] = s2.EnergyDrift
+
+        # методы высокого порядка точнее
+        assert drift['yoshida4'] < drift['leapfrog'] < drift['euler']
+        assert drift['rk4'] < drift['euler']
+
+        # энергия векторизованного движка совпадает с попарным расчетом
+        s1, s2 = scene(), scene()
+        s2.use_engine()
+        assert abs(s1.energy() - s2.energy()) <= 1e-12 * abs(s1.energy())
+
+        # ускорения конца шага leapfrog не используются повторно, если изменились массы, источники или состав
+        space = scene()
+        space.set_integrator('leapfrog')
+        space.gravity_interactions(3000)
+        engine, integrator = space.Engine, space.Engine.integrator
+        assert integrator._remembered(engine)
+        sun, earth, moon = space.Objects
+        earth.Mass *= 2
+
+        def fresh():
+            return np.allclose(integrator._start_acc(engine)[2], engine.accelerations()[2], rtol=1e-14, atol=0)
+
+        assert not integrator._remembered(engine) and fresh()
+        engine.source[1] = False
+        assert not integrator._remembered(engine) and fresh()
+        particle = objects.TestParticle('Particle', 0.0, 1.0)
+        particle.set_coord(1.0e13, 0)
+        space.add_obj(particle)
+        assert not integrator._remembered(engine)
+        space.remove_obj(particle)
+        assert not integrator._remembered(engine) and fresh()
+
+    def test_time_steps(self):
+        """
+        Метод для тестирования адаптивного и блочного шага integrators.
+
+        """
+
+        def scene():
+            # иерархическая система: Солнце - планеты - Земля - Луна - зонд на низкой орбите Земли
+            space = Space()
+            sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+            sun.set_coord(0, 0)
+            sun.StaticCoord = True
+            space.add_obj(sun)
+            au = 149.6 * 10 ** 9
+            for name, mass, a in (('Venus', 4.87e24, 0.723), ('Mars', 6.42e23, 1.524),
+                                  ('Jupiter', 1.9e27, 5.2), ('Saturn', 5.68e26, 9.58)):
+                planet = SpaceObjects(name, mass, 1)
+                planet.set_coord(a * au, 0, 0, (G * sun.Mass / (a * au))**0.5)
+                space.add_obj(planet)
+            earth = SpaceObjects('Earth', 5.9722 * 10 ** 24, 6371302)
+            earth.set_coord(au, 0, 0, 29765)
+            moon = SpaceObjects('Moon', 7.35 * 10 ** 22, 1737000)
+            moon.set_coord(au + 384.4 * 10 ** 6, 0, 0, 29765 + 1022)
+            probe = SpaceObjects('Probe', 1000, 1)
+            probe.set_coord(au - 7.0e6, 0, 0, 29765 - (G * earth.Mass / 7.0e6)**0.5)
+            space.add_obj(earth, moon, probe)
+            return space
+
+        reference = scene()
+        reference.set_integrator('yoshida4')
+        for _ in range(6 * 60):
+            reference.gravity_interactions(60)
+
+        results = {}
+        for name in ('adaptive', 'block'):
+            space = scene()
+            space.set_integrator(name, eta=0.02)
+            for _ in range(6):
+                space.gravity_interactions(3600)
+            assert space.Time == 6 * 3600
+            # зонд остается на своей орбите
+            error = max(abs(o.X - r.X) + abs(o.Y - r.Y) for o, r in zip(space.Objects, reference.Objects))
+            assert error < 1.0e5
+            results[name] = space.Engine.evaluations
+
+        # блочный шаг пересчитывает медленные объекты редко
+        assert results['block'] * 5 < results['adaptive']
+
+    def test_headless(self):
+        """
+        Метод для тестирования моделирования без визуализации headless.
+
+        """
+
+        # математическое ядро не загружает графические библиотеки
+        code = "import sys, space, objects, headless, scenarios; " \
+               "print([m for m in ('pygame', 'tkinter', 'win32api') if m in sys.modules])"
+        out = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__)))
+        assert out.stdout.strip() == '[]', out.stdout
+
+        # моделирование ровно на заданное модельное время со снимками состояния
+        space = load_scenario('sun-earth')
+        space.set_integrator('leapfrog')
+        with tempfile.TemporaryDirectory() as folder:
+            stats = headless.simulate(space, 3600, duration=10 * 3600 + 100, snapshot_every=4, out=folder, log=None)
+            assert stats['steps'] == 11 and space.Time == 10 * 3600 + 100
+            assert [os.path.basename(p) for p in stats['snapshots']] == \
+                   ['snapshot_000000004.snap', 'snapshot_000000008.snap', 'snapshot_000000011.snap']
+            restored = Space()
+            restored.load(stats['snapshots'][-1])
+            assert restored.Objects[1].X == space.Objects[1].X and restored.Time == space.Time
+
+    def test_ensemble(self):
+        """
+        Метод для тестирования ансамбля ensemble.
+
+        """
+
+        def scene(dv=(0.0, 0.0)):
+            space = load_scenario('sun-earth')
+            probe = SpaceObjects('Probe', 1000, 1)
+            probe.set_coord(149.6 * 10 ** 9 - 7.0e6, 0, 0, 29765 - 7546)
+            probe.Vx += dv[0]
+            probe.Vy += dv[1]
+            space.add_obj(probe)
+            return space
 
-        # загрузка
-        space1 = Space()
-        assert space1.load_obj("save1.csv")
-        space2 = Space()
-        space2.add_obj(object_test)
-        assert space1.Objects[0].Name == space2.Objects[0].Name
+        dvs = np.array([[0.0, 0.0], [50.0, 0.0], [0.0, 300.0]])
+        ensemble = Ensemble(scene(), len(dvs))
+        ensemble.add_velocity('Probe', dvs)
+        result = ensemble.run(60, 100, record_every=10, closest=('Probe', 'Earth'))
+        assert result['pos'].shape == (3, 3, 2) and result['trajectory'].shape == (10, 3, 3, 2)
+
+        # каждая копия совпадает с отдельным расчетом Space тем же методом
+        for i, dv in enumerate(dvs):
+            space = scene(dv)
+            space.set_integrator('leapfrog')
+            for _ in range(100):
+                space.gravity_interactions(60)
+            for j, o in enumerate(space.Objects):
+                assert np.allclose(result['pos'][i, j], (o.X, o.Y), rtol=1e-12, atol=1e-3)
+        assert result['min_distance'][2] < result['min_distance'][0]
+
+        # объекты на кеплеровых орбитах движутся по орбите, как в Space
+        def rails():
+            space = scene()
+            space.Objects[1].set_orbit(space.Objects[0])
+            return space
+
+        ensemble = Ensemble(rails(), 2)
+        start = ensemble.pos[0, 1].copy()
+        result = ensemble.run(3600, 48)
+        space = rails()
+        space.set_integrator('leapfrog')
+        for _ in range(48):
+            space.gravity_interactions(3600)
+        assert np.linalg.norm(result['pos'][0, 1] - start) > 1.0e9
+        for j, o in enumerate(space.Objects):
+            assert np.allclose(result['pos'][:, j], (o.X, o.Y), rtol=1e-12, atol=1e-3), o.Name
+
+        # пробная частица (GravitySource = False) притягивается, но не притягивает - как в Space
+        def particles():
+            space = load_scenario('sun-earth')
+            particle = objects.TestParticle('Particle', 1.0e24, 1)
+            particle.set_coord(149.6 * 10 ** 9 + 5.0e7, 0, 0, 29765 + 2800)
+            space.add_obj(particle)
+            return space
+
+        result = Ensemble(particles(), 2).run(600, 50)
+        space = particles()
+        space.set_integrator('leapfrog')
+        for _ in range(50):
+            space.gravity_interactions(600)
+        for j, o in enumerate(space.Objects):
+            assert np.allclose(result['pos'][:, j], (o.X, o.Y), rtol=1e-12, atol=1e-3), o.Name
+
+        # тяга: постоянное ускорение в течение заданного времени
+        ensemble = Ensemble(scene(), 2)
+        ensemble.mass[:] = 0.0
+        ensemble.set_thrust('Probe', [[1.0, 0.0], [0.0, 2.0]], duration=[60.0, 90.0])
+        v0 = ensemble.vel[:, 2].copy()
+        ensemble.run(60, 3)
+        assert np.allclose(ensemble.vel[:, 2] - v0, [[60.0, 0.0], [0.0, 180.0]])
+
+    def test_evolution(self):
+        """
+        Метод для тестирования генетического алгоритма evolution.
+
+        """
+
+        space = load_scenario('sun-earth')
+        probe = SpaceObjects('Probe', 1000, 1)
+        probe.set_coord(149.6 * 10 ** 9 - 7.0e6, 0, 0, 29765 - 7546)
+        space.add_obj(probe)
+        problem = InterceptProblem(space, 'Probe', 'Earth', 60, 60, [[-500, 500], [-500, 500]])
+
+        # оценка в пуле процессов совпадает с оценкой в текущем процессе
+        with Evolution(problem, size=16, workers=2, batch=4, quantum=1.0, seed=1) as pooled:
+            fitness, hits = pooled.evaluate(pooled.population)
+            assert hits == 0
+            assert np.allclose(fitness, problem.evaluate(np.round(pooled.population)))
+            # повторная оценка берется из кэша
+            assert pooled.evaluate(pooled.population)[1] == 16
+            # повторы вектора в популяции оцениваются один раз и не считаются новыми оценками
+            twins = np.vstack((pooled.population[:2], [[7.0, 7.0]] * 3))
+            assert pooled.evaluate(twins)[1] == 4 and len(pooled.cache) == 17
+
+        # запись траекторий и контрольные точки сценария остаются в текущем процессе
+        with tempfile.TemporaryDirectory() as folder:
+            space.attach_recorder(os.path.join(folder, 'run.traj'))
+            space.attach_checkpoints(folder, every=60)
+            try:
+                # при запуске процессов не через fork (Windows, macOS) задача сериализуется
+                copied = pickle.loads(pickle.dumps(problem))
+                assert copied.space.Recorder is None and copied.space.Checkpoints is None
+                assert [o.Name for o in copied.space.Objects] == [o.Name for o in space.Objects]
+                with Evolution(problem, size=4, workers=1, quantum=1.0, seed=3) as pooled:
+                    fitness, _ = pooled.evaluate(pooled.population)
+                    assert np.allclose(fitness, problem.evaluate(np.round(pooled.population)))
+                assert space.Recorder is not None and space.Checkpoints is not None
+            finally:
+                space.detach_recorder()
+                space.detach_checkpoints()
+
+        # эволюция улучшает лучшую приспособленность
+        evolution = Evolution(problem, size=24, workers=0, quantum=1.0, seed=2)
+        evolution.fitness, _ = evolution.evaluate(evolution.population)
+        first = evolution.fitness.max()
+        best, value = evolution.run(5)
+        assert value >= first and len(evolution.stats) == 5
+        assert all(s['evaluated'] + s['cache_hits'] == 24 for s in evolution.stats)
 
     def test_objects(self):
         """
@@ -78,11 +459,998 @@ class Test:
             pass
 
 
+    def test_kepler(self):
+        """
+        Метод для тестирования kepler и объектов на орбитах (CoordFromTime).
+
+        """
+
+        # векторизованное решение уравнения Кеплера для элипсов и гипербол
+        M = np.linspace(-10, 10, 41)
+        for e in (0.0, 0.3, 0.95):
+            E = solve_kepler(M, e)
+            assert np.allclose(E - e * np.sin(E), np.mod(M + np.pi, 2 * np.pi) - np.pi, atol=1e-12)
+        H = solve_kepler(M, 1.5)
+        assert np.allclose(1.5 * np.sinh(H) - H, M, atol=1e-9)
+
+        for engine in (False, True):
+            sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+            sun.set_coord(0, 0)
+            sun.StaticCoord = True
+            earth = SpaceObjects('Earth', 5.9722 * 10**24, 6371302)
+            earth.set_coord(149.6 * 10**9, 0, 0, 29765)
+            earth.set_orbit(sun)
+            x0, y0 = earth.X, earth.Y
+            space = Space(engine=engine)
+            space.add_obj(sun, earth)
+            orbit = earth.Orbit
+            period = 2 * np.pi * np.sqrt(orbit.a**3 / orbit.mu)
+            # шаги не сдвигают Землю с орбиты: положение задается аналитически
+            for _ in range(10):
+                space.gravity_interactions(period / 40)
+            x, y = orbit.state(period / 4)[0]
+            assert np.isclose(earth.X, x, rtol=1e-9, atol=1.0) and np.isclose(earth.Y, y, rtol=1e-9, atol=1.0)
+            assert orbit.a * (1 - orbit.e) <= np.hypot(earth.X, earth.Y) <= orbit.a * (1 + orbit.e)
+            # переход к дате без пошагового расчета: через период Земля возвращается в начальную точку
+            space.set_time(period)
+            assert abs(earth.X - x0) < 1.0 and abs(earth.Y - y0) < 1.0
+            assert np.isclose(earth.Vy, 29765, rtol=1e-9)
+            # кэш расчета орбит переиспользуется, пока орбиты те же, и пересчитывается при новой орбите
+            propagator = space._propagator
+            space.gravity_interactions(60)
+            assert space._propagator is propagator
+            earth.set_orbit(sun, orbit.a * 2, 0.0, epoch=space.Time)
+            space.gravity_interactions(60)
+            assert space._propagator is not propagator and space._propagator.orbits == [earth.Orbit]
+            assert np.isclose(np.hypot(earth.X, earth.Y), orbit.a * 2, rtol=1e-9)
+
+        # эксцентрическая орбита совпадает с численным расчетом leapfrog
+        space = Space(engine=True)
+        sun = SpaceObjects('Sun', 1.9891 * 10**30, 695990000)
+        sun.set_coord(0, 0)
+        sun.StaticCoord = True
+        rails = SpaceObjects('Rails', 1.0, 1.0)
+        rails.set_coord(10**11, 0, 0, 40000)
+        free = SpaceObjects('Free', 1.0, 1.0)
+        free.set_coord(10**11, 0, 0, 40000)
+        space.add_obj(sun, rails)
+        rails.set_orbit(sun)
+        assert 0.1 < rails.Orbit.e < 0.9
+        numeric = Space(engine=True)
+        numeric.add_obj(sun, free)
+        numeric.set_integrator('leapfrog')
+        for _ in range(2000):
+            numeric.gravity_interactions(3600)
+        space.set_time(2000 * 3600)
+        assert np.hypot(rails.X - free.X, rails.Y - free.Y) < 1e-4 * 10**11
+
+    def test_snapshot(self):
+        """
+        Метод для тестирования двоичных снимков snapshot и CSV-файлов.
+
+        """
+
+        rng = np.random.default_rng(1)
+        source = Space(engine=True)
+        for i in range(100):
+            o = SpaceObjects(f'Тело {i}', rng.uniform(1e20, 1e30), rng.uniform(1e3, 1e8))
+            o.set_coord(*rng.normal(0, 1e11, 2), *rng.normal(0, 3e4, 2), *rng.normal(0, 1e-3, 2))
+            o.StaticCoord = i % 7 == 0
+            o.CoordFromTime = i % 11 == 0
+            if i % 3 == 0:
+                o.set_color((i, 2 * i, 255 - i, 255))
+            source.add_obj(o)
+        source.Time = 1234.5678
+
+        fields = ('Name', 'Mass', 'R', 'X', 'Y', 'Vx', 'Vy', 'Ax', 'Ay', 'StaticCoord', 'CoordFromTime', 'Color')
+
+        def same(a, b):
+            return [[getattr(o, f) for f in fields] for o in a.Objects] == \
+                   [[getattr(o, f) for f in fields] for o in b.Objects]
+
+        with tempfile.TemporaryDirectory() as folder:
+            # двоичный снимок: точное совпадение с движком и без него, с отображением в память и без
+            path = os.path.join(folder, 'state.snap')
+            assert source.save_snapshot(path)
+            for engine in (True, False):
+                for mmap in (True, False):
+                    restored = Space(engine=engine)
+                    assert restored.load_snapshot(path, mmap=mmap)
+                    assert same(source, restored) and restored.Time == source.Time
+
+            # загруженное состояние моделируется, изменения не попадают в файл
+            restored = Space(engine=True)
+            restored.load(path)
+            restored.set_integrator('leapfrog')
+            restored.gravity_interactions(10)
+            restored.add_obj(SpaceObjects('Новое', 1.0, 1.0))
+            assert not same(source, restored)
+            again = Space()
+            again.load(path)
+            assert same(source, again)
+            # сохранение поверх отображенного в память файла
+            restored.save(path)
+            again.load(path)
+            assert same(restored, again)
+            # загрузка и сохранение в тот же файл без изменений: в Windows отображенный в память файл
+            # заменить нельзя - при замене файл не должен быть отображен в массивы движка
+            mapped = Space(engine=True)
+            mapped.load(path)
+            assert isinstance(mapped.Engine.pos, np.memmap)
+            replace = snapshot.os.replace
+
+            def windows_replace(src, dst):
+                engine = mapped.Engine
+                if any(isinstance(getattr(engine, name), np.memmap) and os.path.abspath(getattr(engine, name).filename)
+                       == os.path.abspath(dst) for name in ('mass', 'r', 'pos', 'vel', 'acc', 'static', 'from_time')):
+                    raise PermissionError(f'Файл отображен в память: {dst}')
+                return replace(src, dst)
+
+            snapshot.os.replace = windows_replace
+            try:
+                assert mapped.save(path)
+            finally:
+                snapshot.os.replace = replace
+            again.load(path)
+            assert same(mapped, again)
+
+            # CSV: точное совпадение после экспорта и импорта
+            path = os.path.join(folder, 'state.csv')
+            assert source.save(path)
+            restored = Space()
+            assert restored.load(path)
+            assert same(source, restored)
+
+            # содержимое CSV-файла не выполняется как код
+            with open(path, 'w') as file:
+                file.write('Название;Масса;Радиус;X;Y;Vx;Vy;Ax;Ay;Статические координаты;Зависит от времени;Цвет\r'
+                           '__import__("os");__import__("os").getcwd();1;0;0;0;0;0;0;False;False;None\r')
+            try:
+                Space().load_obj(path)
+                raise Exception("Space.load_obj() выполнил содержимое файла")
+            except ValueError:
+                pass
+
+    def test_recorder(self):
+        """
+        Метод для тестирования записи траекторий recorder.
+
+        """
+
+        for engine in (True, False):
+            space = load_scenario('sun-earth', engine=engine)
+            if engine:
+                space.set_integrator('leapfrog')
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'run.traj')
+                space.attach_recorder(path, capacity=10, every=3)
+                size = os.path.getsize(path)
+                history = [(space.Time, space.Objects[1].X, space.Objects[1].Vy)]
+                for step in range(1, 61):
+                    space.gravity_interactions(3600)
+                    if step % 3 == 0:
+                        history.append((space.Time, space.Objects[1].X, space.Objects[1].Vy))
+                # размер файла не растет, в буфере - 10 последних кадров из 21
+                assert os.path.getsize(path) == size
+                trajectory = Trajectory(path)
+                assert len(trajectory) == 10 and trajectory.names == ['Sun', 'Earth']
+                earth = trajectory.trajectory('Earth')
+                assert [tuple(r) for r in zip(earth['time'], earth['pos'][:, 0], earth['vel'][:, 1])] == history[-10:]
+                # траектория за интервал времени
+                window = trajectory.trajectory(1, start=history[13][0], stop=history[16][0])
+                assert list(window['time']) == [h[0] for h in history[13:17]]
+                frame = trajectory.frame(history[15][0] + 1)
+                assert frame['time'] == history[15][0] and frame['pos'][1, 0] == history[15][1]
+                space.detach_recorder()
+
+        # слияние при столкновении во время записи: запись продолжается в новом сегменте
+        for engine in (True, False):
+            space = Space(engine=engine)
+            a, b, c = SpaceObjects('A', 2.0e20, 1.0e5), SpaceObjects('B', 1.0e20, 1.0e5), SpaceObjects('C', 1.0e20, 1.0)
+            a.set_coord(-5.0e6, 0, 2.0e4, 0, t=0)
+            b.set_coord(5.0e6, 0, -3.0e4, 0, t=0)
+            c.set_coord(0, 1.0e10, 0, 0, t=0)
+            space.add_obj(a, b, c)
+            space.use_collisions()
+            with tempfile.TemporaryDirectory() as folder:
+                path = os.path.join(folder, 'run.traj')
+                recorder = space.attach_recorder(path)
+                for _ in range(3):
+                    space.gravity_interactions(1000)
+                space.detach_recorder()
+                assert recorder.paths == [path, os.path.join(folder, 'run.1.traj')] and len(space.Objects) == 2
+                first, second = Trajectory(recorder.paths[0]), Trajectory(recorder.paths[1])
+                assert first.names == ['A', 'B', 'C'] and len(first) == 1
+                assert sorted(second.names) == ['A', 'C'] and len(second) == 3
+                assert second.frame(space.Time)['pos'][second.index('A'), 0] == a.X
+
+    def test_replay(self):
+        """
+        Метод для тестирования воспроизведения записи replay.
+
+        """
+
+        space = load_scenario('sun-earth')
+        space.set_integrator('leapfrog')
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'run.traj')
+            # каждые 4 шага в буфер на 50 кадров - часть записи будет перезаписана
+            space.attach_recorder(path, capacity=50, every=4)
+            states = {}
+            for step in range(1, 301):
+                space.gravity_interactions(3600)
+                states[space.Time] = (space.Objects[1].X, space.Objects[1].Y)
+            space.detach_recorder()
+
+            player = Player(path)
+            trajectory = player.trajectory
+            times = trajectory.times()
+            assert (player.start, player.stop) == (times[0], times[-1]) == (26 * 4 * 3600, 300 * 3600)
+            # индекс времени находит тот же кадр, что и двоичный поиск
+            for time in np.linspace(player.start - 10**4, player.stop + 10**4, 997):
+                assert trajectory.seek(time) == max(np.searchsorted(times, time, side='right') - 1, 0)
+            # между кадрами состояние интерполируется: совпадает с расчетом в пределах метра
+            for time in (player.start + 3600, player.start + 2 * 3600, player.stop - 3 * 3600):
+                player.seek(time)
+                earth = player.space.Objects[1]
+                assert abs(earth.X - states[time][0]) < 10 and abs(earth.Y - states[time][1]) < 10
+            # скорость и направление воспроизведения
+            player.seek(player.start)
+            player.faster(4)
+            assert player.advance(3600) and player.time == player.start + 4 * 3600
+            player.reverse()
+            assert not player.advance(3600) and player.time == player.start
+            # объекты сценария (цвета и радиусы) расставляются по записи
+            player = Player(path, load_scenario('sun-earth'))
+            assert player.space.Objects[0].Color == [255, 215, 0, 255] and player.space.Time == player.start
+
+    def test_stepper(self):
+        """
+        Метод для тестирования расчета с фиксированным шагом stepper.
+
+        """
+
+        space = load_scenario('sun-earth')
+        space.set_integrator('leapfrog')
+        stepper = FixedStepper(space, 100, warp=3000, max_substeps=50)
+        # полкадра - шаг еще не набран, второй полкадр - один шаг
+        assert stepper.frame(1 / 60) == 0 and space.Time == 0
+        assert stepper.frame(1 / 60) == 1 and space.Time == 100
+        # ускорение добавляет шаги той же длительности
+        stepper.warp = 8 * 3000
+        assert stepper.frame(1 / 30) == 8 and space.Time == 900
+        # расчет не успевает за ускорением - шагов не больше max_substeps, остаток не копится
+        stepper.warp = 10**6
+        assert stepper.frame(1 / 30) == 50 and stepper.limited and stepper.accumulator <= stepper.dt
+        # отображаемые координаты - интерполяция между двумя последними шагами
+        stepper.warp = 3000
+        stepper.accumulator = 0.0
+        stepper.frame(1.5 / 30)
+        earth = space.Objects[1]
+        prev, cur = stepper._prev[1], np.array([earth.X, earth.Y])
+        assert np.allclose(stepper.render_positions()[1], prev + 0.5 * (cur - prev))
+        assert np.array_equal(stepper.previous(stepper.positions()), stepper._prev)
+        # после изменения состояния не шагом расчета отображаются текущие координаты
+        earth.X += 10**9
+        assert stepper.render_positions()[1][0] == earth.X
+        assert np.array_equal(stepper.previous(stepper.positions()), stepper.positions())
+        # снимок для отрисовки: цвета пересчитываются только при изменении состава объектов
+        scene = stepper.scene()
+        assert scene.version == space.Objects.version and len(scene) == 2 and not scene.radii.flags.writeable
+        assert stepper.scene().colors is scene.colors
+        extra = SpaceObjects('Extra', 1.0, 1.0)
+        extra.set_coord(0, 1.0e13, 0, 0)
+        space.add_obj(extra)
+        assert len(stepper.scene()) == 3 and stepper.scene().mass[2] == 1.0
+        # режим "как можно быстрее": шаги до истечения бюджета кадра
+        stepper.uncapped = True
+        time0 = space.Time
+        n = stepper.frame(1 / 30, budget=0.05)
+        assert n > 1 and space.Time == time0 + n * 100
+
+    def test_worker(self):
+        """
+        Метод для тестирования фонового расчета worker.
+
+        """
+
+        space = load_scenario('sun-earth')
+        space.set_integrator('leapfrog')
+        worker = PhysicsWorker(FixedStepper(space, 100, warp=100 * 1000))
+        with worker:
+            time.sleep(0.2)
+            # расчет идет в фоне шагами фиксированной длительности
+            assert worker.time() > 0 and worker.time() % 100 == 0
+            positions = worker.render_positions()
+            assert positions.shape == (2, 2) and np.isfinite(positions).all()
+            # снимок для отрисовки публикуется вместе с координатами и не изменяется расчетом
+            scene, positions = worker.render_state()
+            radii = scene.radii.copy()
+            time.sleep(0.05)
+            assert len(scene) == len(positions) == 2 and np.array_equal(scene.radii, radii)
+            assert not scene.colors.flags.writeable and scene.version == space.Objects.version
+            # пауза останавливает модельное время
+            worker.paused = True
+            paused = worker.call(lambda: space.Time)
+            time.sleep(0.05)
+            assert worker.call(lambda: space.Time) == paused == worker.time()
+            worker.paused = False
+            # команды интерфейса выполняются в потоке расчета между шагами
+            assert worker.call(lambda: threading.current_thread().name) == 'physics'
+            worker.call(space.clear_objects)
+            assert worker.render_positions().shape == (0, 2) and len(worker.render_state()[0]) == 0
+            try:
+                worker.call(space.load, 'нет такого файла')
+                raise Exception("PhysicsWorker.call() не передал исключение команды")
+            except FileNotFoundError:
+                pass
+        assert worker._thread is None
+
+    def test_render(self):
+        """
+        Метод для тестирования отрисовки больших сцен render.
+
+        """
+
+        import pygame
+        from render import SceneRenderer
+        sc = pygame.Surface((400, 300))
+        renderer = SceneRenderer(min_r=10, max_circles=50)
+
+        # немного объектов меньше пикселя - окружности радиуса min_r, как раньше
+        space = load_scenario('sun-earth')
+        positions = np.array([[o.X, o.Y] for o in space.Objects])
+        stats = renderer.draw(sc, space, positions, shift=(200, 150), m=1.0e-9)
+        assert stats == {'circles': 2, 'points': 0, 'pixels': 0, 'culled': 0}
+        assert tuple(sc.get_at((200 + 149, 150))) == (0, 0, 255, 255)
+        # объект за пределами окна не рисуется
+        stats = renderer.draw(sc, space, positions, shift=(200, 150), m=1.0e-8)
+        assert stats['circles'] == 1 and stats['culled'] == 1
+
+        # много объектов меньше пикселя - слой точек, окружности - только крупные объекты
+        space = Space(engine=True)
+        rng = np.random.default_rng(1)
+        n = 100000
+        for i in range(n):
+            o = SpaceObjects(f'Body {i}', 1.0, 0.5)
+            o.set_coord(*rng.uniform(-300, 300, 2), t=0)
+            space.add_obj(o)
+        space.Objects[0].R = 20.0
+        space.Objects[0].X, space.Objects[0].Y = 0.0, 0.0
+        positions = space.Engine.pos[:n]
+        sc.fill((0, 0, 0))
+        stats = renderer.draw(sc, space, positions, shift=(200, 150), m=1.0)
+        screen = positions + (200, 150)
+        inside = (screen[:, 0] >= 0) & (screen[:, 0] < 400) & (screen[:, 1] >= 0) & (screen[:, 1] < 300)
+        assert stats['circles'] == 1 and stats['culled'] == n - inside.sum()
+        assert stats['points'] + stats['circles'] + stats['culled'] == n
+        assert stats['pixels'] == len(np.unique(screen[inside & (np.arange(n) > 0)].astype(int), axis=0))
+        # пиксель с объектом закрашен, пустой угол - нет
+        x, y = screen[np.flatnonzero(inside)[-1]].astype(int)
+        assert tuple(sc.get_at((x, y)))[:3] != (0, 0, 0)
+        assert tuple(sc.get_at((200, 150)))[:3] == (255, 255, 255)
+
+    def test_hud(self):
+        """
+        Метод для тестирования кэша текста и строки состояния hud.
+
+        """
+
+        import pygame
+        from hud import TextCache, HUD
+        # повторная отрисовка строки берется из кэша, дольше всего не используемая строка вытесняется
+        cache = TextCache(capacity=2)
+        first = cache.render('Время', 20)
+        assert cache.render('Время', 20) is first and cache.hits == 1 and cache.misses == 1
+        cache.render('Время', 20, color=(0, 0, 0))
+        cache.render('Объектов', 20)
+        assert len(cache) == 2 and cache.render('Время', 20) is not first
+
+        # перерисовываются только изменившиеся поля
+        sc = pygame.Surface((400, 300))
+        hud = HUD(cache)
+        bar = (230, 230, 250)
+        hud.set('time', 'Время: 1', (0, 280), 20, (0, 0, 0), bar)
+        hud.set('bodies', 'Объектов: 2', (200, 280), 20, (0, 0, 0), bar)
+        assert len(hud.draw(sc, full=True)) == 2
+        assert not hud.set('time', 'Время: 1', (0, 280), 20, (0, 0, 0), bar)
+        assert hud.draw(sc) == []
+        # грязные прямоугольники - старый и новый текст поля
+        old = hud._drawn['time'][0]
+        hud.set('time', 'Время: 1000', (0, 280), 20, (0, 0, 0), bar)
+        rects = hud.draw(sc)
+        assert len(rects) == 2 and rects[0] == old and rects[1].width > old.width
+        assert tuple(sc.get_at((rects[1].right - 1, 281)))[:3] == bar
+
+        # поле без фона отрисовывается только при полной перерисовке кадра
+        hud.set('pause', 'ПАУЗА', (150, 100), 50)
+        assert hud.needs_redraw() and hud.draw(sc) == []
+        assert len(hud.draw(sc, full=True)) == 3 and not hud.needs_redraw()
+        hud.remove('pause')
+        assert hud.needs_redraw()
+
+    def test_field(self):
+        """
+        Метод для тестирования отображения гравитационного поля field.
+
+        """
+
+        import pygame
+        from field import field, FieldOverlay
+        # поле одного объекта
+        potential, acc = field(np.array([[3.0e8, 0.0], [0.0, -4.0e8]]), np.zeros((1, 2)), np.array([6.0e24]))
+        assert np.allclose(potential, [-G * 6.0e24 / 3.0e8, -G * 6.0e24 / 4.0e8], rtol=1e-12)
+        assert np.allclose(acc, [[-G * 6.0e24 / 3.0e8**2, 0.0], [0.0, G * 6.0e24 / 4.0e8**2]], rtol=1e-9)
+        # поле многих объектов совпадает с ускорением пробного тела без массы
+        rng = np.random.default_rng(1)
+        pos = rng.normal(0, 1.0e11, (50, 2))
+        mass = rng.uniform(1.0e20, 1.0e25, 50)
+        points = rng.normal(0, 1.0e11, (300, 2))
+        _, acc = field(points, pos, mass)
+        for i in (0, 150, 299):
+            expected = DirectSum().accelerations(np.vstack((pos, points[i])), np.append(mass, 0.0), targets=[50])
+            assert np.allclose(acc[i], expected[0], rtol=1e-9)
+
+        # плитки поля кэшируются: при перемещении камеры строятся только открывшиеся
+        space = load_scenario('sun-earth')
+        positions = np.array([[o.X, o.Y] for o in space.Objects])
+        sc = pygame.Surface((400, 300))
+        overlay = FieldOverlay(tile=64)
+        stats = overlay.draw(sc, space, positions, shift=(200, 150), m=1.0e-9)
+        assert stats['tiles'] == stats['computed'] == 8 * 6
+        assert overlay.draw(sc, space, positions, shift=(200, 150), m=1.0e-9)['computed'] == 0
+        stats = overlay.draw(sc, space, positions, shift=(200 + 64, 150), m=1.0e-9)
+        assert stats['computed'] == 6
+        # у Солнца поле сильнее, чем в углу окна
+        assert sum(tuple(sc.get_at((284, 150)))[:3]) > sum(tuple(sc.get_at((399, 299)))[:3])
+        # смещение объектов меньше порога не сбрасывает кэш, больше - сбрасывает
+        stats = overlay.draw(sc, space, positions + 1.0e9, shift=(200, 150), m=1.0e-9)
+        assert stats['computed'] == 0
+        stats = overlay.draw(sc, space, positions + 1.0e10, shift=(200, 150), m=1.0e-9)
+        assert stats['computed'] == stats['tiles']
+
+    def test_collisions(self):
+        """
+        Метод для тестирования столкновений collisions.
+
+        """
+
+        # широкая фаза находит те же пары, что и перебор всех пар
+        rng = np.random.default_rng(1)
+        lo = rng.uniform(0, 100, (300, 2))
+        hi = lo + rng.uniform(0, 8, (300, 2))
+        i, j = candidate_pairs(lo, hi)
+        overlap = np.all((lo[:, np.newaxis] <= hi[np.newaxis]) & (lo[np.newaxis] <= hi[:, np.newaxis]), axis=2)
+        expected = {(a, b) for a, b in zip(*np.nonzero(overlap)) if a < b}
+        assert set(zip(i.tolist(), j.tolist())) == expected and len(i) == len(expected)
+
+        for engine in (True, False):
+            # встречные объекты пролетают друг сквозь друга за один шаг - столкновение не пропускается
+            space = Space(engine=engine)
+            a = SpaceObjects('A', 2.0e20, 1.0e5)
+            a.set_coord(-5.0e6, 0, 2.0e4, 1.0e3, t=0)
+            b = SpaceObjects('B', 1.0e20, 1.0e5)
+            b.set_coord(5.0e6, 1.0e4, -3.0e4, 0, t=0)
+            space.add_obj(a, b)
+            space.use_collisions()
+            momentum = (2.0e20 * 2.0e4 + 1.0e20 * -3.0e4, 2.0e20 * 1.0e3)
+            space.gravity_interactions(1000)
+            assert [o.Name for o in space.Objects] == ['A'] and space.Collisions.merged == 1
+            assert a.Mass == 3.0e20 and np.isclose(a.R, 2**(1 / 3) * 1.0e5)
+            assert np.allclose((a.Mass * a.Vx, a.Mass * a.Vy), momentum)
+            # без столкновений объекты пролетают друг сквозь друга
+            c, d = SpaceObjects('C', 2.0e20, 1.0e5), SpaceObjects('D', 1.0e20, 1.0e5)
+            c.set_coord(-5.0e6, 0, 2.0e4, 0, t=0)
+            d.set_coord(5.0e6, 0, -3.0e4, 0, t=0)
+            space = Space(engine=engine)
+            space.add_obj(c, d)
+            space.gravity_interactions(1000)
+            assert len(space.Objects) == 2 and c.X > d.X
+
+            # объекты в одной точке сливаются до расчета притяжения (нет деления на ноль)
+            space = Space(engine=engine)
+            space.use_collisions()
+            for name in ('E', 'F'):
+                o = SpaceObjects(name, 1.0e20, 1.0e3)
+                o.set_coord(1.0e8, 1.0e8, 0, 0, t=0)
+                space.add_obj(o)
+            space.gravity_interactions(10)
+            assert len(space.Objects) == 1
+
+        # цепочка столкновений - одна группа; неподвижная звезда остается на месте и поглощает остальных
+        space = load_scenario('sun-earth')
+        sun = space.Objects[0]
+        sun.StaticCoord = True
+        x, y = sun.X, sun.Y
+        space.use_collisions()
+        debris = []
+        for k in range(3):
+            o = SpaceObjects(f'Debris {k}', 1.0e20, sun.R)
+            o.set_coord(x + (k + 1) * 1.5 * sun.R, y, 0, 0, t=0)
+            debris.append(o)
+        space.add_obj(*debris)
+        mass = sun.Mass
+        space.gravity_interactions(1)
+        assert [o.Name for o in space.Objects] == [sun.Name, 'Earth']
+        assert (sun.X, sun.Y) == (x, y) and np.isclose(sun.Mass, mass + 3.0e20, rtol=1e-15)
+        assert space.Engine.n == 2 and space.Engine.objects[1] is space.Objects[1] and space.Objects[1]._idx == 1
+
+    def test_particles(self):
+        """
+        Метод для тестирования пробных частиц objects.TestParticle.
+
+        """
+
+        for engine in (True, False):
+            space = load_scenario('sun-earth', engine=engine)
+            sun, earth = space.Objects
+            # частица нулевой массы допустима, массивный объект нулевой массы - нет
+            probe = objects.TestParticle('Probe', 0, 1.0e3)
+            probe.set_coord(sun.X + 2.0e11, sun.Y, 0, 0, t=0)
+            # тяжелая частица (масса Солнца) на Землю не действует
+            heavy = objects.TestParticle('Heavy', sun.Mass, 1.0e3)
+            heavy.set_coord(earth.X + 1.0e10, earth.Y, 0, 0, t=0)
+            try:
+                space.add_obj(SpaceObjects('Empty', 0, 1.0))
+                raise RuntimeError("Массивный объект нулевой массы добавлен в пространство.")
+            except AssertionError:
+                pass
+            reference = load_scenario('sun-earth', engine=engine)
+            space.add_obj(probe, heavy)
+            energy = reference.energy()
+            assert np.isclose(space.energy(), energy, rtol=1e-12)
+            for _ in range(10):
+                space.gravity_interactions(60)
+                reference.gravity_interactions(60)
+            for o, r in zip(space.Objects[:2], reference.Objects):
+                assert np.allclose((o.X, o.Y, o.Vx, o.Vy), (r.X, r.Y, r.Vx, r.Vy), rtol=1e-12, atol=1e-9)
+            # частица притягивается Солнцем и Землей: a = G * M / r**2
+            d = 2.0e11
+            expected = G * sun.Mass / d ** 2
+            assert np.isclose(-probe.Vx / 600, expected, rtol=1e-2) and abs(probe.Vy) < abs(probe.Vx)
+
+        # сохранение и загрузка сохраняют вид объектов
+        space = load_scenario('sun-earth')
+        probe = objects.TestParticle('Probe', 0, 1.0e3)
+        probe.set_coord(1.0e11, 1.0e11, 1.0e3, 0, t=0)
+        space.add_obj(probe)
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('probe.snap', 'probe.csv'):
+                path = os.path.join(folder, name)
+                space.save(path)
+                for engine in (True, False):
+                    loaded = Space(engine=engine)
+                    loaded.load(path)
+                    assert [type(o) for o in loaded.Objects] == [SpaceObjects, SpaceObjects, objects.TestParticle]
+                    assert loaded.Objects[2].Mass == 0 and loaded.Objects[2].X == 1.0e11
+                    if engine:
+                        assert loaded.Engine.source.tolist()[:3] == [True, True, False]
+
+    def test_bench_suite(self):
+        """
+        Метод для тестирования набора замеров bench_suite.
+
+        """
+
+        # сравнение с базовыми результатами: регрессия, ускорение, проваленная проверка, новый замер
+        def result(value, ok=True):
+            return {'value': value, 'ok': ok}
+
+        baseline = {'a': result(1.0), 'b': result(1.0), 'c': result(1.0), 'd': result(1.0)}
+        results = {'a': result(1.2), 'b': result(1.5), 'c': result(0.5), 'd': result(1.0, False), 'e': result(1.0)}
+        status = {name: row[-1] for name, *row in bench_suite.compare(results, baseline, 0.25)}
+        assert status == {'a': 'ok', 'b': 'slower', 'c': 'faster', 'd': 'failed', 'e': 'new'}
+
+        # проверки корректности проходят на текущих движке и сохранении
+        results = bench_suite.suite_gravity((50,), max_loop=50, budget=0.01, steps=5)
+        results.update(bench_suite.suite_csv((50,), budget=0.01))
+        assert set(results) == {'gravity/loop/50', 'gravity/engine/50', 'csv/save/50', 'csv/load/50'}
+        assert all(r['ok'] for r in results.values()), results
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'baseline.json')
+            assert bench_suite.main(['--quick', '--baseline', path, '--update']) == 0 and os.path.exists(path)
+
+    def test_profiler(self):
+        """
+        Метод для тестирования замеров времени profiler.
+
+        """
+
+        import pygame
+        space = load_scenario('sun-earth', engine=True)
+        profiler = FrameProfiler(capacity=8)
+        profiler.attach(space, 'gravity_interactions', 'step', frame=True)
+        profiler.attach(space.Engine, 'accelerations', 'forces')
+        # выключенные замеры не подменяют методы
+        space.gravity_interactions(60)
+        assert 'gravity_interactions' not in vars(space) and not profiler.sections
+        profiler.enable()
+        for _ in range(20):
+            space.gravity_interactions(60)
+        stats = profiler.stats()
+        assert set(stats) == {'step', 'forces', 'frame'} and stats['step']['count'] == 20
+        assert stats['frame']['count'] == 19 and len(profiler.sections['step'].last()) == 8
+        assert all(s['p50'] <= s['p95'] <= s['p99'] <= s['max'] for s in stats.values())
+        assert stats['forces']['p50'] <= stats['step']['p50']
+        # последние замеры - в порядке поступления
+        samples = profiler.sections['step']
+        assert np.array_equal(samples.last()[-1:], samples.values[(samples.count - 1) % 8:][:1])
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = profiler.export(os.path.join(folder, 'profile.json'))
+            with open(path) as file:
+                data = json.load(file)
+            assert data['stats']['step']['count'] == 20 and len(data['samples']['step']) == 8
+            # cProfile: 3 кадра, после записи статистики замеры выключаются, как были до профилирования
+            profiler.disable()
+            path = os.path.join(folder, 'frames.pstats')
+            profiler.profile(3, path)
+            for _ in range(5):
+                space.gravity_interactions(60)
+            assert os.path.exists(path) and os.path.exists(path + '.txt') and not profiler.enabled
+            assert 'gravity_interactions' not in vars(space) and 'accelerations' not in vars(space.Engine)
+
+            # F4 в окне: сообщение о выгрузке замеров - в строке состояния, а не в консоли
+            os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+            from main_cycle import MainLoop
+            from settings import Settings
+            loop = MainLoop(space, size=(320, 240), run=False)
+            path, Settings.path = Settings.path, folder
+            try:
+                loop.handle_profiler_keys(pygame.K_F4)
+            finally:
+                Settings.path = path
+            loop.update_hud(len(space.Objects))
+            assert loop.hud.fields['message'][0].startswith('Замеры записаны') and len(os.listdir(folder)) == 4
+            loop.message = (loop.message[0], 0.0)
+            loop.update_hud(len(space.Objects))
+            assert 'message' not in loop.hud.fields
+            # количество объектов в строке состояния - из снимка для отрисовки
+            loop.draw()
+            assert loop.hud.fields['bodies'][0] == f'Объектов: {len(space.Objects)}'
+
+    def test_imports(self):
+        """
+        Метод для тестирования легкого импорта ядра моделирования.
+
+        """
+
+        from scipy.constants import G as codata
+        assert G == codata
+        # ядро не загружает графические библиотеки и scipy
+        for module in ('space', 'integrators', 'ensemble', 'headless'):
+            seconds, heavy = bench_suite.import_time(module)
+            assert not heavy and seconds > 0, (module, heavy)
+
+    def test_scene_io(self):
+        """
+        Метод для тестирования фонового сохранения и загрузки scene_io и меню поверх сцены menu.
+
+        """
+
+        import pygame
+        from menu import OverlayMenu
+        with tempfile.TemporaryDirectory() as folder:
+            for name in ('scene.snap', 'scene.csv'):
+                path = os.path.join(folder, name)
+                space = load_scenario('sun-earth')
+                space.set_integrator('leapfrog')
+                integrator = space.Engine.integrator
+                io = SceneIO(space)
+                space.gravity_interactions(60)
+                state = [(o.X, o.Vy) for o in space.Objects]
+                # состояние фиксируется при вызове save(): следующие шаги в файл не попадают
+                future = io.save(path)
+                space.gravity_interactions(60)
+                assert future.result() is True and io.wait() is False and io.status.startswith('Сохранено')
+                space.add_obj(SpaceObjects('Extra', 1.0e20, 1.0))
+                io.load(path)
+                assert io.wait() is True and not io.busy
+                # CSV-файл не хранит модельное время
+                assert [(o.X, o.Vy) for o in space.Objects] == state and space.Time == (60 if 'snap' in name else 120)
+                assert space.Engine.integrator is integrator and space.Engine.objects[0] is space.Objects[0]
+                space.gravity_interactions(60)
+                io.load(os.path.join(folder, 'нет такого файла'))
+                assert io.wait() is False and io.status.startswith('Ошибка') and len(space.Objects) == 2
+                io.close()
+
+            # загрузка сцены с другим количеством объектов во время записи траекторий: новый сегмент записи
+            path = os.path.join(folder, 'scene.snap')
+            space = load_scenario('sun-earth')
+            space.add_obj(SpaceObjects('Extra', 1.0e20, 1.0))
+            recorder = space.attach_recorder(os.path.join(folder, 'run.traj'))
+            io = SceneIO(space)
+            io.load(path)
+            assert io.wait() is True and len(space.Objects) == 2
+            space.gravity_interactions(60)
+            space.detach_recorder()
+            io.close()
+            assert len(recorder.paths) == 2
+            first, second = Trajectory(recorder.paths[0]), Trajectory(recorder.paths[1])
+            assert len(first.names) == 3 and len(first) == 1
+            assert second.names == [o.Name for o in space.Objects] and len(second) == 2
+
+            # подстановка загруженного состояния - в потоке фонового расчета между шагами
+            space = load_scenario('sun-earth')
+            space.set_integrator('leapfrog')
+            worker = PhysicsWorker(FixedStepper(space, 100, warp=100 * 1000))
+            with worker:
+                io = SceneIO(space, worker.call)
+                # фиксация состояния при сохранении - в потоке расчета, поток кадров ее не ждет
+                threads, save_later = [], space.save_later
+                space.save_later = lambda *args: threads.append(threading.current_thread()) or save_later(*args)
+                assert io.save(os.path.join(folder, 'worker.snap')).result() is True
+                assert threads == [worker._thread]
+                io.load(os.path.join(folder, 'worker.snap'))
+                assert io.wait() is True
+                time.sleep(0.05)
+                assert worker.render_positions().shape == (2, 2) and space.Engine.objects == space.Objects
+            io.close()
+
+        # меню: выбор стрелками и Enter, ввод имени файла, события не передаются дальше
+        calls = []
+        menu = OverlayMenu([('Файл', None), ('Загрузить', lambda: calls.append(menu.text))], text='a.snap')
+        assert not menu.handle(pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN))
+        menu.visible = True
+        for event in (pygame.event.Event(pygame.KEYDOWN, key=pygame.K_BACKSPACE),
+                      pygame.event.Event(pygame.TEXTINPUT, text='v'),
+                      pygame.event.Event(pygame.KEYDOWN, key=pygame.K_DOWN),
+                      pygame.event.Event(pygame.KEYDOWN, key=pygame.K_RETURN)):
+            assert menu.handle(event)
+        assert calls == ['a.snav'] and menu.selected == 1
+        # отпускание клавиши, нажатой до открытия меню, передается сцене
+        assert not menu.handle(pygame.event.Event(pygame.KEYUP, key=pygame.K_w))
+        rect = menu.draw(pygame.Surface((800, 600)))
+        assert rect.collidepoint(menu._rects[0].center) and len(menu._rects) == 2
+
+    def test_checkpoint(self):
+        """
+        Метод для тестирования контрольных точек checkpoint.
+
+        """
+
+        # кодирование дельт без потерь
+        rng = np.random.default_rng(1)
+        base = rng.normal(0, 1e11, (50, 2))
+        values = base * (1 + rng.normal(0, 1e-6, base.shape))
+        assert np.array_equal(checkpoint.decode(checkpoint.encode(values, base), base), values)
+
+        with tempfile.TemporaryDirectory() as folder:
+            space = load_scenario('sun-earth')
+            space.set_integrator('leapfrog')
+            reference = load_scenario('sun-earth')
+            reference.set_integrator('leapfrog')
+            points = space.attach_checkpoints(folder, every=300, keyframe_every=3, keep=2)
+            for _ in range(20):
+                space.gravity_interactions(60)
+                reference.gravity_interactions(60)
+            space.detach_checkpoints()
+            # точки каждые 300 с: 0, 300, ..., 1200; хранятся точки двух последних ключевых кадров
+            entries = checkpoint.read_manifest(folder)
+            assert points.count == 5 and [e['kind'] for e in entries] == ['keyframe', 'delta', 'delta', 'keyframe',
+                                                                          'delta']
+            assert sorted(os.listdir(folder)) == sorted([e['file'] for e in entries] + [checkpoint.MANIFEST])
+
+            # восстановленное состояние совпадает побитно, расчет продолжается так же, как без перерыва
+            restored, entry = checkpoint.resume(folder)
+            assert entry['seq'] == 5 and restored.Time == reference.Time
+            restored.set_integrator('leapfrog')
+            for _ in range(10):
+                restored.gravity_interactions(60)
+                reference.gravity_interactions(60)
+            assert [(o.Name, o.X, o.Y, o.Vx, o.Vy) for o in restored.Objects] == \
+                   [(o.Name, o.X, o.Y, o.Vx, o.Vy) for o in reference.Objects]
+
+            # поврежденная последняя точка пропускается
+            with open(os.path.join(folder, entry['file']), 'r+b') as file:
+                file.seek(-1, os.SEEK_END)
+                file.write(b'!')
+            restored, entry = checkpoint.resume(folder, engine=False)
+            assert entry['seq'] == 4 and restored.Time == 900 and restored.Engine is None
+
+            # изменение состава объектов - внеочередной ключевой кадр; номера точек продолжаются
+            points = restored.attach_checkpoints(folder, every=300)
+            restored.gravity_interactions(60)
+            restored.add_obj(SpaceObjects('Extra', 1.0e20, 1.0))
+            points.save(restored)
+            restored.detach_checkpoints()
+            entries = checkpoint.read_manifest(folder)
+            assert [(e['seq'], e['kind']) for e in entries[-2:]] == [(6, 'keyframe'), (7, 'keyframe')]
+            assert len(checkpoint.resume(folder)[0].Objects) == 3
+
+        # объекты на кеплеровых орбитах: орбиты хранятся в ключевых кадрах, расчет продолжается по орбитам
+        def rails():
+            space = load_scenario('sun-earth')
+            sun, earth = space.Objects
+            moon = SpaceObjects('Moon', 7.35e22, 1.0)
+            moon.set_coord(earth.X + 3.844e8, earth.Y, earth.Vx, earth.Vy + 1022, t=0)
+            space.add_obj(moon)
+            earth.set_orbit(sun)
+            moon.set_orbit(earth)
+            probe = SpaceObjects('Probe', 1000, 1)
+            probe.set_coord(earth.X - 7.0e6, 0, 0, earth.Vy - 7546, t=0)
+            space.add_obj(probe)
+            space.set_integrator('leapfrog')
+            return space
+
+        with tempfile.TemporaryDirectory() as folder:
+            space, reference = rails(), rails()
+            space.attach_checkpoints(folder, every=300, keyframe_every=10)
+            for _ in range(15):
+                space.gravity_interactions(60)
+                reference.gravity_interactions(60)
+            space.detach_checkpoints()
+            for _ in range(10):
+                reference.gravity_interactions(60)
+            for engine in (True, False):
+                restored, entry = checkpoint.resume(folder, engine=engine)
+                assert entry['kind'] == 'delta' and restored.Time == 900
+                earth, moon = restored.find_obj('Earth'), restored.find_obj('Moon')
+                assert earth.Orbit.central is restored.find_obj('Sun') and moon.Orbit.central is earth
+                assert earth.Orbit.elements() == reference.find_obj('Earth').Orbit.elements()
+                restored.set_integrator('leapfrog')
+                for _ in range(10):
+                    restored.gravity_interactions(60)
+                assert [(o.Name, o.X, o.Y, o.Vx, o.Vy) for o in restored.Objects] == \
+                       [(o.Name, o.X, o.Y, o.Vx, o.Vy) for o in reference.Objects]
+
+    def test_registry(self):
+        """
+        Метод для тестирования реестра объектов пространства registry.
+
+        """
+
+        for engine in (False, True):
+            space = Space(engine=engine)
+            a, b, c = SpaceObjects('A', 1.0e20, 1.0), SpaceObjects('B', 2.0e20, 1.0), SpaceObjects('C', 3.0e20, 1.0)
+            for k, o in enumerate((a, b, c)):
+                o.set_coord(k * 1.0e9, 0, 0, k * 10.0, t=0)
+            space.add_obj(a, b, c)
+            assert [o.Id for o in space.Objects] == [0, 1, 2] and space.get_obj(1) is b and space.find_obj('C') is c
+            version = space.Objects.version
+            # удаление переносом последнего объекта на место удаленного; номера не используются повторно
+            space.remove_obj(b)
+            assert list(space.Objects) == [a, c] and b not in space.Objects and space.Objects.version != version
+            assert space.get_obj(1) is None and space.find_obj('B') is None and b.X == 1.0e9
+            assert c.X == 2.0e9 and c.Vy == 20.0 and space.Objects.position(c) == 1
+            d = SpaceObjects('A', 4.0e20, 1.0)
+            space.add_obj(d)
+            assert d.Id == 3 and space.find_obj('A') is a
+            space.remove_obj(a)
+            assert space.find_obj('A') is d and list(space.Objects) == [d, c]
+
+            # пакетное добавление из массивов
+            rng = np.random.default_rng(1)
+            n = 1000
+            mass, pos, vel = rng.uniform(1e20, 1e22, n), rng.normal(0, 1e11, (n, 2)), rng.normal(0, 1e4, (n, 2))
+            source = np.arange(n) % 2 == 0
+            ids = space.add_arrays(mass, np.ones(n), pos, vel, source=source)
+            assert ids.tolist() == list(range(4, 4 + n)) and len(space.Objects) == n + 2
+            o = space.get_obj(5)
+            assert o.Name == 'Body 5' and isinstance(o, objects.TestParticle) and o.X == pos[1, 0] and o.Vy == vel[1, 1]
+            assert space.find_obj('Body 1003').Mass == mass[-1]
+
+            # пакетное удаление: реестр и строки движка переставляются одинаково
+            gone = [space.Objects[i] for i in rng.choice(len(space.Objects), 300, replace=False).tolist()]
+            expected = {o.Id: (o.X, o.Vy, o.Mass) for o in space.Objects if o not in gone}
+            space.remove_obj(*gone)
+            assert len(space.Objects) == n + 2 - 300 and all(space.get_obj(o.Id) is None for o in gone)
+            assert {o.Id: (o.X, o.Vy, o.Mass) for o in space.Objects} == expected
+            assert all(space.Objects.position(o) == i for i, o in enumerate(space.Objects))
+            if engine:
+                assert space.Engine.n == len(space.Objects) and space.Engine.objects == list(space.Objects)
+                assert all(o._idx == i for i, o in enumerate(space.Objects))
+                assert all(o._store is None for o in gone)
+
+        # номера сохраняются в снимке и при передаче в другой процесс
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, 'registry.snap')
+            space.save(path)
+            restored = Space(engine=True)
+            restored.load(path)
+            assert [o.Id for o in restored.Objects] == [o.Id for o in space.Objects]
+            assert restored.add_arrays([1.0e20], [1.0], [[0.0, 0.0]]).tolist() == [space.Objects.next_id]
+        copy = pickle.loads(pickle.dumps(space.Objects))
+        assert [o.Id for o in copy] == [o.Id for o in space.Objects] and copy.get(d.Id).Name == 'A'
+
+        m, holes, movers = swap_plan(6, [1, 4, 5])
+        assert m == 3 and holes.tolist() == [1] and movers.tolist() == [3]
+        registry = Registry([SpaceObjects('X'), SpaceObjects('X')])
+        assert registry.find('X') is registry[0]
+        registry.swap_remove([0, 1])
+        assert registry.find('X') is None and len(registry) == 0
+
+        # повторяющиеся имена: указатель переходит к следующему объекту с этим именем
+        registry = Registry([SpaceObjects(name) for name in 'XYXZX'])
+        x0, y, x2, z, x4 = registry
+        assert registry.find('X') is x0
+        registry.swap_remove([0])
+        assert registry.find('X') is x2 and list(registry) == [x4, y, x2, z]
+        registry.swap_remove([3, 0])
+        assert registry.find('X') is x2 and registry._names['X'] is x2 and registry.find('Z') is None
+
+        # изменяющие методы списка запрещены: реестр и строки движка не расходятся
+        space = Space(engine=True)
+        a, b, c = SpaceObjects('A', 1.0, 1.0), SpaceObjects('B', 2.0, 1.0), SpaceObjects('C', 3.0, 1.0)
+        space.add_obj(a, b, c)
+        version = space.Objects.version
+        for call in (lambda: space.Objects.remove(a), space.Objects.pop, lambda: space.Objects.__delitem__(0),
+                     space.Objects.clear, lambda: space.Objects.append(SpaceObjects('D')),
+                     lambda: space.Objects.extend([SpaceObjects('D')]), lambda: space.Objects.__iadd__([]),
+                     lambda: space.Objects.insert(0, a), lambda: space.Objects.sort(key=id), space.Objects.reverse,
+                     lambda: space.Objects.__setitem__(0, c), lambda: space.Objects.__imul__(2)):
+            try:
+                call()
+                raise Exception("Реестр объектов изменен в обход движка")
+            except TypeError:
+                pass
+        assert list(space.Objects) == [a, b, c] and space.Objects.version == version and space.Engine.n == 3
+        space.remove_obj(a)
+        assert list(space.Objects) == [c, b] and space.Engine.mass[:space.Engine.n].tolist() == [3.0, 2.0]
+
+    def test_handles(self):
+        """
+        Метод для тестирования компактного представления объектов: __slots__ и привязанные объекты без
+        собственного состояния.
+
+        """
+
+        o = SpaceObjects('A', 1.0e20, 5.0)
+        o.set_coord(1.0, 2.0, 3.0, 4.0, t=0)
+        p = objects.TestParticle('P', 0.0, 1.0)
+        for body in (o, p, objects.Aircraft('R', 1.0e3, 1.0)):
+            assert not hasattr(body, '__dict__')
+            try:
+                body.Unknown = 1
+                assert False, "Объекту назначен атрибут, не перечисленный в __slots__."
+            except AttributeError:
+                pass
+        assert (o.Mass, o.R, o.X, o.Vy, o.Ax, o.StaticCoord) == (1.0e20, 5.0, 1.0, 4.0, 0.0, False)
+        assert p.X is None and p.Mass == 0.0
+
+        # привязанный объект - указатель в массивы движка; при отвязке состояние возвращается в объект
+        space = Space(engine=True)
+        space.add_obj(o, p)
+        assert o._own is None and o.X == 1.0 and o.Vy == 4.0
+        o.X = 7.0
+        assert space.Engine.pos[0, 0] == 7.0
+        space.use_engine(False)
+        assert o._own is not None and o.X == 7.0 and o.Vy == 4.0 and p.X == 0.0
+        space.add_arrays([1.0e20], [1.0], [[3.0, 4.0]])
+        view = space.Objects[-1]
+        assert view.X == 3.0 and view.Name == 'Body 2' and view.Color is None
+
+
 if __name__ == "__main__":
 
     Test().test_gui()
     Test().test_space()
+    Test().test_engine()
+    Test().test_barnes_hut()
+    Test().test_integrators()
+    Test().test_time_steps()
+    Test().test_headless()
+    Test().test_ensemble()
+    Test().test_evolution()
     Test().test_objects()
+    Test().test_kepler()
+    Test().test_snapshot()
+    Test().test_recorder()
+    Test().test_replay()
+    Test().test_stepper()
+    Test().test_worker()
+    Test().test_render()
+    Test().test_hud()
+    Test().test_field()
+    Test().test_collisions()
+    Test().test_particles()
+    Test().test_bench_suite()
+    Test().test_profiler()
+    Test().test_imports()
+    Test().test_scene_io()
+    Test().test_checkpoint()
+    Test().test_registry()
+    Test().test_handles()
 
     print('''
     
@@ -0,0 +1,197 @@
+"""
+Фоновый расчет пространства в отдельном потоке.
+
+PhysicsWorker продвигает пространство шагами фиксированной длительности (stepper.FixedStepper) в фоновом потоке,
+поэтому медленный расчет гравитации не задерживает отрисовку и обработку событий. Тяжелые вычисления NumPy
+освобождают GIL - поток отрисовки работает параллельно с ними.
+
+После каждой серии шагов поток расчета записывает координаты и снимок пространства для отрисовки (stepper.SceneState:
+версия состава, цвета, радиусы и массы объектов) в задний буфер и меняет буферы местами под блокировкой:
+отрисовка всегда читает согласованное состояние (двойная буферизация), а не массивы и список объектов,
+которые изменяются расчетом.
+Команды интерфейса (загрузка, очистка, сохранение) выполняются в потоке расчета между шагами (метод call()),
+поэтому они не пересекаются с шагом расчета.
+
+"""
+
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+import numpy as np
+
+
+class PhysicsWorker:
+    """
+    Класс фонового расчета.
+
+    stepper - расчет шагами фиксированной длительности (stepper.FixedStepper).
+    space - пространство (stepper.space).
+    budget - наибольшее время непрерывного расчета между публикациями состояния, секунды.
+    paused - флаг паузы.
+
+    """
+
+    def __init__(self, stepper, budget=1 / 30):
+        self.stepper = stepper
+        self.space = stepper.space
+        self.budget = budget
+        self._lock = threading.Lock()
+        self._commands = queue.Queue()
+        self._running = threading.Event()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._thread = None
+        # передний буфер читается отрисовкой, задний - заполняется расчетом
+        self._front = self._buffer()
+        self._back = self._buffer()
+        self._publish()
+
+    @staticmethod
+    def _buffer():
+        return {'prev': np.zeros((0, 2)), 'cur': np.zeros((0, 2)), 'scene': None, 'time': 0.0, 'accumulator': 0.0,
+                'stamp': 0.0}
+
+    @property
+    def paused(self):
+        return not self._resume.is_set()
+
+    @paused.setter
+    def paused(self, value):
+        if value:
+            self._resume.clear()
+        else:
+            self._resume.set()
+
+    def start(self):
+        """
+        Метод запускает поток расчета.
+
+        """
+
+        if self._thread is None:
+            self._running.set()
+            self._thread = threading.Thread(target=self._run, name='physics', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """
+        Метод останавливает поток расчета (после завершения текущей серии шагов).
+
+        """
+
+        if self._thread is not None:
+            self._running.clear()
+            self._resume.set()
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def call(self, func, *args, **kwargs):
+        """
+        Метод выполняет func(*args, **kwargs) в потоке расчета между шагами (сразу, если поток не запущен)
+        и дожидается результата.
+
+        """
+
+        if self._thread is None:
+            result = func(*args, **kwargs)
+            self._publish()
+            return result
+        future = Future()
+        self._commands.put((future, func, args, kwargs))
+        return future.result()
+
+    def _execute(self):
+        """
+        Метод выполняет накопившиеся команды интерфейса.
+
+        """
+
+        executed = False
+        while not self._commands.empty():
+            future, func, args, kwargs = self._commands.get()
+            try:
+                future.set_result(func(*args, **kwargs))
+            except BaseException as error:
+                future.set_exception(error)
+            executed = True
+        if executed:
+            self._publish()
+
+    def _run(self):
+        last = time.perf_counter()
+        while self._running.is_set():
+            self._execute()
+            if self.paused:
+                # на паузе модельное время не накапливается, команды интерфейса выполняются
+                self._resume.wait(0.01)
+                last = time.perf_counter()
+                continue
+            now = time.perf_counter()
+            wall, last = now - last, now
+            if self.stepper.frame(wall, budget=self.budget):
+                self._publish()
+            else:
+                # до следующего шага - ожидание (не дольше 10 мс, чтобы не задерживать команды)
+                stepper = self.stepper
+                time.sleep(min((stepper.dt - stepper.accumulator) / stepper.warp, 0.01))
+
+    def _publish(self):
+        """
+        Метод записывает состояние в задний буфер и меняет буферы местами.
+
+        """
+
+        back = self._back
+        back['cur'] = self.stepper.positions(back['cur'])
+        # после изменения состояния не шагом расчета (загрузка, очистка) интерполяция не выполняется
+        back['prev'] = self.stepper.previous(back['cur'])
+        back['scene'] = self.stepper.scene()
+        back['time'] = self.space.Time
+        back['accumulator'] = self.stepper.accumulator
+        back['stamp'] = time.perf_counter()
+        with self._lock:
+            self._front, self._back = back, self._front
+
+    def time(self):
+        """
+        Метод возвращает модельное время последнего опубликованного состояния.
+
+        """
+
+        with self._lock:
+            return self._front['time']
+
+    def render_state(self):
+        """
+        Метод возвращает из переднего буфера снимок пространства для отрисовки (stepper.SceneState) и координаты
+        объектов: интерполяция между двумя последними шагами с учетом реального времени, прошедшего с публикации,
+        массив (n, 2). Снимок и координаты относятся к одному и тому же состоянию.
+
+        """
+
+        with self._lock:
+            front = self._front
+            prev, cur = front['prev'].copy(), front['cur'].copy()
+            scene, accumulator, stamp = front['scene'], front['accumulator'], front['stamp']
+        if self.paused or self.stepper.uncapped:
+            return scene, cur
+        stepper = self.stepper
+        alpha = min((accumulator + (time.perf_counter() - stamp) * stepper.warp) / stepper.dt, 1.0)
+        return scene, prev + alpha * (cur - prev)
+
+    def render_positions(self):
+        """
+        Метод возвращает координаты объектов для отрисовки из переднего буфера (см. render_state()), массив (n, 2).
+
+        """
+
+        return self.render_state()[1]